@@ -1,27 +1,37 @@
-import boto3
 import os
 import time
 import uuid
-import uuid
 import mimetypes
 import json
-import urllib.request
 import threading
-import requests
-import time
-import io
 import base64
-try:
-    from pypdf import PdfReader
-except ImportError:
-    PdfReader = None
-try:
-    import fitz  # PyMuPDF
-except Exception:
-    fitz = None
+import gzip
+import zlib
+import queue
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import re
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from fastapi import HTTPException
 from dotenv import load_dotenv
-from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from s3transfer.subscribers import BaseSubscriber
+from search_index import SearchIndex
+from transcript_index import TranscriptIndex, align_word_times
+from video_labels import LabelTimeline, collect_label_timeline
+from vector_index import chunk_text, get_embedder, make_vector_index
+from query_cache import QueryCache
+from job_tracker import JobStore, JobTracker, SqsNotifier
+from ingest_queue import IngestQueue, IngestWorkerPool
+from enrichment_cache import EnrichmentCache, text_hash
+from pdf_extract import extract_pdf, subset_pdf, can_render, render_pages
+from metrics import metrics
+from clients import aws_client, aws_resource, http_session
 
 load_dotenv()
 
@@ -31,8 +41,184 @@ rekognition = None
 comprehend = None
 transcribe = None
 dynamodb = None
+dynamo_resource = None
+content_index = None
 AWS_BUCKET = None
 
+# Streaming upload tuning (multipart part size in MB, parallel part uploads per file)
+UPLOAD_PART_SIZE_MB = int(os.getenv("UPLOAD_PART_SIZE_MB", "8"))
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))
+# Batch ingest: one transfer manager shared by every file in the batch
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "16"))
+BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", "64"))
+
+# Transcripts longer than the preview live gzip-compressed in S3 under transcripts/<object key>.txt.gz;
+# the MediaTags item keeps transcript_key, transcript_length (chars), transcript_bytes (UTF-8)
+# and transcript_preview. Short transcripts stay inline in 'transcript'.
+# Audio/video also get per-word time offsets (token-aligned start_ms/end_ms lists) in
+# transcripts/<object key>.times.json.gz, pointed to by transcript_times_key.
+TRANSCRIPT_PREFIX = "transcripts/"
+TRANSCRIPT_PREVIEW_CHARS = int(os.getenv("TRANSCRIPT_PREVIEW_CHARS", "500"))
+TRANSCRIPT_FIELDS = ('transcript', 'transcript_key', 'transcript_length', 'transcript_bytes', 'transcript_preview', 'transcript_times_key')
+_transcript_pool = ThreadPoolExecutor(max_workers=int(os.getenv("TRANSCRIPT_FETCH_CONCURRENCY", "16")), thread_name_prefix="transcript")
+
+# Content-addressed ingest: uploads are hashed (SHA-256) as they stream to S3 and then looked up in this
+# table (content_hash -> object_key, refs = set of catalog keys sharing the object). A hit drops the new
+# copy and reuses the stored object and its tags/transcript; the object is deleted only when its last ref goes.
+# Dedup is off if the table does not exist.
+CONTENT_INDEX_TABLE = os.getenv("CONTENT_INDEX_TABLE", "MediaContentIndex")
+
+# Raw Rekognition/Comprehend/Textract/Transcribe responses are memoized on local disk by content
+# hash + service + parameters, so retries and re-tagging with new thresholds don't call AWS again.
+# The cache file is opened by startup(), next to this module unless ENRICHMENT_CACHE_PATH says otherwise.
+# Set ENRICHMENT_CACHE_PATH to an empty string to turn it off.
+ENRICHMENT_CACHE_PATH = os.getenv("ENRICHMENT_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "enrichment_cache.db"))
+ENRICHMENT_CACHE_MAX_MB = int(os.getenv("ENRICHMENT_CACHE_MAX_MB", "1024"))
+enrichment_cache = None
+IMAGE_LABEL_PARAMS = {'MaxLabels': 10, 'MinConfidence': 70}
+VIDEO_LABEL_PARAMS = {'MinConfidence': 70}
+TRANSCRIBE_PARAMS = {'LanguageCode': 'en-US'}
+# Video labels are cached as the aggregated timeline, not the raw detections (hours of video = 100k+ of them)
+VIDEO_TIMELINE_PARAMS = {**VIDEO_LABEL_PARAMS, 'aggregate': 'timeline-v1'}
+VIDEO_TOP_LABELS = 6
+# Full per-label timelines (segments, coverage, confidence) live in S3, pointed to by label_timeline_key
+LABEL_TIMELINE_PREFIX = "labels/"
+
+def cached_response(content_hash, service, params, fetch):
+    """fetch() through the enrichment cache; fetch must return the raw, JSON-serializable response"""
+    if enrichment_cache is None or not content_hash:
+        return fetch()
+    value = enrichment_cache.get(content_hash, service, params)
+    if value is None:
+        value = fetch()
+        enrichment_cache.put(content_hash, service, params, value)
+    return value
+
+# Comprehend tagging covers the whole text: chunks of at most TAG_CHUNK_BYTES, 25 per batch call,
+# at most COMPREHEND_CONCURRENCY calls in flight process-wide and TAG_MAX_CHUNKS chunks per document
+TAG_CHUNK_BYTES = int(os.getenv("TAG_CHUNK_BYTES", "4900"))
+TAG_MAX_CHUNKS = int(os.getenv("TAG_MAX_CHUNKS", "250"))
+COMPREHEND_BATCH_SIZE = 25
+COMPREHEND_CONCURRENCY = int(os.getenv("COMPREHEND_CONCURRENCY", "4"))
+_comprehend_pool = ThreadPoolExecutor(max_workers=COMPREHEND_CONCURRENCY, thread_name_prefix="comprehend")
+
+# Scanned PDF pages are rendered and OCR'd one page per synchronous Textract call;
+# the pool bounds concurrent Textract calls across all ingest workers
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "4"))
+_ocr_pool = ThreadPoolExecutor(max_workers=OCR_CONCURRENCY, thread_name_prefix="ocr")
+
+# Change feed: every write stamps updated_at (ms); deletes leave a tombstone that expires
+# via DynamoDB TTL on expires_at, and clients older than the retention window must resync
+TOMBSTONE_RETENTION_SECONDS = int(os.getenv("TOMBSTONE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+CHANGE_FEED_OVERLAP_MS = 5000  # Re-send a little history to cover clock skew / in-flight writes
+# Delta reads Query a GSI on MediaTags (hash feed_shard (S), range updated_at (N), projection ALL) so a poll
+# reads only what changed. Every write that stamps updated_at also sets feed_shard; the shards spread the
+# write load. Keep CHANGE_FEED_SHARDS fixed once items are written. Without the index deltas fall back to a scan.
+CHANGE_FEED_INDEX = os.getenv("CHANGE_FEED_INDEX", "ChangeFeed")
+CHANGE_FEED_SHARDS = int(os.getenv("CHANGE_FEED_SHARDS", "4"))
+change_feed_ready = False
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+def feed_shard(key: str) -> str:
+    return str(zlib.crc32(key.encode('utf-8')) % CHANGE_FEED_SHARDS)
+
+def change_stamp(key: str) -> dict:
+    """updated_at plus the change-feed partition, for every write to an item"""
+    return {'updated_at': now_ms(), 'feed_shard': feed_shard(key)}
+
+# Presigned GET URLs are cached per S3 key and only re-signed when close to expiry
+PRESIGN_EXPIRES_SECONDS = 3600
+PRESIGN_MIN_REMAINING_SECONDS = int(os.getenv("PRESIGN_MIN_REMAINING_SECONDS", "900"))
+PRESIGN_CACHE_SIZE = int(os.getenv("PRESIGN_CACHE_SIZE", "20000"))
+_presign_cache = OrderedDict()  # key -> (url, expires_at), least recently used first
+_presign_lock = threading.Lock()
+_presign_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+# In-process search index, built from a full scan on first use and kept current by the
+# write paths here plus a periodic change-feed sync (picks up writes from other workers)
+SEARCH_INDEX_SYNC_SECONDS = int(os.getenv("SEARCH_INDEX_SYNC_SECONDS", "60"))
+# Full-table reads (index build, change feed) use a parallel scan with this many segments
+SCAN_SEGMENTS = int(os.getenv("SCAN_SEGMENTS", "4"))
+# Threads reading one parallel scan; more segments than this queue up and run as threads free up
+SCAN_MAX_WORKERS = int(os.getenv("SCAN_MAX_WORKERS", "8"))
+search_index = SearchIndex()
+# Positional phrase index over transcripts (snippets and time offsets), maintained alongside search_index
+transcript_index = TranscriptIndex()
+_shared_objects = {}  # catalog key -> S3 key, only for deduplicated items
+_search_index_lock = threading.Lock()
+_search_index_ready = False
+_search_index_token = None
+
+# Semantic retrieval for qwen_search: transcript chunks + name/tags are embedded at ingest and
+# the LLM only reranks the top QWEN_CANDIDATES files. Set VECTOR_INDEX_PATH to persist vectors.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+VECTOR_INDEX_KIND = os.getenv("VECTOR_INDEX_KIND", "ivf")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH")
+QWEN_MODEL = "Qwen/Qwen2.5-7B-Instruct"
+QWEN_API_URL = os.getenv("QWEN_API_URL", "https://api.featherless.ai/v1/chat/completions")
+QWEN_CANDIDATES = int(os.getenv("QWEN_CANDIDATES", "20"))
+CHUNK_EXCERPT_CHARS = 1000
+
+# How the strict/lenient/topic passes run: 'concurrent' (all at once, strictest non-empty wins),
+# 'single' (one call returning graded tiers) or 'sequential' (one after another)
+QWEN_SEARCH_MODE = os.getenv("QWEN_SEARCH_MODE", "concurrent")
+QWEN_SEARCH_DEADLINE_SECONDS = float(os.getenv("QWEN_SEARCH_DEADLINE_SECONDS", "75"))
+# Transcribe/Rekognition jobs are tracked in a local SQLite table and polled by one scheduler
+# thread. Optionally, completion events (SNS/EventBridge -> SQS) trigger an immediate poll.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOBS_NOTIFICATION_QUEUE_URL = os.getenv("JOBS_NOTIFICATION_QUEUE_URL")
+REKOGNITION_SNS_TOPIC_ARN = os.getenv("REKOGNITION_SNS_TOPIC_ARN")
+REKOGNITION_SNS_ROLE_ARN = os.getenv("REKOGNITION_SNS_ROLE_ARN")
+job_tracker = None
+_job_tracker_lock = threading.Lock()
+
+# Uploads only store the object and a 'pending' record; tagging runs on a durable SQLite queue
+# drained by INGEST_WORKERS threads, with retries and dead-lettering after INGEST_MAX_ATTEMPTS
+INGEST_DB_PATH = os.getenv("INGEST_DB_PATH", "ingest.db")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+ingest_queue = None
+ingest_workers = None
+_ingest_lock = threading.Lock()
+
+# Cached qwen_search results, invalidated by bumping the catalog version on every write.
+# Set QUERY_CACHE_REDIS_URL to share entries and the version across API workers. Without it each worker
+# hears of other workers' writes only at the next index sync (SEARCH_INDEX_SYNC_SECONDS), so hits served
+# from the local cache re-check that their keys still exist before returning URLs.
+query_cache = QueryCache(
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300")),
+    redis_url=os.getenv("QUERY_CACHE_REDIS_URL")
+)
+def _queue_gauges():
+    """Background work waiting, for /metrics: ingest queue and AWS job tracker depth and age"""
+    gauges = {}
+    if ingest_queue is not None:
+        stats = ingest_queue.stats()
+        for status in ('queued', 'running', 'dead'):
+            gauges[(('queue', 'ingest'), ('status', status))] = stats[status]
+    if job_tracker is not None:
+        gauges[(('queue', 'aws_jobs'), ('status', 'pending'))] = job_tracker.stats()['pending']
+    return gauges
+
+def _queue_age_gauges():
+    ages = {}
+    if ingest_queue is not None:
+        ages[(('queue', 'ingest'),)] = ingest_queue.stats()['oldest_queued_age_seconds']
+    if job_tracker is not None:
+        ages[(('queue', 'aws_jobs'),)] = job_tracker.stats()['oldest_age_seconds']
+    return ages
+
+metrics.gauge('queue_depth', _queue_gauges)
+metrics.gauge('queue_oldest_age_seconds', _queue_age_gauges)
+
+_qwen_pool = ThreadPoolExecutor(max_workers=int(os.getenv("QWEN_POOL_SIZE", "6")), thread_name_prefix="qwen")
+embedder = get_embedder(EMBEDDING_BACKEND)
+vector_index = make_vector_index(VECTOR_INDEX_KIND, embedder.dim)
+
 def make_key(filename: str) -> str:
     return f"{int(time.time())}_{uuid.uuid4().hex}_{filename}"
 
@@ -47,211 +233,493 @@ def deduplicate_tags(tags):
             unique.append(tag)
     return unique
 
-def process_transcription_job_background(job_name, bucket, file_key, db_item_key):
-    """Background task: Poll transcription job and update DynamoDB when complete"""
-    print(f"[BACKGROUND] Monitoring transcription job: {job_name}")
+def _poll_transcription_job(job):
+    """Job tracker poll: check one Transcribe job"""
+    job_response = transcribe.get_transcription_job(TranscriptionJobName=job['job_id'])
+    status = job_response['TranscriptionJob']['TranscriptionJobStatus']
+    if status == 'COMPLETED':
+        return 'done', job_response
+    if status == 'FAILED':
+        return 'failed', job_response['TranscriptionJob'].get('FailureReason', 'Unknown')
+    return 'pending', None
+
+def transcript_from_json(transcript_json):
+    """Transcript text from a Transcribe output document, or None if it has none"""
+    if 'results' not in transcript_json or 'transcripts' not in transcript_json['results']:
+        return None
+    transcripts = transcript_json['results']['transcripts']
+    if len(transcripts) == 0:
+        return None
+    return transcripts[0]['transcript']
+
+def timed_words_from_json(transcript_json):
+    """[(word, start seconds, end seconds)] from a Transcribe output document's items (punctuation has no times)"""
+    words = []
+    for item in transcript_json.get('results', {}).get('items', []):
+        if item.get('type') != 'pronunciation' or not item.get('alternatives'):
+            continue
+        words.append((item['alternatives'][0]['content'], float(item['start_time']), float(item['end_time'])))
+    return words
+
+def _has_spoken_text(transcript_text) -> bool:
+    # Check if transcript has meaningful content
+    return bool(transcript_text) and len(transcript_text.strip()) >= 20
+
+def merge_media_tags(transcript_tags, visual_labels):
+    """Combine transcript tags (None if there was no usable transcript) with visual labels"""
+    if transcript_tags is None:
+        # Transcript is empty or too short - use only visual labels
+        return visual_labels[:15]
+    # Combine transcript tags and visual labels (remove duplicates case-insensitively)
+    return deduplicate_tags(deduplicate_tags(transcript_tags) + visual_labels)[:15]
+
+def media_tags(transcript_text, visual_labels):
+    """Tags for audio/video: transcript key phrases merged with visual labels"""
+    transcript_tags = None
+    if _has_spoken_text(transcript_text):
+        # Transcript is valid - generate tags from it
+        transcript_tags = get_text_tags(transcript_text)
+        print(f"[BACKGROUND] Generated {len(transcript_tags)} tags from transcript")
+    final_tags = merge_media_tags(transcript_tags, visual_labels)
+    print(f"[BACKGROUND] Combined tags: {len(final_tags)} unique total (transcript + visual)")
+    return final_tags
+
+def video_labels_from_timeline(timeline):
+    """Top visual labels from a label timeline document: most on-screen time first"""
+    return deduplicate_tags([label['name'] for label in timeline.get('labels', [])])[:VIDEO_TOP_LABELS]
+
+def _timeline_from_detections(labels):
+    """Aggregate raw get_label_detection labels, as older cache entries hold them"""
+    ordered = sorted(labels, key=lambda label: label.get('Timestamp', 0))
+    return LabelTimeline(VIDEO_LABEL_PARAMS['MinConfidence']).extend(ordered).to_dict()
+
+def _cached_video_timeline(content_hash):
+    """Label timeline for a video from the enrichment cache (aggregating a legacy raw entry), or None"""
+    if enrichment_cache is None or not content_hash:
+        return None
+    timeline = enrichment_cache.get(content_hash, 'rekognition.label_detection', VIDEO_TIMELINE_PARAMS)
+    if timeline is None:
+        labels = enrichment_cache.get(content_hash, 'rekognition.label_detection', VIDEO_LABEL_PARAMS)
+        if labels is not None:
+            timeline = _timeline_from_detections(labels)
+    return timeline
+
+def _store_label_timeline(object_key: str, timeline) -> str:
+    """Write a video's label timeline to S3 (per object, like transcripts) and return its key"""
+    timeline_key = f"{LABEL_TIMELINE_PREFIX}{object_key}.timeline.json.gz"
+    s3_client.put_object(
+        Bucket=AWS_BUCKET,
+        Key=timeline_key,
+        Body=gzip.compress(json.dumps(timeline, separators=(',', ':')).encode('utf-8'), compresslevel=6),
+        ContentType='application/json',
+        ContentEncoding='gzip'
+    )
+    return timeline_key
+
+def _object_files(object_key: str):
+    """S3 keys belonging to a stored object: the object itself and its transcript/timeline sidecars"""
+    return [
+        object_key,
+        f"{TRANSCRIPT_PREFIX}{object_key}.txt.gz",
+        f"{TRANSCRIPT_PREFIX}{object_key}.times.json.gz",
+        f"{LABEL_TIMELINE_PREFIX}{object_key}.timeline.json.gz"
+    ]
+
+def _delete_object_files(object_key: str):
+    """Delete a stored object and its sidecars (deleting a sidecar that was never written is a no-op)"""
+    for file_key in _object_files(object_key):
+        s3_client.delete_object(Bucket=AWS_BUCKET, Key=file_key)
+    invalidate_presigned_url(object_key)
+
+def _discard_sidecars(object_key: str, keys):
+    """Sidecars written for an item that was deleted meanwhile. Sidecars are per object, so they are only
+    removed once the object itself is gone; while it is still stored another item shares them."""
     try:
-        max_attempts = 720  # 12 hours (polling every 60 seconds)
-        attempt = 0
+        s3_client.head_object(Bucket=AWS_BUCKET, Key=object_key)
+        return
+    except s3_client.exceptions.ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+    for file_key in keys:
+        if file_key:
+            s3_client.delete_object(Bucket=AWS_BUCKET, Key=file_key)
+
+def _finish_transcription_job(job, job_response):
+    """Job tracker completion: fetch the transcript, tag it, merge with visual labels and update DynamoDB"""
+    job_name = job['job_id']
+    db_item_key = job['payload']['db_item_key']
+    object_key = job['payload']['file_key']
+    print(f"[BACKGROUND] Transcription completed: {job_name}")
+    transcript_uri = job_response['TranscriptionJob']['Transcript']['TranscriptFileUri']
+    
+    url_response = http_session().get(transcript_uri, timeout=60)
+    url_response.raise_for_status()
+    transcript_json = url_response.json()
+    if enrichment_cache is not None:
+        enrichment_cache.put(job['payload'].get('content_hash'), 'transcribe', TRANSCRIBE_PARAMS, transcript_json)
+    # No speech still finishes the item: it keeps its visual labels (if any) and becomes ready
+    transcript_text = transcript_from_json(transcript_json) or ''
+    print(f"[BACKGROUND] Extracted transcript ({len(transcript_text)} chars)")
+    
+    # Get visual labels if this is a video (they're stored separately)
+    final_tags = []
+    visual_labels = []
+    
+    if dynamodb:
+        # Retrieve current item to get visual labels; a deleted file gets nothing written for it
+        item = dynamodb.get_item(Key={'filename': db_item_key}).get('Item')
+        if item is None or item.get('deleted'):
+            print(f"[BACKGROUND] File was deleted during transcription, dropping results: {db_item_key}")
+            return
+        visual_labels = item.get('visual_labels', [])
+        print(f"[BACKGROUND] Found {len(visual_labels)} visual labels from video")
         
-        while attempt < max_attempts:
-            try:
-                job_response = transcribe.get_transcription_job(
-                    TranscriptionJobName=job_name
-                )
-                status = job_response['TranscriptionJob']['TranscriptionJobStatus']
-                
-                if attempt % 5 == 0:  # Log every 5 polls (5 minutes)
-                    print(f"[BACKGROUND] Transcription status: {status} (elapsed: {attempt*60}s)")
-                
-                if status == 'COMPLETED':
-                    print(f"[BACKGROUND] Transcription completed: {job_name}")
-                    transcript_uri = job_response['TranscriptionJob']['Transcript']['TranscriptFileUri']
-                    
-                    try:
-                        with urllib.request.urlopen(transcript_uri) as url_response:
-                            transcript_json = json.loads(url_response.read().decode('utf-8'))
-                            if 'results' in transcript_json and 'transcripts' in transcript_json['results']:
-                                transcripts = transcript_json['results']['transcripts']
-                                if len(transcripts) > 0:
-                                    transcript_text = transcripts[0]['transcript']
-                                    print(f"[BACKGROUND] Extracted transcript ({len(transcript_text)} chars)")
-                                    
-                                    # Get visual labels if this is a video (they're stored separately)
-                                    final_tags = []
-                                    visual_labels = []
-                                    
-                                    if dynamodb:
-                                        # Retrieve current item to get visual labels
-                                        item_response = dynamodb.get_item(Key={'filename': db_item_key})
-                                        if 'Item' in item_response:
-                                            visual_labels = item_response['Item'].get('visual_labels', [])
-                                            print(f"[BACKGROUND] Found {len(visual_labels)} visual labels from video")
-                                        
-                                        # Check if transcript has meaningful content
-                                        if transcript_text.strip() and len(transcript_text.strip()) >= 20:
-                                            # Transcript is valid - generate tags from it
-                                            transcript_tags = get_text_tags(transcript_text)
-                                            transcript_tags = deduplicate_tags(transcript_tags)
-                                            print(f"[BACKGROUND] Generated {len(transcript_tags)} unique tags from transcript")
-                                            
-                                            # Combine transcript tags and visual labels (remove duplicates case-insensitively)
-                                            combined = transcript_tags + visual_labels
-                                            final_tags = deduplicate_tags(combined)[:15]
-                                            print(f"[BACKGROUND] Combined tags: {len(final_tags)} unique total (transcript + visual)")
-                                        else:
-                                            # Transcript is empty or too short - use only visual labels
-                                            if visual_labels:
-                                                final_tags = visual_labels[:15]
-                                                print(f"[BACKGROUND] Transcript too short/empty, using {len(final_tags)} visual labels only")
-                                            else:
-                                                final_tags = []
-                                                print(f"[BACKGROUND] No transcript and no visual labels available")
-                                        
-                                        # Update DynamoDB with both transcript and final tags
-                                        dynamodb.update_item(
-                                            Key={'filename': db_item_key},
-                                            UpdateExpression='SET tags = :tags, transcript = :transcript',
-                                            ExpressionAttributeValues={
-                                                ':tags': final_tags,
-                                                ':transcript': transcript_text
-                                            }
-                                        )
-                                        print(f"[BACKGROUND] Updated DynamoDB with transcript and {len(final_tags)} final tags")
-                                    return
-                    except Exception as e:
-                        print(f"[BACKGROUND] Error processing transcript: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        return
-                        
-                elif status == 'FAILED':
-                    print(f"[BACKGROUND] Transcription failed: {job_response['TranscriptionJob'].get('FailureReason', 'Unknown')}")
-                    return
-                
-            except Exception as e:
-                print(f"[BACKGROUND] Error polling job: {e}")
-            
-            attempt += 1
-            time.sleep(60)  # Poll every 60 seconds
+        final_tags = media_tags(transcript_text, visual_labels)
         
-        print(f"[BACKGROUND] Transcription job timed out: {job_name}")
-    except Exception as e:
-        print(f"[BACKGROUND] Fatal error in transcription background task: {e}")
-        import traceback
-        traceback.print_exc()
-    except Exception as e:
-        print(f"[BACKGROUND] Fatal error in transcription background task: {e}")
-        import traceback
-        traceback.print_exc()
+        # Update DynamoDB with both transcript and final tags
+        word_times = align_word_times(transcript_text, timed_words_from_json(transcript_json)) if transcript_text else None
+        set_fields, remove = _transcript_update(object_key, transcript_text, word_times)
+        set_fields.update({'tags': final_tags, 'status': 'ready', **change_stamp(db_item_key)})
+        update_expression, names, values = _update_parts(set_fields, remove)
+        try:
+            dynamodb.update_item(
+                Key={'filename': db_item_key},
+                UpdateExpression=update_expression,
+                ConditionExpression=Attr('deleted').not_exists(),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            print(f"[BACKGROUND] File was deleted during transcription, dropping results: {db_item_key}")
+            _discard_sidecars(object_key, [set_fields.get('transcript_key'), set_fields.get('transcript_times_key')])
+            return
+        print(f"[BACKGROUND] Updated DynamoDB with transcript and {len(final_tags)} final tags")
+        query_cache.bump_version()
+        _index_item({
+            'filename': db_item_key,
+            'original_name': item.get('original_name', db_item_key),
+            'tags': final_tags,
+            'transcript': transcript_text,
+            'transcript_times': word_times
+        })
+        _complete_duplicates(db_item_key, job['payload'].get('content_hash'))
+
+def _poll_video_job(job):
+    """Job tracker poll: check one Rekognition label detection job (a single label keeps the poll cheap)"""
+    job_response = rekognition.get_label_detection(JobId=job['job_id'], MaxResults=1)
+    status = job_response['JobStatus']
+    if status == 'SUCCEEDED':
+        return 'done', None
+    if status == 'FAILED':
+        return 'failed', job_response.get('StatusMessage', 'Unknown')
+    return 'pending', None
 
-def process_video_job_background(job_id, db_item_key):
-    """Background task: Poll video label detection job and update DynamoDB when complete"""
-    print(f"[BACKGROUND] Monitoring video job: {job_id}")
+def _finish_video_job(job, _):
+    """Job tracker completion: keep the top visual labels for merging with transcript tags"""
+    job_id = job['job_id']
+    db_item_key = job['payload']['db_item_key']
+    print(f"[BACKGROUND] Video label detection completed: {job_id}")
+    # Every result page, aggregated as it streams in
+    timeline, duration_ms = collect_label_timeline(rekognition, job_id, VIDEO_LABEL_PARAMS['MinConfidence'])
+    timeline = timeline.to_dict(duration_ms)
+    if enrichment_cache is not None:
+        enrichment_cache.put(job['payload'].get('content_hash'), 'rekognition.label_detection', VIDEO_TIMELINE_PARAMS, timeline)
+    labels_list = video_labels_from_timeline(timeline)
+    print(f"[BACKGROUND] {len(timeline['labels'])} labels in the video; top by screen time: {labels_list}")
+    
+    # Store visual labels in a temporary spot - will be merged with transcript tags later
+    if dynamodb:
+        item = dynamodb.get_item(Key={'filename': db_item_key}, ProjectionExpression='deleted').get('Item')
+        if item is None or item.get('deleted'):
+            print(f"[BACKGROUND] File was deleted during label detection, dropping results: {db_item_key}")
+            return
+        object_key = job['payload']['file_key']
+        timeline_key = _store_label_timeline(object_key, timeline)
+        try:
+            dynamodb.update_item(
+                Key={'filename': db_item_key},
+                UpdateExpression='SET visual_labels = :labels, label_timeline_key = :timeline, updated_at = :now, feed_shard = :shard',
+                ConditionExpression=Attr('deleted').not_exists(),
+                ExpressionAttributeValues={':labels': labels_list, ':timeline': timeline_key, ':now': now_ms(), ':shard': feed_shard(db_item_key)}
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            print(f"[BACKGROUND] File was deleted during label detection, dropping results: {db_item_key}")
+            _discard_sidecars(object_key, [timeline_key])
+            return
+        print(f"[BACKGROUND] Stored visual labels for video")
+        query_cache.bump_version()
+
+def _media_job_failed(job, reason: str):
+    """Job tracker gave up on a Transcribe/Rekognition job: surface the item as failed instead of processing forever"""
+    db_item_key = job['payload']['db_item_key']
     try:
-        max_attempts = 600  # 10 hours (polling every 60 seconds)
-        attempt = 0
-        
-        while attempt < max_attempts:
-            try:
-                job_response = rekognition.get_label_detection(JobId=job_id)
-                status = job_response['JobStatus']
-                
-                if attempt % 5 == 0:  # Log every 5 polls (5 minutes)
-                    print(f"[BACKGROUND] Video label detection status: {status} (elapsed: {attempt*60}s)")
-                
-                if status == 'SUCCEEDED':
-                    print(f"[BACKGROUND] Video label detection completed: {job_id}")
-                    labels_with_confidence = []
-                    if 'Labels' in job_response:
-                        for label_obj in job_response['Labels']:
-                            if 'Label' in label_obj and 'Name' in label_obj['Label']:
-                                confidence = label_obj.get('Label', {}).get('Confidence', 0)
-                                # Only include labels with confidence >= 70
-                                if confidence >= 70:
-                                    labels_with_confidence.append({
-                                        'name': label_obj['Label']['Name'],
-                                        'confidence': confidence
-                                    })
-                    
-                    # Sort by confidence (descending) and extract top 6 labels
-                    sorted_labels = sorted(labels_with_confidence, key=lambda x: x['confidence'], reverse=True)
-                    labels_list = [label['name'] for label in sorted_labels][:6]
-                    labels_list = deduplicate_tags(labels_list)  # Ensure uniqueness
-                    print(f"[BACKGROUND] Extracted {len(labels_list)} unique high-confidence visual labels from video")
-                    
-                    # Store visual labels in a temporary spot - will be merged with transcript tags later
-                    if dynamodb:
-                        dynamodb.update_item(
-                            Key={'filename': db_item_key},
-                            UpdateExpression='SET visual_labels = :labels',
-                            ExpressionAttributeValues={':labels': labels_list}
-                        )
-                        print(f"[BACKGROUND] Stored visual labels for video")
-                    return
-                    
-                elif status == 'FAILED':
-                    print(f"[BACKGROUND] Video job failed: {job_response.get('StatusMessage', 'Unknown')}")
-                    return
-                    
-            except Exception as e:
-                print(f"[BACKGROUND] Error polling video job: {e}")
-            
-            attempt += 1
-            time.sleep(60)  # Poll every 60 seconds
-        
-        print(f"[BACKGROUND] Video job timed out: {job_id}")
-    except Exception as e:
-        print(f"[BACKGROUND] Fatal error in video background task: {e}")
-        import traceback
-        traceback.print_exc()
+        dynamodb.update_item(
+            Key={'filename': db_item_key},
+            UpdateExpression='SET #st = :failed, updated_at = :now, feed_shard = :shard',
+            ConditionExpression=Attr('deleted').not_exists() & Attr('status').eq('processing'),
+            ExpressionAttributeNames={'#st': 'status'},
+            ExpressionAttributeValues={':failed': 'failed', ':now': now_ms(), ':shard': feed_shard(db_item_key)}
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        # Deleted, or the other job of a video already finished it
+        return
+    print(f"[BACKGROUND] Marked {db_item_key} failed: {reason}")
+    query_cache.bump_version()
+    _release_duplicates(db_item_key, job['payload'].get('content_hash'))
+
+def start_job_tracker():
+    """Create the job tracker on first use and start its scheduler; jobs pending from before a restart resume"""
+    global job_tracker
+    with _job_tracker_lock:
+        if job_tracker is None:
+            notifier = None
+            if JOBS_NOTIFICATION_QUEUE_URL:
+                notifier = SqsNotifier(aws_client('sqs'), JOBS_NOTIFICATION_QUEUE_URL)
+            job_tracker = JobTracker(JobStore(JOBS_DB_PATH), notifier=notifier)
+            job_tracker.register('transcribe', _poll_transcription_job, _finish_transcription_job, _media_job_failed)
+            job_tracker.register('video_labels', _poll_video_job, _finish_video_job, _media_job_failed)
+    if transcribe is None: startup()
+    job_tracker.start()
+    return job_tracker
+
+# Routes run on a thread pool, so guard client construction against concurrent first requests
+_startup_lock = threading.Lock()
+
+def presigned_url(key: str) -> str:
+    """Return a presigned GET URL for key, reusing a cached one while it has enough lifetime left"""
+    global s3_client, AWS_BUCKET
+    if s3_client is None: startup()
+    
+    now = time.time()
+    with _presign_lock:
+        entry = _presign_cache.get(key)
+        if entry and entry[1] - now >= PRESIGN_MIN_REMAINING_SECONDS:
+            _presign_cache.move_to_end(key)
+            _presign_stats['hits'] += 1
+            return entry[0]
+        _presign_stats['misses'] += 1
+    
+    # Sign outside the lock; a concurrent miss on the same key just signs twice
+    url = s3_client.generate_presigned_url(
+        'get_object', 
+        Params={'Bucket': AWS_BUCKET, 'Key': key}, 
+        ExpiresIn=PRESIGN_EXPIRES_SECONDS
+    )
+    with _presign_lock:
+        _presign_cache[key] = (url, now + PRESIGN_EXPIRES_SECONDS)
+        _presign_cache.move_to_end(key)
+        while len(_presign_cache) > PRESIGN_CACHE_SIZE:
+            _presign_cache.popitem(last=False)
+            _presign_stats['evictions'] += 1
+    return url
+
+def invalidate_presigned_url(key: str):
+    with _presign_lock:
+        _presign_cache.pop(key, None)
+
+def presign_cache_stats():
+    with _presign_lock:
+        lookups = _presign_stats['hits'] + _presign_stats['misses']
+        return {
+            **_presign_stats,
+            'size': len(_presign_cache),
+            'capacity': PRESIGN_CACHE_SIZE,
+            'hit_rate': _presign_stats['hits'] / lookups if lookups else 0.0
+        }
 
 def startup():
-    global s3_client, AWS_BUCKET, rekognition, comprehend, transcribe, dynamodb, textract
+    with _startup_lock:
+        _startup()
+
+def _startup():
+    global s3_client, AWS_BUCKET, rekognition, comprehend, transcribe, dynamodb, dynamo_resource, textract, content_index, change_feed_ready, enrichment_cache
     
     AWS_REGION = os.getenv("S3_REGION")
     AWS_BUCKET = os.getenv("BUCKET_NAME")
 
+    if enrichment_cache is None and ENRICHMENT_CACHE_PATH:
+        try:
+            enrichment_cache = EnrichmentCache(ENRICHMENT_CACHE_PATH, ENRICHMENT_CACHE_MAX_MB * 1024 * 1024)
+        except Exception as e:
+            print(f"Enrichment cache {ENRICHMENT_CACHE_PATH} unavailable, AWS responses won't be cached: {e}")
+
     if not AWS_BUCKET:
         print("CRITICAL ERROR: AWS_BUCKET not found. Check .env file.")
 
     if s3_client is None:
         try:
-            s3_client = boto3.client('s3', region_name=AWS_REGION)
-            rekognition = boto3.client('rekognition', region_name=AWS_REGION)
-            comprehend = boto3.client('comprehend', region_name=AWS_REGION)
-            transcribe = boto3.client('transcribe', region_name=AWS_REGION)
-            textract = boto3.client('textract', region_name=AWS_REGION) # Added Textract client
-            dynamo_resource = boto3.resource('dynamodb', region_name=AWS_REGION)
+            # Shared, pooled clients (see clients.py for pool sizes, retries and timeouts)
+            s3_client = aws_client('s3', AWS_REGION)
+            rekognition = aws_client('rekognition', AWS_REGION)
+            comprehend = aws_client('comprehend', AWS_REGION)
+            transcribe = aws_client('transcribe', AWS_REGION)
+            textract = aws_client('textract', AWS_REGION) # Added Textract client
+            dynamo_resource = aws_resource('dynamodb', AWS_REGION)
             dynamodb = dynamo_resource.Table('MediaTags')
             print(f"AWS Services Initialized. Bucket: {AWS_BUCKET}")
         except Exception as e:
             print(f"Failed to connect to AWS: {e}")
+            return
+        try:
+            table = dynamo_resource.Table(CONTENT_INDEX_TABLE)
+            table.load()
+            content_index = table
+        except Exception as e:
+            print(f"Content index table {CONTENT_INDEX_TABLE} unavailable, upload dedup disabled: {e}")
+        try:
+            indexes = dynamodb.global_secondary_indexes or []
+            change_feed_ready = any(index['IndexName'] == CHANGE_FEED_INDEX for index in indexes)
+        except Exception as e:
+            print(f"Could not read MediaTags indexes: {e}")
+        if not change_feed_ready:
+            print(f"Change feed index {CHANGE_FEED_INDEX} not found, deltas will scan the table")
 
-def get_ai_tags(bucket, key, file_ext):
+def warm_connections():
+    """Open the S3 and DynamoDB connections (TCP + TLS) the request path uses, so the first request
+    after boot reuses them instead of paying the handshakes"""
+    if s3_client is None: startup()
+    started = time.time()
+    for service, call in (
+        ('s3', lambda: s3_client.head_bucket(Bucket=AWS_BUCKET)),
+        ('dynamodb', lambda: dynamo_resource.meta.client.describe_table(TableName=dynamodb.name)),
+    ):
+        try:
+            call()
+        except Exception as e:
+            print(f"Warm-up call to {service} failed: {e}")
+    http_session()
+    print(f"Connections warmed in {time.time() - started:.2f}s")
+
+@metrics.timed('image_tags')
+def get_ai_tags(bucket, key, file_ext, content_hash=None):
     """Helper: Extract importance-weighted labels from image using AWS Rekognition"""
     if file_ext not in ['jpg', 'jpeg', 'png']:
         return [] 
 
-    try:
-        response = rekognition.detect_labels(
-            Image={'S3Object': {'Bucket': bucket, 'Name': key}},
-            MaxLabels=10,
-            MinConfidence=70
-        )
-        
-        # Filter by confidence (>= 0.75) and sort by confidence score
-        high_confidence = [label for label in response['Labels'] if label.get('Confidence', 0) >= 99]
-        sorted_labels = sorted(high_confidence, key=lambda x: x.get('Confidence', 0), reverse=True)
-        
-        # Extract names, limit to top 6
-        return [label['Name'] for label in sorted_labels][:6]
-    except Exception as e:
-        print(f"AI Tagging Error: {e}")
-        return []
+    # Errors propagate so the ingest queue retries the item
+    labels = cached_response(content_hash, 'rekognition.detect_labels', IMAGE_LABEL_PARAMS, lambda: rekognition.detect_labels(
+        Image={'S3Object': {'Bucket': bucket, 'Name': key}},
+        **IMAGE_LABEL_PARAMS
+    )['Labels'])
+    return image_tags_from_labels(labels)
+
+def image_tags_from_labels(labels):
+    """Post-process raw detect_labels output into tags"""
+    # Filter by confidence (>= 0.75) and sort by confidence score
+    high_confidence = [label for label in labels if label.get('Confidence', 0) >= 99]
+    sorted_labels = sorted(high_confidence, key=lambda x: x.get('Confidence', 0), reverse=True)
+    
+    # Extract names, limit to top 6
+    return [label['Name'] for label in sorted_labels][:6]
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+|\n{2,}')
+
+def recompute_tags(item, allow_api: bool = False):
+    """Tags for a catalog item rebuilt from its stored transcript and cached raw service responses,
+    with the current post-processing rules. None if there is nothing to rebuild from (and allow_api is off)."""
+    name = item.get('original_name', item['filename'])
+    file_ext = name.split('.')[-1].lower()
+    content_hash = item.get('content_hash')
+    transcript = load_transcript(item)
+    
+    def transcript_tags():
+        params = {'chunk_bytes': TAG_CHUNK_BYTES, 'max_chunks': TAG_MAX_CHUNKS}
+        phrase_lists = enrichment_cache.get(text_hash(transcript), 'comprehend.batch_detect_key_phrases', params) if enrichment_cache else None
+        if phrase_lists is not None:
+            return text_tags_from_key_phrases(phrase_lists)
+        return get_text_tags(transcript) if allow_api else None
+    
+    if file_ext in ['jpg', 'jpeg', 'png']:
+        labels = enrichment_cache.get(content_hash, 'rekognition.detect_labels', IMAGE_LABEL_PARAMS) if enrichment_cache else None
+        if labels is None:
+            return None
+        return image_tags_from_labels(labels)
+    if file_ext in ['mp3', 'wav', 'mp4', 'mov']:
+        visual_labels = item.get('visual_labels', [])
+        if file_ext in ['mp4', 'mov']:
+            timeline = _cached_video_timeline(content_hash)
+            if timeline is not None:
+                visual_labels = video_labels_from_timeline(timeline)
+        if not _has_spoken_text(transcript):
+            return merge_media_tags(None, visual_labels)
+        tags = transcript_tags()
+        return None if tags is None else merge_media_tags(tags, visual_labels)
+    if transcript.strip():
+        return transcript_tags()
+    return None
+
+def _sentence_chunks(text: str, max_bytes: int):
+    """Split text into chunks of whole sentences, each at most max_bytes of UTF-8 (long sentences split on spaces)"""
+    chunks = []
+    current = []
+    size = 0
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        encoded = len(sentence.encode('utf-8')) + 1
+        if encoded > max_bytes:
+            # Run-on sentence (or no punctuation at all, e.g. some transcripts): fall back to word boundaries
+            pieces = sentence.split()
+            sentence_parts, part, part_size = [], [], 0
+            for word in pieces:
+                word_size = len(word.encode('utf-8')) + 1
+                if part and part_size + word_size > max_bytes:
+                    sentence_parts.append(' '.join(part))
+                    part, part_size = [], 0
+                part.append(word[:max_bytes // 4])
+                part_size += word_size
+            if part:
+                sentence_parts.append(' '.join(part))
+        else:
+            sentence_parts = [sentence]
+        for piece in sentence_parts:
+            piece_size = len(piece.encode('utf-8')) + 1
+            if current and size + piece_size > max_bytes:
+                chunks.append(' '.join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += piece_size
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
 
+def _detect_key_phrases_batch(chunks):
+    response = comprehend.batch_detect_key_phrases(TextList=chunks, LanguageCode='en')
+    errors = response.get('ErrorList', [])
+    if errors:
+        # A partial result would be cached (and tagged) as if the failed chunks had no phrases;
+        # raising leaves nothing cached and lets the ingest queue retry the item
+        details = '; '.join(f"chunk {error.get('Index')}: {error.get('ErrorMessage')}" for error in errors)
+        raise RuntimeError(f"Comprehend failed on {len(errors)} of {len(chunks)} chunks ({details})")
+    # Keep only what tagging reads, so cached responses stay small
+    phrase_lists = [[] for _ in chunks]
+    for result in response.get('ResultList', []):
+        phrase_lists[result['Index']] = [
+            {'Text': phrase['Text'], 'Score': phrase['Score']} for phrase in result.get('KeyPhrases', [])
+        ]
+    return phrase_lists
+
+def text_tags_from_key_phrases(phrase_lists):
+    """Post-process per-chunk key phrases into tags: sum scores across chunks, rank, deduplicate"""
+    scores = {}
+    names = {}
+    for phrases in phrase_lists:
+        for phrase in phrases:
+            if phrase['Score'] < 0.8:
+                continue
+            norm = phrase['Text'].strip().lower()
+            # A phrase that recurs across the document outranks a one-off
+            scores[norm] = scores.get(norm, 0.0) + phrase['Score']
+            names.setdefault(norm, phrase['Text'].strip())
+    ranked = sorted(scores, key=lambda norm: scores[norm], reverse=True)
+    return deduplicate_tags([names[norm] for norm in ranked])[:8] # Limit to top 8 unique tags
+
+@metrics.timed('text_tags')
 def get_text_tags(text):
-    """Extract importance-weighted tags from text using Amazon Comprehend."""
+    """Extract importance-weighted tags from text using Amazon Comprehend.
+    The whole text is tagged: sentence-aligned chunks go through batch_detect_key_phrases
+    (25 per call, on a bounded pool) and phrase scores are summed across chunks."""
     global comprehend
     if comprehend is None:
         startup()
@@ -260,209 +728,262 @@ def get_text_tags(text):
         print("Warning: Empty text provided to get_text_tags")
         return []
     
-    try:
-        # Comprehend can process up to 5000 characters per call for key phrases
-        text_truncated = text[:4900] # Keep some buffer
-        
-        response = comprehend.detect_key_phrases(
-            Text=text_truncated,
-            LanguageCode='en'
-        )
-        
-        tags = [phrase['Text'] for phrase in response['KeyPhrases'] if phrase['Score'] >= 0.8]
-        tags = deduplicate_tags(tags)[:8] # Limit to top 8 unique tags
-        
-        print(f"Extracted {len(tags)} tags using Amazon Comprehend.")
-        return tags
-            
-    except Exception as e:
-        print(f"Comprehend Tagging Error: {e}")
-        return []
+    started = time.time()
+    calls = []
+    def fetch():
+        chunks = _sentence_chunks(text, TAG_CHUNK_BYTES)
+        if len(chunks) > TAG_MAX_CHUNKS:
+            # Very long documents: sample chunks evenly across the whole text
+            step = len(chunks) / TAG_MAX_CHUNKS
+            chunks = [chunks[int(i * step)] for i in range(TAG_MAX_CHUNKS)]
+        batches = [chunks[i:i + COMPREHEND_BATCH_SIZE] for i in range(0, len(chunks), COMPREHEND_BATCH_SIZE)]
+        calls.append(len(batches))
+        return [phrases for phrase_lists in _comprehend_pool.map(_detect_key_phrases_batch, batches) for phrases in phrase_lists]
+    
+    # A Comprehend error propagates (nothing is cached) so the ingest queue retries the item
+    params = {'chunk_bytes': TAG_CHUNK_BYTES, 'max_chunks': TAG_MAX_CHUNKS}
+    phrase_lists = cached_response(text_hash(text), 'comprehend.batch_detect_key_phrases', params, fetch)
+    tags = text_tags_from_key_phrases(phrase_lists)
+    
+    print(f"Extracted {len(tags)} tags using Amazon Comprehend "
+          f"({len(phrase_lists)} chunks, {sum(calls)} API calls, {time.time() - started:.2f}s).")
+    return tags
 
-def get_text_from_document_aws(document_bytes: bytes, file_type: str) -> str:
-    """Extract text from a document (image or PDF) using Amazon Textract."""
+def get_text_from_document_aws(document_bytes: bytes, file_type: str, by_page: bool = False):
+    """Extract text from a document (image or PDF) using Amazon Textract.
+    With by_page=True a PDF returns {1-based page number: text} instead of one string."""
     global textract, s3_client, AWS_BUCKET # Added s3_client and AWS_BUCKET
     if textract is None:
         startup()
 
-    try:
-        print(f"Textract: Attempting to detect text for file type: {file_type}")
-        extracted_text = ""
+    print(f"Textract: Attempting to detect text for file type: {file_type}")
+    if file_type not in ['png', 'jpeg', 'pdf']:
+        print(f"Textract: Unsupported file type for Textract: {file_type}")
+        return {} if by_page else ""
+    content_hash = hashlib.sha256(document_bytes).hexdigest()
+    lines = cached_response(content_hash, 'textract.text_detection', {}, lambda: _textract_lines(document_bytes, file_type))
 
-        if file_type in ['png', 'jpeg']:
-            response = textract.detect_document_text(
-                Document={'Bytes': document_bytes}
-            )
-            for item in response["Blocks"]:
-                if item["BlockType"] == "LINE":
-                    extracted_text += item["Text"] + "\n"
-        elif file_type == 'pdf':
-            # For multi-page PDFs, use asynchronous Textract
-            print("Textract: Starting asynchronous text detection for PDF.")
-
-            # Generate a temporary S3 key for the PDF bytes
-            temp_key = f"temp_textract_pdf/{uuid.uuid4().hex}.pdf"
-            
-            # Upload the PDF bytes to S3
-            s3_client.put_object(Bucket=AWS_BUCKET, Key=temp_key, Body=document_bytes)
-            print(f"Textract: Uploaded PDF to temporary S3 location: s3://{AWS_BUCKET}/{temp_key}")
+    pages = {}
+    for line in lines:
+        pages.setdefault(line.get("Page", 1), []).append(line["Text"])
+    if by_page:
+        return {page: "\n".join(page_lines) for page, page_lines in pages.items()}
+    extracted_text = "\n".join("\n".join(pages[page]) for page in sorted(pages))
 
-            start_response = textract.start_document_text_detection(
-                DocumentLocation={'S3Object': {'Bucket': AWS_BUCKET, 'Name': temp_key}}
-            )
-            job_id = start_response['JobId']
-            print(f"Textract: Job started with ID: {job_id}")
-
-            # Poll for job completion
-            status = ''
-            while status != 'SUCCEEDED' and status != 'FAILED':
-                time.sleep(5) # Poll every 5 seconds
-                job_response = textract.get_document_text_detection(JobId=job_id)
-                status = job_response['JobStatus']
-                print(f"Textract: Job status: {status}")
-
-            # Delete the temporary S3 object after processing
-            s3_client.delete_object(Bucket=AWS_BUCKET, Key=temp_key)
-            print(f"Textract: Deleted temporary S3 object: s3://{AWS_BUCKET}/{temp_key}")
-
-            if status == 'SUCCEEDED':
-                pages = []
-                next_token = None
-                while True:
-                    if next_token:
-                        page_response = textract.get_document_text_detection(JobId=job_id, NextToken=next_token)
-                    else:
-                        page_response = job_response # First page is already in job_response
-
-                    for item in page_response["Blocks"]:
-                        if item["BlockType"] == "LINE":
-                            extracted_text += item["Text"] + "\n"
-                    
-                    next_token = page_response.get('NextToken')
-                    if not next_token:
-                        break
-            else:
-                print(f"Textract: Asynchronous text detection failed for job ID: {job_id}")
-                return ""
-        else:
-            print(f"Textract: Unsupported file type for Textract: {file_type}")
-            return ""
+    print(f"Textract: Extracted {len(extracted_text)} characters using Amazon Textract.")
+    if not extracted_text.strip():
+        print("Textract: Extracted text is empty or only whitespace.")
+    return extracted_text
 
-        print(f"Textract: Extracted {len(extracted_text)} characters using Amazon Textract.")
-        if not extracted_text.strip():
-            print("Textract: Extracted text is empty or only whitespace.")
-        return extracted_text
-    except Exception as e:
-        print(f"Textract: Error in get_text_from_document_aws: {e}")
-        return ""
+def _line_blocks(blocks):
+    """LINE blocks reduced to what text extraction reads (the cached form of a Textract response)"""
+    return [
+        {'Text': block['Text'], 'Page': block.get('Page', 1), 'Confidence': block.get('Confidence')}
+        for block in blocks if block['BlockType'] == 'LINE'
+    ]
+
+def _textract_lines(document_bytes: bytes, file_type: str):
+    """Run Textract on an image (sync) or PDF (async job); LINE blocks. Raises if the job failed."""
+    if file_type in ['png', 'jpeg']:
+        response = textract.detect_document_text(
+            Document={'Bytes': document_bytes}
+        )
+        return _line_blocks(response["Blocks"])
+
+    # For multi-page PDFs, use asynchronous Textract
+    print("Textract: Starting asynchronous text detection for PDF.")
 
+    # Generate a temporary S3 key for the PDF bytes
+    temp_key = f"temp_textract_pdf/{uuid.uuid4().hex}.pdf"
+    
+    # Upload the PDF bytes to S3
+    s3_client.put_object(Bucket=AWS_BUCKET, Key=temp_key, Body=document_bytes)
+    print(f"Textract: Uploaded PDF to temporary S3 location: s3://{AWS_BUCKET}/{temp_key}")
+
+    try:
+        start_response = textract.start_document_text_detection(
+            DocumentLocation={'S3Object': {'Bucket': AWS_BUCKET, 'Name': temp_key}}
+        )
+        job_id = start_response['JobId']
+        print(f"Textract: Job started with ID: {job_id}")
+
+        # Poll for job completion
+        status = ''
+        while status != 'SUCCEEDED' and status != 'FAILED':
+            time.sleep(5) # Poll every 5 seconds
+            job_response = textract.get_document_text_detection(JobId=job_id)
+            status = job_response['JobStatus']
+            print(f"Textract: Job status: {status}")
+    finally:
+        # Delete the temporary S3 object after processing
+        s3_client.delete_object(Bucket=AWS_BUCKET, Key=temp_key)
+        print(f"Textract: Deleted temporary S3 object: s3://{AWS_BUCKET}/{temp_key}")
+
+    if status != 'SUCCEEDED':
+        raise RuntimeError(f"Textract: Asynchronous text detection failed for job ID: {job_id}")
+    lines = []
+    page_response = job_response # First page is already in job_response
+    while True:
+        lines.extend(_line_blocks(page_response["Blocks"]))
+        next_token = page_response.get('NextToken')
+        if not next_token:
+            break
+        page_response = textract.get_document_text_detection(JobId=job_id, NextToken=next_token)
+    return lines
+
+@metrics.timed('process_text')
 def process_text_file(bucket, key):
     """Download text file from S3 and extract tags using Qwen, return both tags and transcript"""
     global s3_client
     if s3_client is None:
         startup()
     
-    try:
-        print(f"Processing text file {key}...")
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        text_content = response['Body'].read().decode('utf-8', errors='ignore')
-        print(f"Text file read: {len(text_content)} characters")
-        tags = get_text_tags(text_content)
-        print(f"Text file tags: {tags}")
-        return {'tags': tags, 'transcript': text_content}
-    except Exception as e:
-        print(f"Text File Processing Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return {'tags': [], 'transcript': ''}
+    print(f"Processing text file {key}...")
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    text_content = response['Body'].read().decode('utf-8', errors='ignore')
+    print(f"Text file read: {len(text_content)} characters")
+    tags = get_text_tags(text_content)
+    print(f"Text file tags: {tags}")
+    return {'tags': tags, 'transcript': text_content}
+
+def _textract_image_lines(image_bytes: bytes):
+    response = textract.detect_document_text(Document={'Bytes': image_bytes})
+    return _line_blocks(response["Blocks"])
 
+@metrics.timed('pdf_ocr')
+def ocr_pdf_pages(pdf_bytes: bytes, page_numbers):
+    """OCR selected pages: {page index: text}. Pages are rendered with PyMuPDF and sent as images to
+    synchronous Textract on the shared OCR pool; without PyMuPDF the pages go as one async job."""
+    if textract is None:
+        startup()
+    if not can_render():
+        subset = subset_pdf(pdf_bytes, page_numbers)
+        ocr_text = get_text_from_document_aws(subset, 'pdf', by_page=True)
+        # Textract numbers the subset's pages from 1
+        return {page_numbers[page - 1]: text for page, text in ocr_text.items() if 0 < page <= len(page_numbers)}
+    
+    results = {}
+    content_hash = hashlib.sha256(pdf_bytes).hexdigest() if enrichment_cache else None
+    to_render = []
+    for page in page_numbers:
+        lines = enrichment_cache.get(content_hash, 'textract.detect_document_text', {'page': page, 'dpi': OCR_DPI}) if content_hash else None
+        if lines is None:
+            to_render.append(page)
+        else:
+            results[page] = "\n".join(line['Text'] for line in lines)
+    
+    futures = {}
+    # Rendering is lazy so at most a pool's worth of page images wait in memory at a time
+    pending = threading.BoundedSemaphore(OCR_CONCURRENCY * 2)
+    def ocr(image_bytes):
+        try:
+            return _textract_image_lines(image_bytes)
+        finally:
+            pending.release()
+    for page, image_bytes in render_pages(pdf_bytes, to_render, dpi=OCR_DPI):
+        pending.acquire()
+        futures[page] = _ocr_pool.submit(ocr, image_bytes)
+    
+    # Every page is waited for (and the good ones cached) before a failure is raised, so a retry
+    # only re-OCRs the pages that failed
+    error = None
+    for page, future in futures.items():
+        try:
+            lines = future.result()
+        except Exception as e:
+            print(f"Textract: OCR failed for page {page + 1}: {e}")
+            error = error or e
+            continue
+        if content_hash:
+            enrichment_cache.put(content_hash, 'textract.detect_document_text', {'page': page, 'dpi': OCR_DPI}, lines)
+        results[page] = "\n".join(line['Text'] for line in lines)
+    if error is not None:
+        raise error
+    print(f"Textract: OCR'd {len(futures)} pages synchronously, {len(page_numbers) - len(to_render)} from cache")
+    return results
+
+@metrics.timed('process_pdf')
 def process_pdf_file(bucket, key):
     """Download PDF from S3, extract text, and generate tags."""
     global s3_client
     if s3_client is None:
         startup()
 
-    try:
-        print(f"Processing PDF file {key}...")
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        pdf_bytes = response['Body'].read()
+    print(f"Processing PDF file {key}...")
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    pdf_bytes = response['Body'].read()
 
-        # 1) Try to extract text directly using pypdf
-        extracted_text = ''
-        if PdfReader is not None:
-            try:
-                reader = PdfReader(io.BytesIO(pdf_bytes))
-                for page in reader.pages:
-                    try:
-                        txt = page.extract_text() or ''
-                        extracted_text += txt + '\n'
-                    except Exception:
-                        continue
-                print(f"Successfully extracted {len(extracted_text)} characters using pypdf.")
-            except Exception as e:
-                print(f"pypdf extraction failed: {e}")
+    # 1) Extract the text layer page by page (PyMuPDF when installed, big documents in parallel)
+    pdf = None
+    try:
+        with metrics.stage('pdf_extract'):
+            pdf = extract_pdf(pdf_bytes)
+        print(f"Extracted {len(pdf.pages)} pages using {pdf.engine}; {len(pdf.ocr_pages)} look scanned.")
+    except Exception as e:
+        print(f"PDF text extraction failed: {e}")
 
-        # If text is extracted, generate tags and return with transcript
-        if extracted_text and len(extracted_text.strip()) >= 50:
-            print("Generating tags from pypdf extracted text.")
-            tags = get_text_tags(extracted_text)
-            return {'tags': tags, 'transcript': extracted_text}
+    ocr_pages = pdf.ocr_pages if pdf else []
+    if pdf and not ocr_pages and len(pdf.text.strip()) < 50:
+        # No usable text layer and no detectable images (e.g. outlined text): OCR every page
+        ocr_pages = list(range(len(pdf.pages)))
 
-        # 2) Fallback: If pypdf fails, use Amazon Textract for OCR
-        print("pypdf failed or extracted too little text. Falling back to Amazon Textract for OCR.")
+    # 2) OCR only the pages without a text layer, using Amazon Textract
+    if pdf and ocr_pages:
+        print(f"Sending {len(ocr_pages)} of {len(pdf.pages)} pages to Amazon Textract for OCR.")
+        pdf.fill(ocr_pdf_pages(pdf_bytes, ocr_pages))
+    elif pdf is None:
+        print("Falling back to Amazon Textract for OCR of the whole document.")
         ocr_text = get_text_from_document_aws(pdf_bytes, 'pdf')
-        
         if ocr_text and len(ocr_text.strip()) >= 20:
-            print(f"Successfully extracted {len(ocr_text)} characters using Amazon Textract fallback.")
-            print("Generating tags from OCR extracted text.")
             tags = get_text_tags(ocr_text)
             return {'tags': tags, 'transcript': ocr_text}
-        else:
-            print("Amazon Textract fallback did not yield significant text.")
 
-        print("Could not extract text from PDF using any method.")
-        return {'tags': [], 'transcript': ''}
-    except Exception as e:
-        print(f"PDF Processing Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return {'tags': [], 'transcript': ''}
+    extracted_text = pdf.text if pdf else ''
+    if extracted_text and len(extracted_text.strip()) >= 20:
+        print(f"Generating tags from {len(extracted_text)} characters of PDF text.")
+        tags = get_text_tags(extracted_text)
+        return {'tags': tags, 'transcript': extracted_text}
 
-def process_audio_file(bucket, key, db_item_key):
-    """Start AWS Transcribe job asynchronously and return immediately"""
-    global transcribe, s3_client
-    if transcribe is None:
-        startup()
-    
+    print("Could not extract text from PDF using any method.")
+    return {'tags': [], 'transcript': ''}
+
+def _media_job_token(db_item_key: str) -> str:
+    return hashlib.sha256(db_item_key.encode('utf-8')).hexdigest()
+
+def _start_transcription_job(bucket, key, db_item_key):
+    """Start Transcribe for an item and return the job name. The name is derived from the catalog key,
+    so a retried enrichment finds the job it already started instead of starting a second one."""
+    job_name = f"transcribe_{_media_job_token(db_item_key)[:32]}"
     try:
-        print(f"Starting transcription for {key}...")
-        # Start transcription job
-        job_name = f"transcribe_{int(time.time())}_{uuid.uuid4().hex[:8]}"
         transcribe.start_transcription_job(
             TranscriptionJobName=job_name,
             Media={'MediaFileUri': f's3://{bucket}/{key}'},
-            MediaFormat=key.split('.')[-1].lower(),
+            MediaFormat=key.split('.')[-1].lower(),  # mp3, wav, mp4, mov
             LanguageCode='en-US'
         )
         print(f"Transcription job started: {job_name}")
-        
-        # Launch background thread to monitor job
-        bg_thread = threading.Thread(
-            target=process_transcription_job_background,
-            args=(job_name, bucket, key, db_item_key),
-            daemon=True
-        )
-        bg_thread.start()
-        
-        # Return immediately with empty tags (will be filled by background task)
-        return []
-    except Exception as e:
-        print(f"Error starting transcription job: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+    except transcribe.exceptions.ConflictException:
+        print(f"Transcription job already started: {job_name}")
+    return job_name
+
+@metrics.timed('process_audio')
+def process_audio_file(bucket, key, db_item_key, content_hash=None):
+    """Start AWS Transcribe job asynchronously and return immediately"""
+    global transcribe, s3_client
+    if transcribe is None:
+        startup()
+    
+    print(f"Starting transcription for {key}...")
+    job_name = _start_transcription_job(bucket, key, db_item_key)
+
+    # Hand the job to the tracker, which fills in the transcript when it completes
+    start_job_tracker().track(job_name, 'transcribe', {'bucket': bucket, 'file_key': key, 'db_item_key': db_item_key, 'content_hash': content_hash})
 
-def process_video_file(bucket, key, db_item_key):
+    # Return immediately with empty tags (will be filled by background task)
+    return []
+
+@metrics.timed('process_video')
+def process_video_file(bucket, key, db_item_key, content_hash=None):
     """Start BOTH AWS Transcribe AND Rekognition Video jobs asynchronously"""
     global rekognition, transcribe
     if rekognition is None:
@@ -470,141 +991,467 @@ def process_video_file(bucket, key, db_item_key):
     if transcribe is None:
         startup()
     
+    print(f"Starting DUAL processing for video {key}...")
+
+    # 1. Start Transcribe job for audio (with video file)
+    print(f"  - Starting transcription for audio in {key}...")
+    transcribe_job_name = _start_transcription_job(bucket, key, db_item_key)
+
+    # 2. Start Rekognition Video job for visual labels
+    print(f"  - Starting visual label detection for {key}...")
+    # Same token for the same item: a retried start returns the job already running instead of a second one
+    client_request_token = _media_job_token(db_item_key)
+    label_kwargs = {}
+    if REKOGNITION_SNS_TOPIC_ARN and REKOGNITION_SNS_ROLE_ARN:
+        # Completion is published to SNS -> SQS so the tracker doesn't wait for its next poll
+        label_kwargs['NotificationChannel'] = {'SNSTopicArn': REKOGNITION_SNS_TOPIC_ARN, 'RoleArn': REKOGNITION_SNS_ROLE_ARN}
+    start_response = rekognition.start_label_detection(
+        Video={'S3Object': {'Bucket': bucket, 'Name': key}},
+        ClientRequestToken=client_request_token,
+        MinConfidence=70,
+        **label_kwargs
+    )
+    video_job_id = start_response['JobId']
+    print(f"  ✓ Video label detection job started: {video_job_id}")
+
+    # 3. Track both jobs (transcript tags get merged with visual labels when transcription completes)
+    tracker = start_job_tracker()
+    job_payload = {'bucket': bucket, 'file_key': key, 'db_item_key': db_item_key, 'content_hash': content_hash}
+    tracker.track(transcribe_job_name, 'transcribe', job_payload)
+    tracker.track(video_job_id, 'video_labels', job_payload)
+
+    print(f"✓ Both jobs tracked for {key}")
+    return []
+
+
+def _content_type(file_name: str) -> str:
+    # Use proper MIME type for ContentType
+    content_type, _ = mimetypes.guess_type(file_name)
+    return content_type or 'application/octet-stream'
+
+def _transfer_config(max_concurrency: int):
+    # Memory stays bounded at roughly part size * concurrency, whatever the file size
+    part_size = UPLOAD_PART_SIZE_MB * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency
+    )
+
+def _pending_item(key: str, file_name: str, url: str, **extra):
+    """New MediaTags record for an accepted upload, before enrichment (extra fields override the defaults)"""
+    item = {
+        'filename': key,
+        'original_name': file_name,
+        'url': url,
+        'tags': [],
+        'transcript': '',  # Filled by enrichment for .txt/.pdf; by the transcription job for audio/video
+        'visual_labels': [],  # Will be filled in by video job background task
+        'status': 'pending',
+        'created_at': str(int(time.time())),
+        **change_stamp(key)
+    }
+    item.update(extra)
+    return item
+
+def _object_key(item) -> str:
+    """S3 key holding an item's bytes; differs from the catalog key when the upload was a duplicate"""
+    return item.get('object_key') or item['filename']
+
+def _transcript_update(object_key: str, transcript: str, word_times=None):
+    """(SET fields, REMOVE attribute names) that store a transcript (and its word times) for an item. Long
+    transcripts are written to S3 first; they are keyed by the shared object, so deduplicated items share one copy."""
+    set_fields, remove = _transcript_text_update(object_key, transcript)
+    if word_times:
+        times_key = f"{TRANSCRIPT_PREFIX}{object_key}.times.json.gz"
+        s3_client.put_object(
+            Bucket=AWS_BUCKET,
+            Key=times_key,
+            Body=gzip.compress(json.dumps(word_times, separators=(',', ':')).encode('utf-8'), compresslevel=6),
+            ContentType='application/json',
+            ContentEncoding='gzip'
+        )
+        set_fields['transcript_times_key'] = times_key
+    else:
+        remove.append('transcript_times_key')
+    return set_fields, remove
+
+def _transcript_text_update(object_key: str, transcript: str):
+    if len(transcript) <= TRANSCRIPT_PREVIEW_CHARS:
+        return {'transcript': transcript}, ['transcript_key', 'transcript_length', 'transcript_bytes', 'transcript_preview']
+    data = transcript.encode('utf-8')
+    transcript_key = f"{TRANSCRIPT_PREFIX}{object_key}.txt.gz"
+    s3_client.put_object(
+        Bucket=AWS_BUCKET,
+        Key=transcript_key,
+        Body=gzip.compress(data, compresslevel=6),
+        ContentType='text/plain; charset=utf-8',
+        ContentEncoding='gzip'
+    )
+    fields = {
+        'transcript_key': transcript_key,
+        'transcript_length': len(transcript),
+        'transcript_bytes': len(data),
+        'transcript_preview': transcript[:TRANSCRIPT_PREVIEW_CHARS]
+    }
+    return fields, ['transcript']
+
+def _update_parts(set_fields: dict, remove=()):
+    """UpdateExpression, ExpressionAttributeNames and values for SET/REMOVE of plain attributes"""
+    names = {f'#a{i}': name for i, name in enumerate(set_fields)}
+    values = {f':v{i}': value for i, value in enumerate(set_fields.values())}
+    expression = 'SET ' + ', '.join(f'#a{i} = :v{i}' for i in range(len(set_fields)))
+    if remove:
+        offset = len(names)
+        names.update({f'#a{offset + i}': name for i, name in enumerate(remove)})
+        expression += ' REMOVE ' + ', '.join(f'#a{offset + i}' for i in range(len(remove)))
+    return expression, names, values
+
+def load_transcript(item) -> str:
+    """Full transcript text for an item, fetching it from S3 when it isn't stored inline"""
+    transcript_key = item.get('transcript_key')
+    if not transcript_key:
+        return item.get('transcript', '')
+    if s3_client is None: startup()
+    body = s3_client.get_object(Bucket=AWS_BUCKET, Key=transcript_key)['Body'].read()
+    return gzip.decompress(body).decode('utf-8')
+
+def _transcript_or_preview(item) -> str:
     try:
-        print(f"Starting DUAL processing for video {key}...")
-        
-        # 1. Start Transcribe job for audio (with video file)
-        print(f"  - Starting transcription for audio in {key}...")
-        transcribe_job_name = f"transcribe_{int(time.time())}_{uuid.uuid4().hex[:8]}"
-        transcribe.start_transcription_job(
-            TranscriptionJobName=transcribe_job_name,
-            Media={'MediaFileUri': f's3://{bucket}/{key}'},
-            MediaFormat=key.split('.')[-1].lower(),  # mp4, mov, etc.
-            LanguageCode='en-US'
+        return load_transcript(item)
+    except Exception as e:
+        print(f"Transcript fetch failed for {item.get('filename')}: {e}")
+        return item.get('transcript_preview', '')
+
+def load_word_times(item):
+    """Token-aligned {'start_ms', 'end_ms'} for an audio/video transcript, or None"""
+    times_key = item.get('transcript_times_key')
+    if not times_key:
+        return None
+    if s3_client is None: startup()
+    try:
+        body = s3_client.get_object(Bucket=AWS_BUCKET, Key=times_key)['Body'].read()
+        return json.loads(gzip.decompress(body))
+    except Exception as e:
+        print(f"Word times fetch failed for {item.get('filename')}: {e}")
+        return None
+
+def _with_transcripts(items):
+    """Yield items with the full transcript (and word times) loaded, fetching S3-stored ones in parallel"""
+    batch = []
+    def flush():
+        loaded = _transcript_pool.map(lambda item: (_transcript_or_preview(item), load_word_times(item)), batch)
+        for item, (text, word_times) in zip(batch, loaded):
+            yield dict(item, transcript=text, transcript_times=word_times)
+    for item in items:
+        batch.append(item)
+        if len(batch) >= 64:
+            yield from flush()
+            batch = []
+    if batch:
+        yield from flush()
+
+def iter_transcript(transcript_key: str, compressed: bool, start: int = 0, end: int = None):
+    """Stream a stored transcript from S3: the gzip bytes as stored, or decompressed UTF-8 bytes
+    start..end (inclusive) for HTTP range requests"""
+    if s3_client is None: startup()
+    body = s3_client.get_object(Bucket=AWS_BUCKET, Key=transcript_key)['Body']
+    try:
+        if compressed:
+            yield from body.iter_chunks(64 * 1024)
+            return
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        position = 0
+        for chunk in body.iter_chunks(64 * 1024):
+            data = decompressor.decompress(chunk)
+            lo = max(start - position, 0)
+            hi = len(data) if end is None else min(end + 1 - position, len(data))
+            if lo < hi:
+                yield data[lo:hi]
+            position += len(data)
+            if end is not None and position > end:
+                return
+        data = decompressor.flush()
+        lo = max(start - position, 0)
+        hi = len(data) if end is None else min(end + 1 - position, len(data))
+        if lo < hi:
+            yield data[lo:hi]
+    finally:
+        body.close()
+
+class _HashingReader:
+    """Read-through wrapper that SHA-256s a stream while the S3 transfer consumes it, so dedup costs no
+    extra read pass. It reports itself as not seekable so the transfer reads it once, in order."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self._digest.update(data)
+        self.size += len(data)
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self._fileobj.close()
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+def _claim_duplicate(content_hash: str, key: str):
+    """If this content is already stored, add key as a ref and return the content record, else None"""
+    if content_index is None:
+        return None
+    try:
+        response = content_index.update_item(
+            Key={'content_hash': content_hash},
+            UpdateExpression='ADD refs :key',
+            # Only join a record that still has an object; a concurrent last delete removes it
+            ConditionExpression=Attr('object_key').exists(),
+            ExpressionAttributeValues={':key': {key}},
+            ReturnValues='ALL_NEW'
         )
-        print(f"  ✓ Transcription job started: {transcribe_job_name}")
-        
-        # 2. Start Rekognition Video job for visual labels
-        print(f"  - Starting visual label detection for {key}...")
-        client_request_token = uuid.uuid4().hex[:8]
-        start_response = rekognition.start_label_detection(
-            Video={'S3Object': {'Bucket': bucket, 'Name': key}},
-            ClientRequestToken=client_request_token,
-            MinConfidence=70
+        return response['Attributes']
+    except content_index.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+
+def _register_content(content_hash: str, key: str):
+    """Record a newly stored object as the canonical copy of its content (first writer wins).
+    False if another upload of the same content registered first."""
+    if content_index is None:
+        return True
+    try:
+        content_index.put_item(
+            Item={'content_hash': content_hash, 'object_key': key, 'refs': {key}, 'created_at': now_ms()},
+            ConditionExpression=Attr('content_hash').not_exists()
         )
-        video_job_id = start_response['JobId']
-        print(f"  ✓ Video label detection job started: {video_job_id}")
-        
-        # 3. Launch background thread for transcription (will generate tags from transcript + merge with visual labels)
-        bg_thread_transcribe = threading.Thread(
-            target=process_transcription_job_background,
-            args=(transcribe_job_name, bucket, key, db_item_key),
-            daemon=True
+        return True
+    except content_index.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+def _share_content(content_hash: str, key: str):
+    """After an object is stored: join an existing copy of its content (returns that content record) or
+    register this object as the copy (returns None). Retries when a concurrent upload of the same
+    content registers in between; after that the object just stays unshared."""
+    for _ in range(3):
+        duplicate = _claim_duplicate(content_hash, key)
+        if duplicate:
+            return duplicate
+        if _register_content(content_hash, key):
+            return None
+    return None
+
+def _release_content(item):
+    """Drop a deleted item's ref. Returns the S3 key to delete, or None while other items still share it."""
+    key = item['filename']
+    content_hash = item.get('content_hash')
+    if content_index is None or not content_hash:
+        return _object_key(item)
+    try:
+        response = content_index.update_item(
+            Key={'content_hash': content_hash},
+            UpdateExpression='DELETE refs :key',
+            ConditionExpression='contains(refs, :k)',
+            ExpressionAttributeValues={':key': {key}, ':k': key},
+            ReturnValues='ALL_NEW'
         )
-        bg_thread_transcribe.start()
-        
-        # 4. Launch background thread for video label detection
-        bg_thread_video = threading.Thread(
-            target=process_video_job_background,
-            args=(video_job_id, db_item_key),
-            daemon=True
+    except content_index.meta.client.exceptions.ConditionalCheckFailedException:
+        # Not a registered ref (lost the registration race): the item owns its object outright
+        return None if item.get('object_key') not in (None, key) else key
+    record = response['Attributes']
+    if record.get('refs'):
+        return None
+    try:
+        # A duplicate upload may have joined after our DELETE; then refs is back and the object stays
+        content_index.delete_item(
+            Key={'content_hash': content_hash},
+            ConditionExpression=Attr('refs').not_exists()
         )
-        bg_thread_video.start()
-        
-        print(f"✓ Both background tasks started for {key}")
-        return []
+    except content_index.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+    return record['object_key']
+
+def _abandon_item(item):
+    """An upload whose catalog write failed: drop the content ref it holds and delete the stored
+    object (and sidecars) if no other item shares it, so neither the ref nor the object leaks"""
+    try:
+        object_key = _release_content(item)
+        if object_key:
+            _delete_object_files(object_key)
     except Exception as e:
-        print(f"Error starting video processing: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Could not release {item['filename']} after a failed write: {e}")
+
+def _duplicate_fields(record, key: str):
+    """(catalog fields, needs enrichment) for a duplicate upload. A finished item with the same content
+    lends its tags/transcript; one still being enriched gets the duplicate attached (copy_from) and
+    copies its results over when it finishes; otherwise the duplicate is enriched from the shared object."""
+    fields = {'object_key': record['object_key']}
+    in_flight = None
+    for ref in sorted(record.get('refs', set()) - {key}):
+        source = dynamodb.get_item(Key={'filename': ref}, ConsistentRead=True).get('Item')
+        if not source or source.get('deleted'):
+            continue
+        if source.get('status', 'ready') == 'ready':
+            fields.update(_copied_fields(source))
+            return fields, False
+        if in_flight is None and source.get('status') in ('pending', 'processing') and 'copy_from' not in source:
+            in_flight = ref
+    if in_flight:
+        fields.update({'copy_from': in_flight, 'status': 'processing'})
+        return fields, False
+    return fields, True
+
+def _copied_fields(source):
+    """The enrichment results of a finished item, for an item with the same content"""
+    fields = {
+        'tags': source.get('tags', []),
+        'visual_labels': source.get('visual_labels', []),
+        'status': 'ready'
+    }
+    if 'label_timeline_key' in source:
+        fields['label_timeline_key'] = source['label_timeline_key']
+    # Long transcripts are stored per object, so the duplicate can point at the same copy
+    fields.update({name: source[name] for name in TRANSCRIPT_FIELDS if name in source})
+    return fields
+
+def _copy_to_duplicate(key: str, source):
+    """Give an attached duplicate its source's results. Only while it is still attached to that source
+    and not deleted, so a detached or deleted duplicate is left alone."""
+    set_fields = dict(_copied_fields(source), **change_stamp(key))
+    update_expression, names, values = _update_parts(set_fields, ['copy_from'])
+    # Spelled out: a condition object's generated :v0 would clash with the update's placeholders
+    names['#cf'] = 'copy_from'
+    values[':source'] = source['filename']
+    try:
+        item = dynamodb.update_item(
+            Key={'filename': key},
+            UpdateExpression=update_expression,
+            ConditionExpression='#cf = :source AND attribute_not_exists(deleted)',
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return
+    print(f"Copied results of {source['filename']} to duplicate {key}")
+    query_cache.bump_version()
+    _index_item(dict(item, transcript=_transcript_or_preview(item), transcript_times=load_word_times(item)))
+
+def _detach_duplicate(key: str, source_key: str):
+    """The source of an attached duplicate failed or was deleted: queue the duplicate's own enrichment"""
+    try:
+        item = dynamodb.update_item(
+            Key={'filename': key},
+            UpdateExpression='SET #st = :pending, updated_at = :now, feed_shard = :shard REMOVE copy_from',
+            ConditionExpression=Attr('copy_from').eq(source_key) & Attr('deleted').not_exists(),
+            ExpressionAttributeNames={'#st': 'status'},
+            ExpressionAttributeValues={':pending': 'pending', ':now': now_ms(), ':shard': feed_shard(key)},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return
+    print(f"Source {source_key} did not finish, enriching duplicate {key} itself")
+    query_cache.bump_version()
+    start_ingest_workers().enqueue(key, {
+        'key': key, 'file_name': item['original_name'], 'object_key': _object_key(item), 'content_hash': item.get('content_hash')
+    })
+
+def _attached_duplicates(source_key: str, content_hash):
+    """Keys of the items waiting on source_key's enrichment (found through the content's refs)"""
+    if content_index is None or not content_hash:
         return []
+    record = content_index.get_item(Key={'content_hash': content_hash}, ConsistentRead=True).get('Item')
+    attached = []
+    for ref in sorted((record or {}).get('refs', set()) - {source_key}):
+        item = dynamodb.get_item(Key={'filename': ref}, ProjectionExpression='copy_from', ConsistentRead=True).get('Item')
+        if item and item.get('copy_from') == source_key:
+            attached.append(ref)
+    return attached
+
+def _complete_duplicates(source_key: str, content_hash):
+    """An item finished enriching: copy its results to the duplicates attached to it"""
+    attached = _attached_duplicates(source_key, content_hash)
+    if not attached:
+        return
+    source = dynamodb.get_item(Key={'filename': source_key}, ConsistentRead=True).get('Item')
+    for key in attached:
+        _copy_to_duplicate(key, source)
+
+def _release_duplicates(source_key: str, content_hash):
+    """An item failed or was deleted before finishing: its attached duplicates enrich themselves"""
+    for key in _attached_duplicates(source_key, content_hash):
+        _detach_duplicate(key, source_key)
 
+def _settle_duplicate(item):
+    """Re-check the source of a just-written attached duplicate. If the source finished or failed before
+    the duplicate was written, its completion never saw the duplicate, so finish or detach it here."""
+    source_key = item['copy_from']
+    source = dynamodb.get_item(Key={'filename': source_key}, ConsistentRead=True).get('Item')
+    if source and not source.get('deleted') and source.get('status', 'ready') == 'ready':
+        _copy_to_duplicate(item['filename'], source)
+    elif not source or source.get('deleted') or source.get('status') == 'failed':
+        _detach_duplicate(item['filename'], source_key)
 
 def upload_file(file_path: str) -> str:
+    """Upload a file from local disk (streams it to S3 without reading it into memory)"""
+    with open(file_path, "rb") as f:
+        return upload_fileobj(f, file_path)
+
+@metrics.timed('upload')
+def upload_fileobj(fileobj, file_name: str):
+    """Stream a file-like object to S3 as a managed multipart upload, save a pending record and queue tagging"""
     global s3_client, AWS_BUCKET, dynamodb
     if s3_client is None: startup()
         
-    file_name = file_path.split('/')[-1]
+    file_name = file_name.split('/')[-1]
     key = make_key(file_name)
     file_ext = file_name.split('.')[-1].lower()
     
     print(f"\n===== UPLOAD START: {file_name} (ext: {file_ext}) =====")
     
     try:
-        # 1. Upload to S3
-        with open(file_path, "rb") as f:
-            contents = f.read()
-
-        # Use proper MIME type for ContentType
-        content_type, _ = mimetypes.guess_type(file_name)
-        if not content_type:
-            content_type = 'application/octet-stream'
-
+        # 1. Upload to S3, hashing the bytes as the transfer reads them
         print(f"Uploading to S3: {key}")
-        s3_client.put_object(
-            Bucket=AWS_BUCKET, 
-            Key=key, 
-            Body=contents, 
-            ContentType=content_type
-        )
+        reader = _HashingReader(fileobj)
+        with metrics.stage('upload.s3_put'):
+            s3_client.upload_fileobj(
+                reader,
+                AWS_BUCKET,
+                key,
+                ExtraArgs={'ContentType': _content_type(file_name)},
+                Config=_transfer_config(UPLOAD_MAX_CONCURRENCY)
+            )
+        content_hash = reader.hexdigest()
+        duplicate = _share_content(content_hash, key)
+        if duplicate:
+            # The content was already stored: keep that copy and drop the one just uploaded
+            s3_client.delete_object(Bucket=AWS_BUCKET, Key=key)
+            return _accept_duplicate(key, file_name, content_hash, duplicate)
         
-        url = s3_client.generate_presigned_url(
-            'get_object', 
-            Params={'Bucket': AWS_BUCKET, 'Key': key}, 
-            ExpiresIn=3600
-        )
+        url = presigned_url(key)
         print(f"S3 upload complete. URL: {url[:50]}...")
         
-        # 2. Get Tags based on file type & Save to DB
-        tags = []
-        transcript = ''
-        
-        if file_ext in ['jpg', 'jpeg', 'png']:
-            print("Processing as IMAGE using Rekognition...")
-            tags = get_ai_tags(AWS_BUCKET, key, file_ext)
-        elif file_ext in ['txt', 'md', 'csv', 'json', 'xml', 'html', 'htm', 'log']:
-            print("Processing as TEXT using Qwen...")
-            result = process_text_file(AWS_BUCKET, key)
-            tags = result['tags']
-            transcript = result['transcript']
-        elif file_ext in ['pdf']:
-            print("Processing as PDF using Qwen...")
-            result = process_pdf_file(AWS_BUCKET, key)
-            tags = result['tags']
-            transcript = result['transcript']
-        elif file_ext in ['mp3', 'wav']:
-            print("Processing as AUDIO using Transcribe (background task)...")
-            tags = process_audio_file(AWS_BUCKET, key, key)
-        elif file_ext in ['mp4', 'mov']:
-            print("Processing as VIDEO using Rekognition Video (background task)...")
-            tags = process_video_file(AWS_BUCKET, key, key)
-        else:
-            print(f"Unsupported file type: {file_ext}")
-        
-        print(f"Final tags extracted: {tags}")
-        
-        if dynamodb:
-            try:
-                print(f"Saving to DynamoDB with tags: {tags}")
-                dynamodb.put_item(
-                    Item={
-                        'filename': key,
-                        'original_name': file_name,
-                        'url': url,
-                        'tags': tags,
-                        'transcript': transcript,  # Filled for .txt/.pdf; filled by background task for audio/video
-                        'visual_labels': [],  # Will be filled in by video job background task
-                        'created_at': str(int(time.time()))
-                    }
-                )
-                print("DynamoDB save successful")
-            except Exception as e:
-                print(f"DB Save Error: {e}")
-                import traceback
-                traceback.print_exc()
+        # 2. Record the item as pending and queue the AI tagging; the request returns right away
+        item = _pending_item(key, file_name, url, content_hash=content_hash)
+        try:
+            dynamodb.put_item(Item=item)
+        except Exception:
+            _abandon_item(item)
+            raise
+        query_cache.bump_version()
+        _index_item({'filename': key, 'original_name': file_name, 'tags': [], 'transcript': ''})
+        start_ingest_workers().enqueue(key, {'key': key, 'file_name': file_name, 'content_hash': content_hash})
 
-        print(f"===== UPLOAD COMPLETE: {file_name} =====\n")
-        return {'key': key, 'name': file_name, 'url': url, 'tags': tags}
+        print(f"===== UPLOAD ACCEPTED: {file_name} (enrichment queued) =====\n")
+        return {'key': key, 'name': file_name, 'url': url, 'tags': [], 'status': 'pending'}
 
     except Exception as e:
         print(f"UPLOAD ERROR: {str(e)}")
@@ -612,68 +1459,750 @@ def upload_file(file_path: str) -> str:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f'Upload failed: {e}')
 
-def list_files():
+def _accept_duplicate(key: str, file_name: str, content_hash: str, record):
+    """Catalog a re-upload of stored content: it shares the stored object, and no AI calls run if a copy
+    is tagged or being tagged"""
+    fields, needs_enrichment = _duplicate_fields(record, key)
+    url = presigned_url(record['object_key'])
+    item = _pending_item(key, file_name, url, content_hash=content_hash, **fields)
+    try:
+        dynamodb.put_item(Item=item)
+    except Exception:
+        # _claim_duplicate already added this key to the content's refs
+        _abandon_item(item)
+        raise
+    query_cache.bump_version()
+    _index_item(dict(item, transcript=_transcript_or_preview(item), transcript_times=load_word_times(item)))
+    if needs_enrichment:
+        # No copy is finished or in progress (e.g. it failed); enrich this one from the shared object
+        start_ingest_workers().enqueue(key, {'key': key, 'file_name': file_name, 'object_key': record['object_key'], 'content_hash': content_hash})
+    elif 'copy_from' in item:
+        _settle_duplicate(item)
+    print(f"===== UPLOAD DEDUPLICATED: {file_name} -> {record['object_key']} ({item['status']}) =====\n")
+    return {'key': key, 'name': file_name, 'url': url, 'tags': item['tags'], 'status': item['status']}
+
+def _cached_media_enrichment(content_hash, file_ext):
+    """(tags, transcript, visual_labels, word_times) rebuilt from cached Transcribe/Rekognition output, or None"""
+    if enrichment_cache is None or not content_hash:
+        return None
+    transcript_json = enrichment_cache.get(content_hash, 'transcribe', TRANSCRIBE_PARAMS)
+    if transcript_json is None:
+        return None
+    visual_labels = []
+    if file_ext in ['mp4', 'mov']:
+        timeline = _cached_video_timeline(content_hash)
+        if timeline is None:
+            return None
+        visual_labels = video_labels_from_timeline(timeline)
+    transcript = transcript_from_json(transcript_json) or ''
+    word_times = align_word_times(transcript, timed_words_from_json(transcript_json)) if transcript else None
+    return media_tags(transcript, visual_labels), transcript, visual_labels, word_times
+
+@metrics.timed('enrich')
+def enrich_item(payload: dict):
+    """Ingest worker task: get tags (and transcript) for an uploaded object and save them to DB"""
+    global dynamodb, AWS_BUCKET
+    if dynamodb is None: startup()
+    
+    key = payload['key']
+    object_key = payload.get('object_key', key)
+    content_hash = payload.get('content_hash')
+    file_name = payload['file_name']
+    file_ext = file_name.split('.')[-1].lower()
+    print(f"\n===== ENRICH START: {file_name} (ext: {file_ext}) =====")
+    if _is_deleted(key):
+        # A retry after the file was deleted (its object may be gone too) has nothing left to do
+        print(f"File was deleted, skipping enrichment: {key}")
+        return
+    
+    tags = []
+    transcript = ''
+    visual_labels = None
+    word_times = None
+    label_timeline = None
+    label_timeline_key = None
+    cached_media = _cached_media_enrichment(content_hash, file_ext) if file_ext in ['mp3', 'wav', 'mp4', 'mov'] else None
+    
+    if cached_media:
+        print("Media was transcribed/labelled before, re-using the cached results...")
+        tags, transcript, visual_labels, word_times = cached_media
+        if file_ext in ['mp4', 'mov']:
+            label_timeline = _cached_video_timeline(content_hash)
+    elif file_ext in ['jpg', 'jpeg', 'png']:
+        print("Processing as IMAGE using Rekognition...")
+        tags = get_ai_tags(AWS_BUCKET, object_key, file_ext, content_hash)
+    elif file_ext in ['txt', 'md', 'csv', 'json', 'xml', 'html', 'htm', 'log']:
+        print("Processing as TEXT using Qwen...")
+        result = process_text_file(AWS_BUCKET, object_key)
+        tags = result['tags']
+        transcript = result['transcript']
+    elif file_ext in ['pdf']:
+        print("Processing as PDF using Qwen...")
+        result = process_pdf_file(AWS_BUCKET, object_key)
+        tags = result['tags']
+        transcript = result['transcript']
+    elif file_ext in ['mp3', 'wav']:
+        print("Processing as AUDIO using Transcribe (background task)...")
+        process_audio_file(AWS_BUCKET, object_key, key, content_hash)
+        return _mark_processing(key, file_name)
+    elif file_ext in ['mp4', 'mov']:
+        print("Processing as VIDEO using Rekognition Video (background task)...")
+        process_video_file(AWS_BUCKET, object_key, key, content_hash)
+        return _mark_processing(key, file_name)
+    else:
+        print(f"Unsupported file type: {file_ext}")
+    
+    print(f"Final tags extracted: {tags}")
+    
+    # Nothing goes to S3 for a file deleted while it was being enriched
+    if _is_deleted(key):
+        print(f"File was deleted during enrichment, dropping results: {key}")
+        return
+    if label_timeline is not None:
+        label_timeline_key = _store_label_timeline(object_key, label_timeline)
+    # Raising here lets the queue retry the task
+    set_fields, remove = _transcript_update(object_key, transcript, word_times)
+    set_fields.update({'tags': tags, 'status': 'ready', **change_stamp(key)})
+    if visual_labels is not None:
+        set_fields['visual_labels'] = visual_labels
+    if label_timeline_key:
+        set_fields['label_timeline_key'] = label_timeline_key
+    update_expression, names, values = _update_parts(set_fields, remove)
+    try:
+        dynamodb.update_item(
+            Key={'filename': key},
+            UpdateExpression=update_expression,
+            ConditionExpression=Attr('deleted').not_exists(),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        # Deleted after the check above: the sidecars just written would be orphaned
+        print(f"File was deleted during enrichment, dropping results: {key}")
+        _discard_sidecars(object_key, [set_fields.get('transcript_key'), set_fields.get('transcript_times_key'), label_timeline_key])
+        return
+    print("DynamoDB save successful")
+    query_cache.bump_version()
+    _index_item({'filename': key, 'original_name': file_name, 'tags': tags, 'transcript': transcript, 'transcript_times': word_times})
+    _complete_duplicates(key, content_hash)
+    print(f"===== ENRICH COMPLETE: {file_name} =====\n")
+
+def _is_deleted(key: str) -> bool:
+    """True if the catalog item is gone or tombstoned (strongly consistent, so a just-made delete is seen)"""
+    item = dynamodb.get_item(Key={'filename': key}, ProjectionExpression='deleted', ConsistentRead=True).get('Item')
+    return item is None or bool(item.get('deleted'))
+
+def _mark_processing(key: str, file_name: str):
+    """Media jobs are started (and tracked): flag the item as processing. Only the status changes, and
+    not once a job has already finished the item, so a fast job or a retried start can't be clobbered."""
+    try:
+        dynamodb.update_item(
+            Key={'filename': key},
+            UpdateExpression='SET #st = :processing, updated_at = :now, feed_shard = :shard',
+            ConditionExpression=Attr('deleted').not_exists() & Attr('status').ne('ready'),
+            ExpressionAttributeNames={'#st': 'status'},
+            ExpressionAttributeValues={':processing': 'processing', ':now': now_ms(), ':shard': feed_shard(key)}
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"File was deleted or already finished, status left as is: {key}")
+        return
+    query_cache.bump_version()
+    print(f"===== ENRICH STARTED JOBS: {file_name} (processing) =====\n")
+
+def _enrichment_dead(payload: dict, error: str):
+    """Ingest queue gave up on an item: surface it as failed in the catalog"""
+    dynamodb.update_item(
+        Key={'filename': payload['key']},
+        UpdateExpression='SET #st = :status, updated_at = :now, feed_shard = :shard',
+        ConditionExpression=Attr('deleted').not_exists(),
+        ExpressionAttributeNames={'#st': 'status'},
+        ExpressionAttributeValues={':status': 'failed', ':now': now_ms(), ':shard': feed_shard(payload['key'])}
+    )
+    query_cache.bump_version()
+    _release_duplicates(payload['key'], payload.get('content_hash'))
+
+def start_ingest_workers():
+    """Create the enrichment queue and worker pool on first use; tasks queued before a restart resume"""
+    global ingest_queue, ingest_workers
+    with _ingest_lock:
+        if ingest_queue is None:
+            ingest_queue = IngestQueue(INGEST_DB_PATH, max_attempts=INGEST_MAX_ATTEMPTS)
+            ingest_workers = IngestWorkerPool(ingest_queue, enrich_item, workers=INGEST_WORKERS, on_dead=_enrichment_dead)
+    ingest_workers.start()
+    return ingest_queue
+
+def get_status(key: str):
+    """Processing state for one item: pending / processing / ready / failed, plus queue details"""
+    global dynamodb
+    if dynamodb is None: startup()
+    try:
+        response = dynamodb.get_item(
+            Key={'filename': key},
+            ProjectionExpression='#st, original_name, deleted',
+            ExpressionAttributeNames={'#st': 'status'}
+        )
+        item = response.get('Item')
+        if not item or item.get('deleted'):
+            return {'success': False, 'error': 'File not found'}
+        return {
+            'success': True,
+            'key': key,
+            'name': item.get('original_name', key),
+            'status': item.get('status', 'ready'),
+            'enrichment': start_ingest_workers().status(key)
+        }
+    except Exception as e:
+        print(f"Get Status Error: {e}")
+        return {'success': False, 'error': str(e)}
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+def is_archive(file_name: str) -> bool:
+    return file_name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def _spool(fileobj):
+    """Copy a stream into a temp file (in memory up to the part size) so it can be uploaded out of order"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_PART_SIZE_MB * 1024 * 1024)
+    shutil.copyfileobj(fileobj, spooled, 1024 * 1024)
+    spooled.seek(0)
+    return spooled
+
+def iter_archive(fileobj, file_name: str):
+    """Yield (fileobj, name) for every regular file in a zip or tar archive (tar is read as a stream)"""
+    if file_name.lower().endswith('.zip'):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield _spool(member), info.filename
+    else:
+        with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                yield _spool(archive.extractfile(member)), member.name
+
+def expand_sources(sources):
+    """Expand any zip/tar archives in a stream of (fileobj, name) pairs into their member files"""
+    for fileobj, name in sources:
+        if is_archive(name):
+            try:
+                yield from iter_archive(fileobj, name)
+            except Exception as e:
+                raise ValueError(f"Could not read archive {name}: {e}") from e
+            finally:
+                fileobj.close()
+        else:
+            yield fileobj, name
+
+def iter_directory(path: str):
+    """Yield (fileobj, name) for every file under a local directory"""
+    for root, _, names in os.walk(path):
+        for name in sorted(names):
+            yield open(os.path.join(root, name), 'rb'), name
+
+class _UploadDone(BaseSubscriber):
+    """Closes the source and frees an in-flight slot when a batch transfer finishes"""
+
+    def __init__(self, fileobj, slots):
+        self.fileobj = fileobj
+        self.slots = slots
+
+    def on_done(self, future, **kwargs):
+        self.fileobj.close()
+        self.slots.release()
+
+def _batch_duplicate(key: str, file_name: str, content_hash: str, record, batch_sources):
+    """(item, needs enrichment) for a batch file whose content is already stored. batch_sources maps
+    content hashes to files of this batch that will be enriched (not written yet, so looked up here)."""
+    if content_hash in batch_sources:
+        fields, needs_enrichment = {'object_key': record['object_key'], 'copy_from': batch_sources[content_hash], 'status': 'processing'}, False
+    else:
+        fields, needs_enrichment = _duplicate_fields(record, key)
+    item = _pending_item(key, file_name, presigned_url(record['object_key']), content_hash=content_hash, **fields)
+    return item, needs_enrichment
+
+def _keep_written(records, failed, error):
+    """After a failed batch write: the records that did land, with the rest abandoned and listed as failed"""
+    written = []
+    for item, needs_enrichment in records:
+        if dynamodb.get_item(Key={'filename': item['filename']}, ProjectionExpression='#fn',
+                             ExpressionAttributeNames={'#fn': 'filename'}, ConsistentRead=True).get('Item'):
+            written.append((item, needs_enrichment))
+        else:
+            _abandon_item(item)
+            failed.append({'name': item['original_name'], 'error': str(error)})
+    return written
+
+@metrics.timed('upload_batch')
+def upload_batch(sources):
+    """Upload many (fileobj, name) pairs in parallel through one shared transfer manager, write their
+    records with a DynamoDB batch_writer and queue enrichment for all of them. Files are hashed as they
+    transfer; content already in the store keeps a single copy (the new one is deleted once it lands).
+    Returns a summary with throughput."""
+    global s3_client, AWS_BUCKET, dynamodb
+    if s3_client is None: startup()
+    
+    started = time.time()
+    slots = threading.BoundedSemaphore(BATCH_MAX_IN_FLIGHT)
+    pending = []
+    failed = []
+    records = []  # (item, needs enrichment)
+    batch_sources = {}  # content hash -> key of the file in this batch that stores (and enriches) it
+    deduplicated = 0
+    total_bytes = 0
+    
+    sources = iter(sources)
+    with create_transfer_manager(s3_client, _transfer_config(BATCH_UPLOAD_CONCURRENCY)) as manager:
+        while True:
+            # A source that fails to read (corrupt archive, unreadable file) ends the batch, but the
+            # uploads already started are still finished and recorded below
+            try:
+                fileobj, name = next(sources)
+            except StopIteration:
+                break
+            except Exception as e:
+                print(f"Batch source error: {e}")
+                failed.append({'name': '(batch)', 'error': f"Stopped reading the batch: {e}"})
+                break
+            file_name = name.split('/')[-1]
+            if not file_name or file_name.startswith('.'):
+                fileobj.close()
+                continue
+            key = make_key(file_name)
+            # Bounds open files / spooled archive members, not just S3 connections
+            slots.acquire()
+            reader = _HashingReader(fileobj)
+            try:
+                future = manager.upload(
+                    reader, AWS_BUCKET, key,
+                    extra_args={'ContentType': _content_type(file_name)},
+                    subscribers=[_UploadDone(fileobj, slots)]
+                )
+            except Exception as e:
+                fileobj.close()
+                slots.release()
+                failed.append({'name': file_name, 'error': str(e)})
+                continue
+            pending.append((future, key, file_name, reader))
+        
+        # Completed in submission order, so of identical files in one batch the first becomes the shared copy
+        for future, key, file_name, reader in pending:
+            try:
+                future.result()
+                total_bytes += reader.size
+                content_hash = reader.hexdigest()
+                duplicate = _share_content(content_hash, key)
+                if duplicate:
+                    s3_client.delete_object(Bucket=AWS_BUCKET, Key=key)
+                    records.append(_batch_duplicate(key, file_name, content_hash, duplicate, batch_sources))
+                    deduplicated += 1
+                else:
+                    batch_sources[content_hash] = key
+                    records.append((_pending_item(key, file_name, presigned_url(key), content_hash=content_hash), True))
+            except Exception as e:
+                print(f"Batch upload error for {file_name}: {e}")
+                failed.append({'name': file_name, 'error': str(e)})
+    
+    # batch_writer groups puts into BatchWriteItem calls of 25 and retries unprocessed items
+    try:
+        with dynamodb.batch_writer() as batch:
+            for item, _ in records:
+                batch.put_item(Item=item)
+    except Exception as e:
+        print(f"Batch write error: {e}")
+        records = _keep_written(records, failed, e)
+    
+    tasks = []
+    for item, (_, needs_enrichment) in zip(_with_transcripts(item for item, _ in records), records):
+        _index_item(item)
+        if needs_enrichment:
+            payload = {'key': item['filename'], 'file_name': item['original_name'], 'content_hash': item['content_hash']}
+            if 'object_key' in item:
+                payload['object_key'] = item['object_key']
+            tasks.append((item['filename'], payload))
+    start_ingest_workers().enqueue_many(tasks)
+    if records:
+        query_cache.bump_version()
+    for item, _ in records:
+        if 'copy_from' in item:
+            _settle_duplicate(item)
+    
+    seconds = time.time() - started
+    print(f"===== BATCH UPLOAD: {len(records)} files ({deduplicated} deduplicated), {total_bytes / 1e6:.1f} MB in {seconds:.1f}s, {len(failed)} failed =====")
+    return {
+        'uploaded': len(records),
+        'deduplicated': deduplicated,
+        'failed': failed,
+        'bytes': total_bytes,
+        'seconds': round(seconds, 3),
+        'files_per_second': round(len(records) / seconds, 2) if seconds else None,
+        'mb_per_second': round(total_bytes / 1e6 / seconds, 2) if seconds else None,
+        'items': [
+            {'key': item['filename'], 'name': item['original_name'], 'url': item['url'], 'tags': item['tags'], 'status': item['status']}
+            for item, _ in records
+        ]
+    }
+
+# Listing never ships transcripts; clients stream them on demand from GET /transcript
+LIST_PAGE_SIZE = 100
+LIST_MAX_PAGE_SIZE = 1000
+
+def _encode_cursor(last_key):
+    """Turn a DynamoDB LastEvaluatedKey into an opaque URL-safe cursor string"""
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    """Inverse of _encode_cursor; returns None for a missing cursor, ValueError for one it didn't produce"""
+    if not cursor:
+        return None
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    # A LastEvaluatedKey of MediaTags is exactly its hash key
+    if not isinstance(last_key, dict) or set(last_key) != {'filename'} or not isinstance(last_key['filename'], str):
+        raise ValueError("Invalid cursor")
+    return last_key
+
+def _list_entry(item):
+    """Shape a projected MediaTags item into the list_docs response format"""
+    key = item['filename']
+    original_name = item.get('original_name', key)
+    file_ext = original_name.split('.')[-1].lower()
+    
+    # Cached URL, re-signed only when close to expiry
+    fresh_url = presigned_url(_object_key(item))
+    
+    # Check if file is audio or video
+    is_audio_or_video = file_ext in ['mp3', 'wav', 'aac', 'mp4', 'mov', 'avi', 'mkv']
+    
+    return {
+        "name": original_name,
+        "key": key,
+        "url": fresh_url,
+        "tags": item.get('tags', []),
+        "is_audio_or_video": is_audio_or_video,
+        "status": item.get('status', 'ready'),
+        "size": 0 
+    }
+
+def _scan_pages(**scan_kwargs):
+    """Yield the items of each page of a DynamoDB scan, following LastEvaluatedKey"""
+    while True:
+        response = dynamodb.scan(**scan_kwargs)
+        yield response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+_SEGMENT_DONE = object()
+
+def _scan_items(segments: int = 1, **scan_kwargs):
+    """Yield every item of a DynamoDB scan. With segments > 1 the table is read as a parallel scan
+    (Segment/TotalSegments) on at most SCAN_MAX_WORKERS threads; items stream out as pages arrive, in no fixed order."""
+    if segments <= 1:
+        for page in _scan_pages(**scan_kwargs):
+            yield from page
+        return
+    
+    # Bounded so a slow consumer holds back the scanners instead of buffering the table
+    pages = queue.Queue(maxsize=segments * 2)
+    stop = threading.Event()
+    
+    def put(value):
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def scan_segment(segment):
+        if stop.is_set():
+            return
+        try:
+            for page in _scan_pages(Segment=segment, TotalSegments=segments, **scan_kwargs):
+                if not put(page):
+                    return
+            put(_SEGMENT_DONE)
+        except Exception as e:
+            put(e)
+    
+    # One pool per scan, so a slow consumer of one scan can't hold threads another scan needs
+    pool = ThreadPoolExecutor(max_workers=min(segments, SCAN_MAX_WORKERS), thread_name_prefix="scan")
+    for segment in range(segments):
+        pool.submit(scan_segment, segment)
+    try:
+        remaining = segments
+        while remaining:
+            page = pages.get()
+            if page is _SEGMENT_DONE:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield from page
+    finally:
+        # Also runs when the caller stops iterating early; segments not started are dropped and the
+        # running ones exit at their next page
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _changed_items(since_ms: int, **read_kwargs):
+    """Yield items (and tombstones) written at or after since_ms: one Query per change-feed shard, which
+    reads only the changes, or a parallel scan filtered on updated_at (reads the whole table) without the index"""
+    if not change_feed_ready:
+        yield from _scan_items(SCAN_SEGMENTS, FilterExpression=Attr('updated_at').gte(since_ms), **read_kwargs)
+        return
+    for shard in range(CHANGE_FEED_SHARDS):
+        query_kwargs = dict(
+            read_kwargs,
+            IndexName=CHANGE_FEED_INDEX,
+            KeyConditionExpression=Key('feed_shard').eq(str(shard)) & Key('updated_at').gte(since_ms)
+        )
+        while True:
+            response = dynamodb.query(**query_kwargs)
+            yield from response.get('Items', [])
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            query_kwargs['ExclusiveStartKey'] = last_key
+
+def list_files(limit: int = LIST_PAGE_SIZE, cursor: str = None):
+    """Return one page of the catalog (without transcripts) plus a cursor for the next page"""
     # Fetch from DynamoDB to get tags, but include 'key' for deletion
     global dynamodb, s3_client, AWS_BUCKET
     if dynamodb is None: startup()
     
+    limit = max(1, min(int(limit), LIST_MAX_PAGE_SIZE))
+    # A bad cursor is the caller's error, not an empty catalog: let the ValueError through
+    last_key = _decode_cursor(cursor)
+    
     try:
-        response = dynamodb.scan()
-        items = response.get('Items', [])
+        sync_token = str(now_ms() - CHANGE_FEED_OVERLAP_MS)
+        scan_kwargs = {
+            'ProjectionExpression': '#fn, original_name, tags, created_at, #st, object_key',
+            'ExpressionAttributeNames': {'#fn': 'filename', '#st': 'status'},
+            'FilterExpression': Attr('deleted').not_exists()
+        }
+        items = []
         
-        final_list = []
-        for item in items:
-            key = item['filename']
-            original_name = item.get('original_name', key)
-            file_ext = original_name.split('.')[-1].lower()
-            
-            # Generate fresh URL
-            fresh_url = s3_client.generate_presigned_url(
-                'get_object', 
-                Params={'Bucket': AWS_BUCKET, 'Key': key}, 
-                ExpiresIn=3600
-            )
-            
-            # Check if file is audio or video
-            is_audio_or_video = file_ext in ['mp3', 'wav', 'aac', 'mp4', 'mov', 'avi', 'mkv']
-            
-            final_list.append({
-                "name": original_name,
-                "key": key,
-                "url": fresh_url,
-                "tags": item.get('tags', []),
-                "transcript": item.get('transcript', ''),
-                "is_audio_or_video": is_audio_or_video,
-                "size": 0 
-            })
-            
-        return final_list
+        # A single scan call stops at 1 MB, so keep going until the page is full
+        while len(items) < limit:
+            if last_key:
+                scan_kwargs['ExclusiveStartKey'] = last_key
+            scan_kwargs['Limit'] = limit - len(items)
+            response = dynamodb.scan(**scan_kwargs)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+        
+        return {
+            'files': [_list_entry(item) for item in items],
+            'next_cursor': _encode_cursor(last_key),
+            'sync_token': sync_token
+        }
         
     except Exception as e:
         print(f"DB LIST ERROR: {e}")
-        return []
+        return {'files': [], 'next_cursor': None, 'sync_token': None}
 
-def search_files(query: str):
-    global dynamodb
+def list_changes(since: str):
+    """Return items added/updated and keys deleted since a sync token from list_files/list_changes"""
+    global dynamodb, s3_client, AWS_BUCKET
     if dynamodb is None: startup()
+    
+    next_token = str(now_ms() - CHANGE_FEED_OVERLAP_MS)
     try:
-        response = dynamodb.scan(
-            FilterExpression=Attr('tags').contains(query) | Attr('original_name').contains(query)
-        )
-        return response.get('Items', [])
+        since_ms = int(since)
+    except (TypeError, ValueError):
+        return {'full_resync': True, 'changed': [], 'deleted': [], 'next_token': next_token}
+    
+    # Tombstones older than this may already be gone, so the client can't trust a delta
+    if since_ms < now_ms() - TOMBSTONE_RETENTION_SECONDS * 1000:
+        return {'full_resync': True, 'changed': [], 'deleted': [], 'next_token': next_token}
+    
+    try:
+        changed = []
+        deleted = []
+        for item in _changed_items(
+            since_ms,
+            ProjectionExpression='#fn, original_name, tags, created_at, updated_at, deleted, #st, object_key',
+            ExpressionAttributeNames={'#fn': 'filename', '#st': 'status'}
+        ):
+            if item.get('deleted'):
+                deleted.append(item['filename'])
+            else:
+                changed.append(_list_entry(item))
+        
+        return {'full_resync': False, 'changed': changed, 'deleted': deleted, 'next_token': next_token}
+    
+    except Exception as e:
+        print(f"DB CHANGES ERROR: {e}")
+        return {'full_resync': True, 'changed': [], 'deleted': [], 'next_token': next_token}
+
+def _url_for(key: str) -> str:
+    """Presigned URL for a catalog key, following deduplicated items to their shared object"""
+    return presigned_url(_shared_objects.get(key, key))
+
+def search_files(query: str, limit: int = 50):
+    """Ranked search over names, tags and transcripts using the in-process index"""
+    if not _search_index_ready: build_search_index()
+    try:
+        return [
+            {
+                'filename': key,
+                'original_name': info['name'],
+                'tags': info['tags'],
+                'url': _url_for(key),
+                'score': round(score, 4)
+            }
+            for key, score, info in search_index.search(query, limit)
+        ]
     except Exception as e:
         print(f"Search Error: {e}")
         return []
 
+def search_transcripts(query: str, limit: int = 20):
+    """Phrase search inside transcripts ("quoted phrases" plus loose words, all required): ranked items with
+    highlighted snippets and, for audio/video, where in the recording each match is"""
+    if not _search_index_ready: build_search_index()
+    try:
+        results = transcript_index.search(query, limit)
+    except Exception as e:
+        print(f"Transcript Search Error: {e}")
+        return []
+    for result in results:
+        result['url'] = _url_for(result['key'])
+        result['score'] = round(result['score'], 4)
+    return results
+
+def _index_item(item):
+    """Apply one catalog item (or tombstone) to the keyword and vector indexes"""
+    key = item['filename']
+    if item.get('deleted'):
+        search_index.remove(key)
+        transcript_index.remove(key)
+        vector_index.remove(key)
+        _shared_objects.pop(key, None)
+        return
+    if _object_key(item) != key:
+        _shared_objects[key] = _object_key(item)
+    name = item.get('original_name', key)
+    tags = item.get('tags', [])
+    transcript = item.get('transcript', '')
+    search_index.add(key, name, tags, transcript)
+    transcript_index.add(key, name, transcript, item.get('transcript_times'))
+    try:
+        _embed_item(key, name, tags, transcript)
+    except Exception as e:
+        print(f"Embedding Error for {key}: {e}")
+
+def _embed_item(key, name, tags, transcript):
+    """Embed a header chunk (name + tags) plus transcript chunks; skipped if the content is unchanged"""
+    fingerprint = hashlib.sha1(json.dumps([name, list(tags), transcript]).encode('utf-8')).hexdigest()
+    if vector_index.fingerprint(key) == fingerprint:
+        return
+    spans = chunk_text(transcript)
+    texts = [f"{name}. {', '.join(tags)}"] + [transcript[start:end] for start, end in spans]
+    vector_index.add(key, embedder.embed(texts), [(-1, -1)] + spans, fingerprint)
+
+def build_search_index():
+    """Fill the search index from a full paginated scan (once per process)"""
+    global dynamodb, _search_index_ready, _search_index_token
+    if dynamodb is None: startup()
+    with _search_index_lock:
+        if _search_index_ready:
+            return
+        try:
+            started = time.time()
+            token = now_ms() - CHANGE_FEED_OVERLAP_MS
+            # Reuse persisted vectors; only new or changed items get re-embedded
+            if VECTOR_INDEX_PATH and os.path.exists(VECTOR_INDEX_PATH):
+                vector_index.load(VECTOR_INDEX_PATH)
+            seen = set()
+            for item in _with_transcripts(_scan_items(
+                SCAN_SEGMENTS,
+                ProjectionExpression='#fn, original_name, tags, transcript, transcript_key, transcript_times_key, object_key',
+                ExpressionAttributeNames={'#fn': 'filename'},
+                FilterExpression=Attr('deleted').not_exists()
+            )):
+                seen.add(item['filename'])
+                _index_item(item)
+            for key in vector_index.keys():
+                if key not in seen:
+                    vector_index.remove(key)
+            _search_index_token = token
+            _search_index_ready = True
+            _save_vector_index()
+            print(f"Search index built: {len(search_index)} items in {time.time() - started:.2f}s")
+        except Exception as e:
+            print(f"Search Index Build Error: {e}")
+            return
+    threading.Thread(target=_search_index_sync_loop, daemon=True).start()
+
+def _search_index_sync_loop():
+    """Background task: apply catalog changes made by other workers to the local index"""
+    global _search_index_token
+    while True:
+        time.sleep(SEARCH_INDEX_SYNC_SECONDS)
+        try:
+            token = now_ms() - CHANGE_FEED_OVERLAP_MS
+            changed = 0
+            for item in _with_transcripts(_changed_items(
+                _search_index_token,
+                ProjectionExpression='#fn, original_name, tags, transcript, transcript_key, transcript_times_key, deleted, object_key',
+                ExpressionAttributeNames={'#fn': 'filename'}
+            )):
+                _index_item(item)
+                changed += 1
+            if changed:
+                query_cache.note_remote_change()
+            _search_index_token = token
+            _save_vector_index()
+        except Exception as e:
+            print(f"Search Index Sync Error: {e}")
+
+def _save_vector_index():
+    if VECTOR_INDEX_PATH and vector_index.dirty:
+        vector_index.save(VECTOR_INDEX_PATH)
+
+def _batch_get_items(keys, projection):
+    """Fetch items by key with batch_get_item (100 keys per call, retrying unprocessed keys)"""
+    items = {}
+    for i in range(0, len(keys), 100):
+        request = {'MediaTags': {
+            'Keys': [{'filename': key} for key in keys[i:i + 100]],
+            'ProjectionExpression': projection,
+            'ExpressionAttributeNames': {'#fn': 'filename'}
+        }}
+        while request:
+            response = dynamo_resource.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get('MediaTags', []):
+                items[item['filename']] = item
+            request = response.get('UnprocessedKeys')
+    return items
+
 def get_transcript(key: str):
-    """Retrieve transcript for a file from DynamoDB"""
+    """Retrieve transcript for a file (inline in DynamoDB or compressed in S3) as one JSON-ready dict.
+    Deprecated: backs POST /get_transcript only; clients read GET /transcript (transcript_info + iter_transcript)"""
     global dynamodb
     if dynamodb is None: startup()
     try:
-        response = dynamodb.get_item(Key={'filename': key})
-        if 'Item' in response:
+        response = dynamodb.get_item(
+            Key={'filename': key},
+            ProjectionExpression='original_name, transcript, transcript_key, deleted'
+        )
+        if 'Item' in response and not response['Item'].get('deleted'):
             item = response['Item']
-            transcript = item.get('transcript', '')
+            transcript = load_transcript(item)
             file_name = item.get('original_name', key)
             return {
                 'success': True,
@@ -693,17 +2222,83 @@ def get_transcript(key: str):
             'error': str(e)
         }
 
+def transcript_info(key: str):
+    """Where an item's transcript lives, for streaming: None if the item doesn't exist"""
+    global dynamodb
+    if dynamodb is None: startup()
+    response = dynamodb.get_item(
+        Key={'filename': key},
+        ProjectionExpression='original_name, transcript, transcript_key, transcript_bytes, deleted'
+    )
+    item = response.get('Item')
+    if not item or item.get('deleted'):
+        return None
+    info = {'name': item.get('original_name', key), 'transcript_key': item.get('transcript_key')}
+    if info['transcript_key']:
+        info['size'] = int(item.get('transcript_bytes', 0))
+    else:
+        info['text'] = item.get('transcript', '').encode('utf-8')
+        info['size'] = len(info['text'])
+    return info
+
+def get_label_timeline(key: str, label: str = None):
+    """A video's stored label timeline (labels ranked by screen time, with segments in ms); with label,
+    just that label's segments"""
+    global dynamodb
+    if dynamodb is None: startup()
+    try:
+        item = dynamodb.get_item(
+            Key={'filename': key},
+            ProjectionExpression='original_name, label_timeline_key, deleted'
+        ).get('Item')
+        if not item or item.get('deleted'):
+            return {'success': False, 'error': 'File not found'}
+        if not item.get('label_timeline_key'):
+            return {'success': False, 'error': 'No label timeline for this file'}
+        body = s3_client.get_object(Bucket=AWS_BUCKET, Key=item['label_timeline_key'])['Body'].read()
+        timeline = json.loads(gzip.decompress(body))
+        if label:
+            wanted = label.casefold()
+            timeline['labels'] = [entry for entry in timeline['labels'] if entry['name'].casefold() == wanted]
+        return {'success': True, 'name': item.get('original_name', key), 'timeline': timeline}
+    except Exception as e:
+        print(f"Get Label Timeline Error: {e}")
+        return {'success': False, 'error': str(e)}
+
 def delete_file(key: str):
     # Helper to delete from S3 and DynamoDB
     global s3_client, AWS_BUCKET, dynamodb
     if s3_client is None: startup()
     
     try:
-        # Delete from S3
-        s3_client.delete_object(Bucket=AWS_BUCKET, Key=key)
-        # Delete from DynamoDB
+        item = dynamodb.get_item(
+            Key={'filename': key},
+            ProjectionExpression='#fn, #st, content_hash, object_key, deleted',
+            ExpressionAttributeNames={'#fn': 'filename', '#st': 'status'}
+        ).get('Item')
+        # Tombstone first: an enrichment or job finishing from here on fails its conditional update
+        # instead of writing results (and sidecars) for a file that is being deleted
         if dynamodb:
-            dynamodb.delete_item(Key={'filename': key})
+            dynamodb.put_item(
+                Item={
+                    'filename': key,
+                    'deleted': True,
+                    **change_stamp(key),
+                    'expires_at': int(time.time()) + TOMBSTONE_RETENTION_SECONDS
+                }
+            )
+        if item and not item.get('deleted') and item.get('status', 'ready') != 'ready':
+            # Duplicates waiting on this item's enrichment now have to enrich themselves
+            _release_duplicates(key, item.get('content_hash'))
+        # Delete from S3 unless other catalog entries still share the object
+        object_key = key if item is None else (None if item.get('deleted') else _release_content(item))
+        if object_key:
+            _delete_object_files(object_key)
+        _shared_objects.pop(key, None)
+        search_index.remove(key)
+        transcript_index.remove(key)
+        vector_index.remove(key)
+        query_cache.bump_version()
         return True
     except Exception as e:
         print(f"Delete Error: {e}")
@@ -717,31 +2312,53 @@ def qwen_search_files(user_query: str):
     api_key = os.getenv("API_KEY")
     
     try:
-        print(f"[QWEN SEARCH] Fetching all files for context...")
+        if not _search_index_ready: build_search_index()
         
-        # Scan all files from DynamoDB
-        response = dynamodb.scan()
-        items = response.get('Items', [])
+        cache_key, cached = query_cache.lookup(user_query, scope=QWEN_SEARCH_MODE)
+        if cached is not None:
+            live = {f['key'] for f in cached if f['key'] in search_index}
+            if live and cache_key[0] == 'local':
+                # Another worker may have deleted a file since this entry was written and this worker's
+                # index hasn't synced yet; one batch read sees the delete
+                found = _batch_get_items(list(live), '#fn, deleted')
+                live = {key for key in live if key in found and not found[key].get('deleted')}
+            results = [dict(f, url=_url_for(f['key'])) for f in cached if f['key'] in live]
+            print(f"[QWEN SEARCH] Cache hit, returning {len(results)} files")
+            return results
         
-        if not items:
+        # Retrieve a small candidate set by embedding similarity; the LLM only reranks these
+        query_vector = embedder.embed([user_query])[0]
+        candidates = vector_index.search(query_vector, QWEN_CANDIDATES)
+        print(f"[QWEN SEARCH] {len(candidates)} candidates from vector retrieval")
+        
+        if not candidates:
             print("[QWEN SEARCH] No files in database")
             return []
         
-        # Build file context with transcripts and tags, numbered for easy reference
+        items = _batch_get_items([key for key, _, _ in candidates], '#fn, original_name, tags, transcript, transcript_key, transcript_preview, deleted')
+        # Chunk excerpts need the full text; S3-stored transcripts are fetched in parallel
+        needs_text = [key for key, _, (start, _) in candidates if start >= 0 and items.get(key, {}).get('transcript_key')]
+        for key, text in zip(needs_text, _transcript_pool.map(lambda k: _transcript_or_preview(items[k]), needs_text)):
+            items[key] = dict(items[key], transcript=text)
+        
+        # Build file context with the best-matching transcript chunk and tags, numbered for easy reference
         file_context = []
         numbered_context = []
-        for idx, item in enumerate(items):
-            key = item.get('filename', '')
+        for key, score, (start, end) in candidates:
+            item = items.get(key)
+            if not item or item.get('deleted'):
+                continue
+            idx = len(file_context)
             original_name = item.get('original_name', key)
             tags = item.get('tags', [])
-            transcript = item.get('transcript', '')[:15000]  # Increased to 15000 chars for better context
+            transcript = item.get('transcript') or item.get('transcript_preview', '')
+            excerpt = transcript[start:end] if start >= 0 else transcript[:CHUNK_EXCERPT_CHARS]
             
             context = f"[{idx}] File: {original_name}\n"
             if tags:
                 context += f"    Tags: {', '.join(tags)}\n"
-            if transcript:
-                # Show full transcript (up to 8000 chars) for search context
-                context += f"    Transcript: {transcript[:8000]}\n"
+            if excerpt:
+                context += f"    Transcript excerpt: {excerpt}\n"
             context += "\n"
             
             numbered_context.append(context)
@@ -755,11 +2372,31 @@ def qwen_search_files(user_query: str):
         
         all_context = "".join(numbered_context)
         
-        # PASS 1: STRICT/PRECISE SEARCH
-        print("[QWEN SEARCH] Pass 1: Strict search...")
-        strict_prompt = f"""You are a precise search agent. Find files that contain direct quotes, specific mentions, or very similar wording to the user's query.
+        deadline = time.time() + QWEN_SEARCH_DEADLINE_SECONDS
+        if QWEN_SEARCH_MODE == 'single':
+            indices = _run_qwen_single_pass(all_context, user_query, api_key, deadline)
+        else:
+            indices = _run_qwen_passes(all_context, user_query, api_key, deadline)
+        
+        if len(indices) == 0:
+            print("[QWEN SEARCH] All three passes found no matches")
+            return []
+        results = _build_search_results(indices, file_context)
+        # URLs are re-signed on a hit, so only keys/names/tags are cached
+        query_cache.store(cache_key, [{k: v for k, v in f.items() if k != 'url'} for f in results])
+        return results
+        
+    except Exception as e:
+        print(f"[QWEN SEARCH] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+def _qwen_pass_prompts(all_context: str, user_query: str):
+    """The three search passes, strictest first: (name, prompt, temperature)"""
+    strict_prompt = f"""You are a precise search agent. Find files that contain direct quotes, specific mentions, or very similar wording to the user's query.
 
-Here is a numbered list of all files with their metadata:
+Here is a numbered list of candidate files with their metadata:
 
 {all_context}
 
@@ -768,18 +2405,9 @@ User Query: {user_query}
 Your task: Identify ONLY files that contain direct quotes, specific phrases, or very closely related content to the user's query. Be strict - only include files with clear, direct relevance. Ignore tangential or loosely related files. Return ONLY the numbers (in square brackets) of matching files, one per line. For example: [0] [2] [5]
 If no files have direct relevance, return "NO_MATCHES"."""
 
-        strict_indices = _perform_qwen_search(strict_prompt, api_key, temperature=0.2)
-        
-        # If we got any results from strict search, return those
-        if len(strict_indices) > 0:
-            print(f"[QWEN SEARCH] Pass 1 returned {len(strict_indices)} results, using those")
-            return _build_search_results(strict_indices, file_context)
-        
-        # PASS 2: LENIENT SEARCH
-        print("[QWEN SEARCH] Pass 1 found nothing, doing Pass 2: Lenient search...")
-        lenient_prompt = f"""You are a lenient search agent. The user is looking for files matching their natural language query. Be GENEROUS - include files that are even tangentially related or have semantic overlap with the query.
+    lenient_prompt = f"""You are a lenient search agent. The user is looking for files matching their natural language query. Be GENEROUS - include files that are even tangentially related or have semantic overlap with the query.
 
-Here is a numbered list of all files with their metadata:
+Here is a numbered list of candidate files with their metadata:
 
 {all_context}
 
@@ -788,17 +2416,9 @@ User Query: {user_query}
 Your task: Identify which files match or relate to the user's query based on content, tags, and transcripts. Be lenient - include files with semantic overlap, even if not exact matches. Return ONLY the numbers (in square brackets) of matching files, one per line. For example: [0] [2] [5]
 If truly no files match, return "NO_MATCHES"."""
 
-        lenient_indices = _perform_qwen_search(lenient_prompt, api_key, temperature=0.5)
-        
-        if len(lenient_indices) > 0:
-            print(f"[QWEN SEARCH] Pass 2 returned {len(lenient_indices)} results")
-            return _build_search_results(lenient_indices, file_context)
-        
-        # PASS 3: TOPIC-BASED SEARCH (Most Lenient)
-        print("[QWEN SEARCH] Pass 2 found nothing, doing Pass 3: Topic-based search...")
-        topic_prompt = f"""You are a very lenient topic-matching search agent. The user is interested in files related to certain topics or general areas. Find ANY files that share a general topic, subject area, or broad theme with the user's query.
+    topic_prompt = f"""You are a very lenient topic-matching search agent. The user is interested in files related to certain topics or general areas. Find ANY files that share a general topic, subject area, or broad theme with the user's query.
 
-Here is a numbered list of all files with their metadata:
+Here is a numbered list of candidate files with their metadata:
 
 {all_context}
 
@@ -807,58 +2427,138 @@ User Query: {user_query}
 Your task: Identify ANY files that relate to the general topics or subject areas mentioned in the user's query, even if very loosely connected. Be extremely generous - include files that share any related topic, theme, or general area of interest. Return ONLY the numbers (in square brackets) of matching files, one per line. For example: [0] [2] [5]
 If no files relate to the topic at all, return "NO_MATCHES"."""
 
-        topic_indices = _perform_qwen_search(topic_prompt, api_key, temperature=0.7)
-        
-        if len(topic_indices) == 0:
-            print("[QWEN SEARCH] All three passes found no matches")
-            return []
-        
-        print(f"[QWEN SEARCH] Pass 3 returned {len(topic_indices)} results")
-        return _build_search_results(topic_indices, file_context)
-        
-    except Exception as e:
-        print(f"[QWEN SEARCH] Error: {e}")
-        import traceback
-        traceback.print_exc()
+    return [
+        ('strict', strict_prompt, 0.2),
+        ('lenient', lenient_prompt, 0.5),
+        ('topic', topic_prompt, 0.7)
+    ]
+
+def _run_qwen_passes(all_context: str, user_query: str, api_key: str, deadline: float):
+    """Run the strict/lenient/topic passes and return the strictest non-empty result within the deadline"""
+    passes = _qwen_pass_prompts(all_context, user_query)
+    
+    if QWEN_SEARCH_MODE == 'sequential':
+        for name, prompt, temperature in passes:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                print(f"[QWEN SEARCH] Deadline reached before {name} pass")
+                break
+            print(f"[QWEN SEARCH] Running {name} pass...")
+            indices = _perform_qwen_search(prompt, api_key, temperature=temperature, timeout=min(60, remaining))
+            if len(indices) > 0:
+                print(f"[QWEN SEARCH] {name} pass returned {len(indices)} results, using those")
+                return indices
         return []
+    
+    # Concurrent: all passes start together, so latency is about one LLM round trip
+    timeout = max(1, min(60, deadline - time.time()))
+    futures = [
+        (name, _qwen_pool.submit(_perform_qwen_search, prompt, api_key, temperature, timeout))
+        for name, prompt, temperature in passes
+    ]
+    try:
+        for name, future in futures:
+            try:
+                indices = future.result(timeout=max(0, deadline - time.time()))
+            except FutureTimeoutError:
+                print(f"[QWEN SEARCH] {name} pass missed the deadline")
+                continue
+            if len(indices) > 0:
+                print(f"[QWEN SEARCH] {name} pass returned {len(indices)} results, using those")
+                return indices
+        return []
+    finally:
+        for _, future in futures:
+            future.cancel()
 
-def _perform_qwen_search(prompt: str, api_key: str, temperature: float = 0.3):
-    """Helper function to perform a single Qwen search pass and return list of indices"""
+def _run_qwen_single_pass(all_context: str, user_query: str, api_key: str, deadline: float):
+    """One call that grades files into strict/lenient/topic tiers; returns the strictest non-empty tier"""
+    prompt = f"""You are a search agent. The user is looking for files matching their natural language query.
+
+Here is a numbered list of candidate files with their metadata:
+
+{all_context}
+
+User Query: {user_query}
+
+Your task: Grade every file that relates to the user's query into exactly one tier:
+STRICT: files with direct quotes, specific phrases, or very closely related content
+LENIENT: files with semantic overlap, even if not exact matches
+TOPIC: files that only share a general topic, theme or subject area
+Answer with exactly three lines in this format, listing file numbers in square brackets and leaving a tier empty if nothing fits:
+STRICT: [0] [2]
+LENIENT: [5]
+TOPIC:
+If no files relate to the query at all, return "NO_MATCHES"."""
+
+    timeout = max(1, min(60, deadline - time.time()))
+    tiers = _perform_qwen_tiered_search(prompt, api_key, timeout=timeout)
+    for name in ['strict', 'lenient', 'topic']:
+        if tiers.get(name):
+            print(f"[QWEN SEARCH] {name} tier has {len(tiers[name])} results, using those")
+            return tiers[name]
+    return []
+
+def _qwen_chat(prompt: str, api_key: str, temperature: float, timeout: float) -> str:
+    """Send one chat-completions request to Featherless and return the reply text ('' on failure)"""
+    started = time.perf_counter()
+    outcome = 'error'
     try:
-        response = requests.post(
-            "https://api.featherless.ai/v1/chat/completions",
+        response = http_session().post(
+            QWEN_API_URL,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json"
             },
             json={
-                "model": "Qwen/Qwen2.5-7B-Instruct",
+                "model": QWEN_MODEL,
                 "messages": [{"role": "user", "content": prompt}],
                 "temperature": temperature,
                 "max_tokens": 500
             },
-            timeout=60
+            timeout=timeout
         )
         
         if response.status_code == 200:
             result = response.json()
+            outcome = 'ok'
+            usage = result.get('usage') or {}
+            for kind in ('prompt_tokens', 'completion_tokens'):
+                if usage.get(kind):
+                    metrics.inc('llm_tokens_total', usage[kind], model=QWEN_MODEL, kind=kind[:-len('_tokens')])
             if 'choices' in result and len(result['choices']) > 0:
                 response_text = result['choices'][0]['message']['content'].strip()
                 print(f"[QWEN SEARCH] Response: {response_text}")
-                
-                if "NO_MATCHES" in response_text.upper():
-                    return []
-                
-                # Parse indices from response (e.g., "[0]", "[2]", "[5]")
-                import re
-                indices = [int(m) for m in re.findall(r'\[(\d+)\]', response_text)]
-                return indices
+                return response_text
         else:
+            outcome = f"http_{response.status_code}"
             print(f"[QWEN SEARCH] Featherless API error: {response.status_code}")
-            return []
     except Exception as e:
         print(f"[QWEN SEARCH] Error in search: {e}")
+    finally:
+        metrics.observe('llm_call_seconds', time.perf_counter() - started, model=QWEN_MODEL, outcome=outcome)
+    return ''
+
+def _perform_qwen_search(prompt: str, api_key: str, temperature: float = 0.3, timeout: float = 60):
+    """Helper function to perform a single Qwen search pass and return list of indices"""
+    response_text = _qwen_chat(prompt, api_key, temperature, timeout)
+    if not response_text or "NO_MATCHES" in response_text.upper():
         return []
+    
+    # Parse indices from response (e.g., "[0]", "[2]", "[5]")
+    return [int(m) for m in re.findall(r'\[(\d+)\]', response_text)]
+
+def _perform_qwen_tiered_search(prompt: str, api_key: str, timeout: float = 60):
+    """Helper function for the single-call mode: parse 'STRICT: [..]' style lines into {tier: indices}"""
+    response_text = _qwen_chat(prompt, api_key, 0.2, timeout)
+    tiers = {}
+    if not response_text or "NO_MATCHES" in response_text.upper():
+        return tiers
+    for line in response_text.splitlines():
+        match = re.match(r'\s*\**\s*(STRICT|LENIENT|TOPIC)\b', line, re.IGNORECASE)
+        if match:
+            tiers[match.group(1).lower()] = [int(m) for m in re.findall(r'\[(\d+)\]', line)]
+    return tiers
 
 def _build_search_results(indices: list, file_context: list):
     """Helper function to build result objects from file indices"""
@@ -870,11 +2570,7 @@ def _build_search_results(indices: list, file_context: list):
                 "key": f['key'],
                 "name": f['name'],
                 "tags": f['tags'],
-                "url": s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': AWS_BUCKET, 'Key': f['key']},
-                    ExpiresIn=3600
-                ) if s3_client else ''
+                "url": _url_for(f['key']) if s3_client else ''
             })
     print(f"[QWEN SEARCH] Returning {len(matching_files)} files")
     return matching_files
\ No newline at end of file
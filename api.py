@@ -1,11 +1,47 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import os
+import re
+import time
+from urllib.parse import quote
 
 # Import functions from DB_stuff
-from DB_stuff import upload_file, list_files, search_files, delete_file, get_transcript
+from DB_stuff import upload_fileobj, list_files, list_changes, search_files, delete_file, get_transcript, search_transcripts, transcript_info, iter_transcript, presign_cache_stats, build_search_index, upload_batch, expand_sources, start_job_tracker, start_ingest_workers, get_status, get_label_timeline, startup, warm_connections
 from fastapi import Body
+from metrics import metrics
+
+# Blocking boto3/requests work runs on this bounded pool instead of the event loop
+API_WORKER_THREADS = int(os.getenv("API_WORKER_THREADS", "16"))
+executor = ThreadPoolExecutor(max_workers=API_WORKER_THREADS, thread_name_prefix="api-worker")
+# Startup jobs (index build, tracker and worker start-up) get their own threads so a long scan holds no request worker
+startup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-startup")
+
+# Per-route concurrency limits so slow uploads/LLM searches can't take every worker thread
+upload_limit = asyncio.Semaphore(int(os.getenv("UPLOAD_CONCURRENCY", "4")))
+catalog_limit = asyncio.Semaphore(int(os.getenv("CATALOG_CONCURRENCY", "8")))
+search_limit = asyncio.Semaphore(int(os.getenv("SEARCH_CONCURRENCY", "8")))
+qwen_search_limit = asyncio.Semaphore(int(os.getenv("QWEN_SEARCH_CONCURRENCY", "2")))
+
+async def run_blocking(limit, fn, *args):
+    """Run a blocking DB_stuff call on the worker pool, holding the route's concurrency slot"""
+    async with limit:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args))
+
+def run_startup_task(fn):
+    """Start fn on the startup pool; nothing awaits it, so log a failure instead of losing it"""
+    def report(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Startup task {fn.__name__} failed: {future.exception()!r}")
+    future = startup_executor.submit(fn)
+    future.add_done_callback(report)
+    return future
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -13,7 +49,22 @@ async def lifespan(app: FastAPI):
     os.makedirs("temp/files/", exist_ok=True)
     os.makedirs("temp/videos/", exist_ok=True)
     os.makedirs("temp/audios/", exist_ok=True)
+    # Build the AWS clients before serving so no request pays for it; the connections warm in the background
+    started = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(executor, startup)
+    print(f"AWS clients ready in {time.perf_counter() - started:.2f}s")
+    app.state.startup_tasks = [
+        run_startup_task(warm_connections),
+        # Build the search index in the background so startup isn't blocked on a full scan
+        run_startup_task(build_search_index),
+        # Resume polling any Transcribe/Rekognition jobs left pending by the previous process
+        run_startup_task(start_job_tracker),
+        # Same for enrichment tasks still queued from before a restart
+        run_startup_task(start_ingest_workers),
+    ]
     yield
+    executor.shutdown(wait=False)
+    startup_executor.shutdown(wait=False)
     print("Server Shutdown")
 
 app = FastAPI(lifespan=lifespan)
@@ -26,38 +77,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template rather than raw path, so labels stay bounded
+        route = request.scope.get('route')
+        metrics.observe('http_request_seconds', time.perf_counter() - started,
+                        route=getattr(route, 'path', 'unmatched'), method=request.method, status=status)
+
 @app.post("/add_doc")
-async def add_doc(file: UploadFile = File(...), type: str = Form(...)):
-    # Determine folder based on type
-    folder = "files"
-    if type in ["mp4", "avi", "mkv"]:
-        folder = "videos"
-    elif type in ["mp3", "wav", "aac"]:
-        folder = "audios"
-        
-    save_path = f"temp/{folder}/{file.filename}"
-    
-    # Save locally first
-    with open(save_path, "wb") as f:
-        f.write(await file.read())
-    
-    # Upload to S3 (Triggers AI + DB)
+async def add_doc(file: UploadFile = File(...)):
+    # Starlette has already spooled the body (in memory up to 1 MB, then to a temp file) before this runs;
+    # the spool is handed to S3 as a multipart transfer without another copy into temp/ (Triggers AI + DB)
     try:
-        result = upload_file(save_path)
+        result = await run_blocking(upload_limit, upload_fileobj, file.file, file.filename)
         return {"message": "Success", "data": result}
     except Exception as e:
         return {"message": "Failed", "error": str(e)}
     finally:
-        if os.path.exists(save_path):
-            os.remove(save_path)
+        await file.close()
 
+# Batch ingest: many files per request, .zip/.tar archives are expanded; one slot since it fans out internally
+@app.post("/add_docs")
+async def add_docs(files: List[UploadFile] = File(...)):
+    try:
+        sources = expand_sources([(file.file, file.filename) for file in files])
+        result = await run_blocking(upload_limit, upload_batch, sources)
+        return {"message": "Success", "data": result}
+    except Exception as e:
+        return {"message": "Failed", "error": str(e)}
+    finally:
+        for file in files:
+            await file.close()
+
+# Paginated listing: pass the returned next_cursor back as ?cursor= until it is null
 @app.get("/list_docs")
-async def get_all_docs():
-    return list_files()
+async def get_all_docs(limit: int = 100, cursor: str = None):
+    try:
+        return await run_blocking(catalog_limit, list_files, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Delta sync: pass the sync_token from /list_docs (then next_token) as ?since=
+@app.get("/list_changes")
+async def get_doc_changes(since: str):
+    return await run_blocking(catalog_limit, list_changes, since)
 
 @app.get("/search")
 async def search_docs(q: str):
-    return search_files(q)
+    return await run_blocking(search_limit, search_files, q)
+
+# Phrase search inside transcripts: ?q=... ("quoted phrase" words); snippets highlight matches with <mark>,
+# audio/video matches carry start_ms/end_ms to seek to
+@app.get("/search_transcripts")
+async def search_transcripts_endpoint(q: str, limit: int = 20):
+    return await run_blocking(search_limit, search_transcripts, q, min(max(limit, 1), 100))
 
 # Delete route: expects JSON body {"key": "s3_key"}
 @app.post("/delete_doc")
@@ -65,18 +145,81 @@ async def delete_doc(payload: dict = Body(...)):
     key = payload.get('key')
     if not key:
         return {"success": False, "error": "missing key"}
-    ok = delete_file(key)
+    ok = await run_blocking(catalog_limit, delete_file, key)
     if ok:
         return {"success": True}
     return {"success": False, "error": "delete failed"}
 
-# Get transcript route: expects JSON body {"key": "s3_key"}
-@app.post("/get_transcript")
+# Deprecated: loads the whole transcript into a JSON body. Use GET /transcript, which streams it.
+# Kept for older clients; expects JSON body {"key": "s3_key"}
+@app.post("/get_transcript", deprecated=True)
 async def get_transcript_endpoint(payload: dict = Body(...)):
     key = payload.get('key')
     if not key:
         return {"success": False, "error": "missing key"}
-    return get_transcript(key)
+    return await run_blocking(catalog_limit, get_transcript, key)
+
+def _content_disposition(file_name: str) -> str:
+    """inline disposition for any file name: an ASCII fallback (header values must be Latin-1, and quotes
+    or backslashes would end the quoted string) plus the real name as RFC 5987 UTF-8"""
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', '_', file_name)
+    return f"inline; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+def _byte_range(header: str, size: int):
+    """(start, end) inclusive from a single 'bytes=' range; None if absent, ValueError if unsatisfiable"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    if first:
+        start, end = int(first), int(last) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+# Transcript download: ?key=s3_key; honours Range and sends the stored gzip as-is when the client accepts it
+@app.get("/transcript")
+async def stream_transcript(key: str, request: Request):
+    info = await run_blocking(catalog_limit, transcript_info, key)
+    if info is None:
+        return Response(status_code=404)
+    size = info['size']
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': _content_disposition(info['name'] + '.txt')
+    }
+    try:
+        byte_range = _byte_range(request.headers.get('range'), size)
+    except ValueError:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+    media_type = 'text/plain; charset=utf-8'
+    start, end = byte_range or (0, size - 1)
+    status = 206 if byte_range else 200
+    if byte_range:
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(max(end - start + 1, 0))
+    if 'text' in info:
+        return Response(info['text'][start:end + 1], status_code=status, headers=headers, media_type=media_type)
+    if not byte_range and 'gzip' in request.headers.get('accept-encoding', ''):
+        del headers['Content-Length']
+        headers['Content-Encoding'] = 'gzip'
+        return StreamingResponse(iter_transcript(info['transcript_key'], True), headers=headers, media_type=media_type)
+    return StreamingResponse(iter_transcript(info['transcript_key'], False, start, end), status_code=status,
+                             headers=headers, media_type=media_type)
+
+# Video label timeline: ?key=s3_key[&label=Boat]; labels ranked by screen time with their segments (ms)
+@app.get("/label_timeline")
+async def label_timeline(key: str, label: str = None):
+    return await run_blocking(catalog_limit, get_label_timeline, key, label)
+
+# Status route: expects JSON body {"key": "s3_key"}; reports pending/processing/ready/failed
+@app.post("/doc_status")
+async def doc_status(payload: dict = Body(...)):
+    key = payload.get('key')
+    if not key:
+        return {"success": False, "error": "missing key"}
+    return await run_blocking(catalog_limit, get_status, key)
 
 # Qwen search route: expects JSON body {"query": "natural language search"}
 @app.post("/qwen_search")
@@ -85,5 +228,22 @@ async def qwen_search(payload: dict = Body(...)):
     query = payload.get('query')
     if not query:
         return {"success": False, "error": "missing query", "files": []}
-    files = qwen_search_files(query)
-    return {"success": True, "files": files}
\ No newline at end of file
+    files = await run_blocking(qwen_search_limit, qwen_search_files, query)
+    return {"success": True, "files": files}
+
+# Cache hit/miss counters for tuning
+@app.get("/cache_stats")
+async def cache_stats():
+    from DB_stuff import query_cache, enrichment_cache
+    return {
+        "presigned_urls": presign_cache_stats(),
+        "qwen_search": query_cache.stats(),
+        "enrichment": enrichment_cache.stats() if enrichment_cache else None
+    }
+
+# Prometheus scrape endpoint: stage timings, AWS/LLM call latency and errors, queue depth and age
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Queue gauges read SQLite, so render off the event loop
+    body = await run_blocking(catalog_limit, metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
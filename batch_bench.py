@@ -0,0 +1,127 @@
+"""Batch ingest throughput: python batch_bench.py [--files 200] [--size-kb 256] [--workers 1 4 16 64] [--moto]
+
+Times DB_stuff.upload_batch on the same kind of input given three ways: plain files, one .zip and one .tar
+(expanded by expand_sources inside the timed call, as /add_docs and bulk_upload.py do). Each run sweeps
+BATCH_UPLOAD_CONCURRENCY and reports files/s and MB/s. Every run is a fresh interpreter with freshly
+generated random content, so no run is deduplicated against an earlier one. Point it at a local S3
+stand-in (AWS_ENDPOINT_URL_S3=http://localhost:9000 for MinIO, plus AWS_ENDPOINT_URL_DYNAMODB for
+DynamoDB Local) with the bucket, MediaTags and MediaContentIndex tables created, or pass --moto to run
+against in-process moto mocks. moto serves requests in the benchmark process under the GIL, so with
+--moto compare worker counts and input kinds rather than reading the absolute numbers."""
+import os
+import sys
+import json
+import shutil
+import tarfile
+import zipfile
+import argparse
+import tempfile
+import subprocess
+
+KINDS = ('files', 'zip', 'tar')
+
+def _start_moto():
+    from moto import mock_aws
+    import boto3
+    mock_aws().start()
+    region = os.environ['S3_REGION']
+    boto3.client('s3', region_name=region).create_bucket(Bucket=os.environ['BUCKET_NAME'])
+    dynamodb = boto3.resource('dynamodb', region_name=region)
+    dynamodb.create_table(
+        TableName='MediaTags',
+        KeySchema=[{'AttributeName': 'filename', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'filename', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb.create_table(
+        TableName=os.getenv('CONTENT_INDEX_TABLE', 'MediaContentIndex'),
+        KeySchema=[{'AttributeName': 'content_hash', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'content_hash', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+def _make_input(kind: str, scratch: str, files: int, size_kb: int):
+    """Write the batch for one run and return the paths to hand to upload_batch"""
+    source_dir = os.path.join(scratch, 'source')
+    os.makedirs(source_dir)
+    for i in range(files):
+        with open(os.path.join(source_dir, f'doc_{i:05d}.txt'), 'wb') as f:
+            f.write(os.urandom(size_kb * 1024))
+    if kind == 'files':
+        return [os.path.join(source_dir, name) for name in sorted(os.listdir(source_dir))]
+    archive = os.path.join(scratch, f'batch.{kind}')
+    if kind == 'zip':
+        # Stored, not deflated: random bytes don't compress, and the bench is about the upload path
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as out:
+            for name in sorted(os.listdir(source_dir)):
+                out.write(os.path.join(source_dir, name), name)
+    else:
+        with tarfile.open(archive, 'w') as out:
+            out.add(source_dir, arcname='.')
+    return [archive]
+
+def run_child(kind: str, scratch: str, files: int, size_kb: int, moto: bool):
+    if moto:
+        _start_moto()
+    import DB_stuff
+    DB_stuff.startup()
+    # Enrichment isn't part of ingest throughput; keep the workers from reading the objects back
+    DB_stuff.enrich_item = lambda payload: None
+    paths = _make_input(kind, scratch, files, size_kb)
+    sources = ((open(path, 'rb'), os.path.basename(path)) for path in paths)
+    result = DB_stuff.upload_batch(DB_stuff.expand_sources(sources))
+    print(json.dumps({key: result[key] for key in ('uploaded', 'deduplicated', 'bytes', 'seconds',
+                                                    'files_per_second', 'mb_per_second')}
+                     | {'failed': len(result['failed'])}))
+
+def run_once(kind: str, workers: int, args, env):
+    scratch = tempfile.mkdtemp(prefix='batch_bench_')
+    child_env = dict(env, BATCH_UPLOAD_CONCURRENCY=str(workers),
+                     INGEST_DB_PATH=os.path.join(scratch, 'ingest.db'), JOBS_DB_PATH=os.path.join(scratch, 'jobs.db'))
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', kind, scratch,
+           '--files', str(args.files), '--size-kb', str(args.size_kb)] + (['--moto'] if args.moto else [])
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, env=child_env,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if result.returncode != 0:
+        raise SystemExit(f"{kind} run with {workers} workers failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="upload_batch files/s and MB/s for plain files, .zip and .tar at several worker counts")
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--size-kb', type=int, default=256)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 64], help="BATCH_UPLOAD_CONCURRENCY values")
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--moto', action='store_true', help="use in-process moto mocks instead of S3/DynamoDB endpoints")
+    parser.add_argument('--child', nargs=2, metavar=('KIND', 'SCRATCH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child[0], args.child[1], args.files, args.size_kb, args.moto)
+
+    env = dict(os.environ)
+    env.setdefault('S3_REGION', 'us-east-1')
+    env.setdefault('AWS_DEFAULT_REGION', env['S3_REGION'])
+    env['ENRICHMENT_CACHE_PATH'] = ''
+    if args.moto:
+        env.setdefault('BUCKET_NAME', 'batch-bench')
+        env.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+        env.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+
+    print(f"{args.files} files of {args.size_kb} KB ({args.files * args.size_kb / 1024:.1f} MB) per run, "
+          f"{os.getenv('BATCH_MAX_IN_FLIGHT', '64')} files in flight at most")
+    for kind in args.kinds:
+        for workers in args.workers:
+            for _ in range(args.runs):
+                r = run_once(kind, workers, args, env)
+                print(f"{kind:5s} workers={workers:3d}: {r['uploaded']} files in {r['seconds']:6.2f}s, "
+                      f"{r['files_per_second']:7.1f} files/s, {r['mb_per_second']:6.1f} MB/s"
+                      + (f", {r['failed']} failed" if r['failed'] else "")
+                      + (f", {r['deduplicated']} deduplicated" if r['deduplicated'] else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Bulk ingest from the command line: python bulk_upload.py <dir | archive | file> [...]"""
+import argparse
+import os
+import sys
+
+from DB_stuff import upload_batch, expand_sources, iter_directory
+
+def iter_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from iter_directory(path)
+        else:
+            yield open(path, 'rb'), os.path.basename(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload many files (directories, .zip/.tar archives or single files) in one batch")
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    result = upload_batch(expand_sources(iter_paths(args.paths)))
+    print(f"Uploaded {result['uploaded']} files ({result['bytes'] / 1e6:.1f} MB) in {result['seconds']}s")
+    print(f"Throughput: {result['files_per_second']} files/s, {result['mb_per_second']} MB/s")
+    for failure in result['failed']:
+        print(f"  FAILED {failure['name']}: {failure['error']}")
+    return 1 if result['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import logging
+import threading
+import boto3
+from botocore.config import Config
+from metrics import metrics
+
+# Every thread (API workers, ingest workers, transfer threads, job tracker) shares one client per service,
+# so each client's pool must cover the peak concurrency of all of them together
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+# S3 also carries multipart transfer threads: uploads * parts in flight, plus batch ingest
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "100"))
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "standard")
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
+AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "5"))
+AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "60"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_CONNECT_RETRIES = int(os.getenv("HTTP_CONNECT_RETRIES", "2"))
+
+POOL_SIZES = {'s3': S3_MAX_POOL_CONNECTIONS}
+
+_session = boto3.session.Session()
+_lock = threading.Lock()
+_http = None
+
+def aws_config(service: str) -> Config:
+    return Config(
+        max_pool_connections=POOL_SIZES.get(service, AWS_MAX_POOL_CONNECTIONS),
+        retries={'mode': AWS_RETRY_MODE, 'total_max_attempts': AWS_MAX_ATTEMPTS},
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+        tcp_keepalive=True
+    )
+
+def aws_client(service: str, region: str = None):
+    """A tuned, instrumented boto3 client. Clients are thread-safe once built; building them isn't, hence the lock."""
+    with _lock:
+        client = _session.client(service, region_name=region or os.getenv("S3_REGION"), config=aws_config(service))
+    return metrics.instrument_client(client)
+
+def aws_resource(service: str, region: str = None):
+    with _lock:
+        resource = _session.resource(service, region_name=region or os.getenv("S3_REGION"), config=aws_config(service))
+    metrics.instrument_client(resource.meta.client)
+    return resource
+
+def http_session():
+    """Shared keep-alive session for outbound HTTP (Featherless, transcript downloads), so calls reuse
+    connections instead of paying a TCP + TLS handshake each time. Only failed connects are retried."""
+    global _http
+    with _lock:
+        if _http is None:
+            # Imported here: only search and transcript downloads need it, not start-up
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=Retry(total=HTTP_CONNECT_RETRIES, connect=HTTP_CONNECT_RETRIES, read=0, status=0, backoff_factor=0.2)
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http = session
+    return _http
+
+class _PoolFullHandler(logging.Handler):
+    """urllib3 logs a warning and drops the connection when more threads use a host than its pool holds;
+    count those so saturation shows up in /metrics rather than only in the log"""
+
+    def emit(self, record):
+        if str(record.msg).startswith("Connection pool is full"):
+            host = record.args[0] if record.args else 'unknown'
+            metrics.inc('http_pool_full_total', host=host)
+        # Having a handler silences logging's default stderr output, so keep printing the warnings
+        print(f"[HTTP] {record.getMessage()}")
+
+logging.getLogger('urllib3.connectionpool').addHandler(_PoolFullHandler(logging.WARNING))
+
+def _pool_limits():
+    return {(('service', service),): size for service, size in POOL_SIZES.items()} | {(('service', 'default'),): AWS_MAX_POOL_CONNECTIONS}
+
+metrics.gauge('aws_pool_connections', _pool_limits)
+metrics.describe('aws_pool_connections', 'Configured connection pool size per client')
+metrics.describe('http_pool_full_total', 'Connections discarded because the pool for a host was full')
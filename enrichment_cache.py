@@ -0,0 +1,96 @@
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class EnrichmentCache:
+    """Persistent memo of raw AI service responses, keyed on (content hash, service, parameters).
+    Values are zlib-compressed JSON in a local SQLite file; least recently used entries are evicted
+    once the total stored size passes max_bytes. Thresholds and other post-processing are applied
+    by the caller, so they can change without calling the service again."""
+
+    def __init__(self, path: str, max_bytes: int = 1024 ** 3):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                cache_key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                service TEXT NOT NULL,
+                params TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (used_at)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(content_hash: str, service: str, params: dict) -> str:
+        return f"{service}:{content_hash}:{json.dumps(params or {}, sort_keys=True)}"
+
+    def get(self, content_hash: str, service: str, params: dict = None):
+        """The stored response, or None"""
+        if not content_hash:
+            return None
+        key = self.make_key(content_hash, service, params)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._conn.execute("UPDATE responses SET used_at = ? WHERE cache_key = ?", (time.time(), key))
+            self._stats['hits'] += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, content_hash: str, service: str, params: dict, value):
+        if not content_hash:
+            return
+        key = self.make_key(content_hash, service, params)
+        blob = zlib.compress(json.dumps(value, default=str).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE cache_key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, content_hash, service, params, value, size, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, content_hash, service, json.dumps(params or {}, sort_keys=True), blob, len(blob), now, now)
+            )
+            self._size += len(blob) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop the least recently used tenth in one go rather than one row per put
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT cache_key, size FROM responses ORDER BY used_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            doomed.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE cache_key = ?", doomed)
+        self._stats['evictions'] += len(doomed)
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': count,
+                'bytes': self._size,
+                'capacity_bytes': self.max_bytes,
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0
+            }
@@ -0,0 +1,188 @@
+import json
+import time
+import sqlite3
+import threading
+
+class IngestQueue:
+    """Durable SQLite work queue for post-upload enrichment. Tasks are leased while running, retried with
+    exponential backoff, and moved to the dead-letter state ('dead') after max_attempts failures."""
+
+    def __init__(self, path: str, max_attempts: int = 5, retry_base_seconds: float = 10, lease_seconds: float = 1800):
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                lease_until REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, next_attempt_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_item ON tasks (item_key)")
+
+    def enqueue(self, item_key: str, payload: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tasks (item_key, payload, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (item_key, json.dumps(payload), now, now, now)
+            )
+            self._ready.notify()
+
+    def enqueue_many(self, tasks):
+        """Queue [(item_key, payload)] in one transaction"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO tasks (item_key, payload, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(item_key, json.dumps(payload), now, now, now) for item_key, payload in tasks]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._ready.notify_all()
+
+    def claim(self, timeout: float):
+        """Lease the next runnable task, waiting up to timeout seconds; None if there is nothing to do"""
+        deadline = time.time() + timeout
+        with self._lock:
+            while True:
+                now = time.time()
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        "SELECT * FROM tasks WHERE next_attempt_at <= ? AND "
+                        "(status = 'queued' OR (status = 'running' AND lease_until <= ?)) "
+                        "ORDER BY next_attempt_at LIMIT 1",
+                        (now, now)
+                    ).fetchone()
+                    if row:
+                        self._conn.execute(
+                            "UPDATE tasks SET status = 'running', lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                            "WHERE task_id = ?",
+                            (now + self.lease_seconds, now, row['task_id'])
+                        )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                if row:
+                    task = dict(row, payload=json.loads(row['payload']))
+                    task['attempts'] += 1
+                    return task
+                if now >= deadline:
+                    return None
+                self._ready.wait(min(1.0, deadline - now))
+
+    def complete(self, task_id: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = 'done', lease_until = 0, last_error = NULL, updated_at = ? WHERE task_id = ?",
+                (time.time(), task_id)
+            )
+
+    def fail(self, task: dict, error: str):
+        """Schedule a retry, or dead-letter the task once it is out of attempts. Returns the new status."""
+        now = time.time()
+        if task['attempts'] >= self.max_attempts:
+            status, next_attempt_at = 'dead', now
+        else:
+            status, next_attempt_at = 'queued', now + self.retry_base_seconds * (2 ** (task['attempts'] - 1))
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, next_attempt_at = ?, lease_until = 0, last_error = ?, updated_at = ? "
+                "WHERE task_id = ?",
+                (status, next_attempt_at, error, now, task['task_id'])
+            )
+        return status
+
+    def status(self, item_key: str):
+        """Latest task state for an item, or None if it was never queued here"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, attempts, last_error, created_at, updated_at FROM tasks "
+                "WHERE item_key = ? ORDER BY task_id DESC LIMIT 1",
+                (item_key,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def dead_letters(self, limit: int = 100):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, item_key, attempts, last_error, updated_at FROM tasks "
+                "WHERE status = 'dead' ORDER BY updated_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), MIN(created_at) FROM tasks WHERE status != 'done' GROUP BY status"
+            ).fetchall()
+        now = time.time()
+        stats = {'queued': 0, 'running': 0, 'dead': 0, 'oldest_queued_age_seconds': 0.0}
+        for status, count, oldest in rows:
+            stats[status] = count
+            if status == 'queued' and oldest:
+                stats['oldest_queued_age_seconds'] = now - oldest
+        return stats
+
+class IngestWorkerPool:
+    """Fixed set of worker threads that drain an IngestQueue through handler(payload)"""
+
+    def __init__(self, queue: IngestQueue, handler, workers: int = 4, on_dead=None):
+        self.queue = queue
+        self.handler = handler
+        self.on_dead = on_dead
+        self.workers = workers
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"ingest-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"[INGEST] Started {self.workers} enrichment workers")
+
+    def _run(self):
+        while True:
+            try:
+                task = self.queue.claim(timeout=5)
+            except Exception as e:
+                print(f"[INGEST] Queue error: {e}")
+                time.sleep(5)
+                continue
+            if task is None:
+                continue
+            try:
+                self.handler(task['payload'])
+                self.queue.complete(task['task_id'])
+            except Exception as e:
+                status = self.queue.fail(task, str(e))
+                print(f"[INGEST] Task for {task['item_key']} failed (attempt {task['attempts']}): {e} -> {status}")
+                if status == 'dead' and self.on_dead:
+                    try:
+                        self.on_dead(task['payload'], str(e))
+                    except Exception as hook_error:
+                        print(f"[INGEST] Dead-letter hook error: {hook_error}")
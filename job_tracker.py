@@ -0,0 +1,241 @@
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class JobStore:
+    """SQLite table of in-flight AWS jobs. Survives restarts; a lease stops two workers polling the same job.
+    Adding a job that is already known is a no-op, so a retried start can re-track its job safely."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL,
+                next_poll_at REAL NOT NULL,
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                detail TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_poll_at)")
+
+    def add(self, job_id: str, kind: str, payload: dict, next_poll_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, kind, payload, created_at, next_poll_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), time.time(), next_poll_at)
+            )
+
+    def claim_due(self, now: float, limit: int, lease_seconds: float):
+        """Lease up to limit pending jobs whose next poll is due"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' AND next_poll_at <= ? AND lease_until <= ? "
+                    "ORDER BY next_poll_at LIMIT ?",
+                    (now, now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET lease_until = ? WHERE job_id = ?",
+                    [(now + lease_seconds, row['job_id']) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [dict(row, payload=json.loads(row['payload'])) for row in rows]
+
+    def reschedule(self, job_id: str, next_poll_at: float):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET next_poll_at = ?, lease_until = 0, attempts = attempts + 1 WHERE job_id = ?",
+                (next_poll_at, job_id)
+            )
+
+    def mark_due(self, job_id: str):
+        """A completion notification arrived: poll this job on the next tick"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET next_poll_at = 0 WHERE job_id = ? AND status = 'pending'", (job_id,)
+            )
+
+    def finish(self, job_id: str, status: str, detail: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, detail = ?, lease_until = 0 WHERE job_id = ?",
+                (status, detail, job_id)
+            )
+
+    def next_due(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_poll_at) FROM jobs WHERE status = 'pending'"
+            ).fetchone()
+        return row[0]
+
+    def stats(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM jobs WHERE status = 'pending'"
+            ).fetchone()
+        return {'pending': row[0], 'oldest_age_seconds': time.time() - row[1] if row[1] else 0.0}
+
+class SqsNotifier:
+    """Reads job-completion events from an SQS queue: Rekognition SNS notifications
+    ({"JobId", "Status"}) and Transcribe EventBridge events (detail.TranscriptionJobName)"""
+
+    def __init__(self, sqs_client, queue_url: str):
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+
+    def receive(self, wait_seconds: int):
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=max(0, min(20, int(wait_seconds)))
+        )
+        job_ids = []
+        for message in response.get('Messages', []):
+            try:
+                body = json.loads(message['Body'])
+                # SNS wraps the Rekognition payload in a 'Message' string
+                if 'Message' in body and isinstance(body['Message'], str):
+                    body = json.loads(body['Message'])
+                job_id = body.get('JobId') or body.get('detail', {}).get('TranscriptionJobName')
+                if job_id:
+                    job_ids.append(job_id)
+            except Exception as e:
+                print(f"[JOBS] Unreadable notification: {e}")
+            self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message['ReceiptHandle'])
+        return job_ids
+
+class JobTracker:
+    """One scheduler thread polls every pending job in batches with age-based backoff.
+    Handlers are registered per job kind:
+      poll(job) -> ('pending' | 'done' | 'failed', detail)
+      on_done(job, detail) runs on a small completion pool
+      on_failed(job, reason), optional, runs when a job fails, times out or its completion keeps failing"""
+
+    # (max job age in seconds, poll interval) - fast while a job is young, slower as it ages
+    BACKOFF = [(300, 15), (1800, 60), (float('inf'), 300)]
+    MAX_COMPLETION_ATTEMPTS = 3
+
+    def __init__(self, store: JobStore, tick_seconds: float = 5, batch_size: int = 100,
+                 max_age_seconds: float = 12 * 3600, completion_workers: int = 4, notifier: SqsNotifier = None):
+        self.store = store
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        self.max_age_seconds = max_age_seconds
+        self.notifier = notifier
+        self._handlers = {}
+        self._completion_failures = {}
+        self._pool = ThreadPoolExecutor(max_workers=completion_workers, thread_name_prefix="job-complete")
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def register(self, kind: str, poll, on_done, on_failed=None):
+        self._handlers[kind] = (poll, on_done, on_failed)
+
+    def poll_interval(self, age_seconds: float) -> float:
+        for max_age, interval in self.BACKOFF:
+            if age_seconds < max_age:
+                # With completion notifications, polling is only a safety net
+                return interval * 4 if self.notifier else interval
+        return self.BACKOFF[-1][1]
+
+    def track(self, job_id: str, kind: str, payload: dict):
+        self.store.add(job_id, kind, payload, time.time() + self.poll_interval(0))
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        """Start the scheduler thread once; any jobs left pending by a previous process resume"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-tracker", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        print("[JOBS] Job tracker started")
+        while True:
+            try:
+                self._wait()
+                self._tick()
+            except Exception as e:
+                print(f"[JOBS] Scheduler error: {e}")
+                time.sleep(self.tick_seconds)
+
+    def _wait(self):
+        next_due = self.store.next_due()
+        timeout = self.tick_seconds if next_due is None else max(0, min(self.tick_seconds, next_due - time.time()))
+        if self.notifier:
+            for job_id in self.notifier.receive(timeout):
+                self.store.mark_due(job_id)
+        elif timeout > 0:
+            self._wake.wait(timeout)
+        self._wake.clear()
+
+    def _tick(self):
+        now = time.time()
+        jobs = self.store.claim_due(now, self.batch_size, lease_seconds=600)
+        for job in jobs:
+            age = now - job['created_at']
+            poll, on_done, on_failed = self._handlers[job['kind']]
+            try:
+                status, detail = poll(job)
+            except Exception as e:
+                print(f"[JOBS] Error polling {job['kind']} job {job['job_id']}: {e}")
+                status, detail = 'pending', None
+
+            if status == 'done':
+                self._pool.submit(self._complete, job, on_done, on_failed, detail)
+            elif status == 'failed':
+                print(f"[JOBS] {job['kind']} job failed: {job['job_id']} ({detail})")
+                self.store.finish(job['job_id'], 'failed', str(detail))
+                self._failed(job, on_failed, str(detail))
+            elif age > self.max_age_seconds:
+                print(f"[JOBS] {job['kind']} job timed out: {job['job_id']}")
+                self.store.finish(job['job_id'], 'timeout')
+                self._failed(job, on_failed, 'timed out')
+            else:
+                self.store.reschedule(job['job_id'], time.time() + self.poll_interval(age))
+
+    def _complete(self, job, on_done, on_failed, detail):
+        try:
+            on_done(job, detail)
+            self.store.finish(job['job_id'], 'done')
+            self._completion_failures.pop(job['job_id'], None)
+        except Exception as e:
+            print(f"[JOBS] Error completing {job['kind']} job {job['job_id']}: {e}")
+            import traceback
+            traceback.print_exc()
+            failures = self._completion_failures.get(job['job_id'], 0) + 1
+            self._completion_failures[job['job_id']] = failures
+            if failures >= self.MAX_COMPLETION_ATTEMPTS:
+                self.store.finish(job['job_id'], 'failed', str(e))
+                self._failed(job, on_failed, str(e))
+            else:
+                # Retry the completion on a later tick
+                self.store.reschedule(job['job_id'], time.time() + self.poll_interval(0))
+
+    def _failed(self, job, on_failed, reason: str):
+        if on_failed is None:
+            return
+        try:
+            on_failed(job, reason)
+        except Exception as e:
+            print(f"[JOBS] Error handling failed {job['kind']} job {job['job_id']}: {e}")
+
+    def stats(self):
+        return self.store.stats()
@@ -0,0 +1,110 @@
+"""/list_docs latency while uploads and /qwen_search calls are in flight: python load_bench.py [--seconds 20]
+
+Runs the FastAPI app in-process (httpx ASGI transport, one event loop as under uvicorn) with the DB_stuff
+calls replaced by stand-ins that block for a set time, the way boto3 and the Featherless call do. The
+'inline' mode calls them on the event loop, as the routes did before run_blocking, for comparison."""
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+import api
+import DB_stuff
+
+def stand_ins(args):
+    def list_files(limit=100, cursor=None):
+        time.sleep(args.list_ms / 1000)
+        return {'files': [], 'next_cursor': None, 'sync_token': '0'}
+
+    def upload_fileobj(fileobj, file_name):
+        while fileobj.read(1024 * 1024):
+            pass
+        time.sleep(args.upload_ms / 1000)
+        return {'key': file_name, 'name': file_name, 'url': '', 'tags': [], 'status': 'pending'}
+
+    def qwen_search_files(query):
+        time.sleep(args.qwen_ms / 1000)
+        return []
+
+    api.list_files = list_files
+    api.upload_fileobj = upload_fileobj
+    # The route imports this one from DB_stuff on each call
+    DB_stuff.qwen_search_files = qwen_search_files
+
+async def run_inline(limit, fn, *args):
+    return fn(*args)
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def load(args):
+    transport = httpx.ASGITransport(app=api.app)
+    stop = asyncio.Event()
+    counts = {'uploads': 0, 'qwen': 0}
+    body = b'x' * (args.upload_kb * 1024)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        async def uploader():
+            while not stop.is_set():
+                await client.post('/add_doc', files={'file': ('bench.bin', body)}, data={'type': 'bin'})
+                counts['uploads'] += 1
+
+        async def searcher():
+            while not stop.is_set():
+                await client.post('/qwen_search', json={'query': 'tidal energy lectures'})
+                counts['qwen'] += 1
+
+        async def lister(latencies):
+            # Latency counts from when the request was due, so time the loop spends blocked before
+            # sending it is included (no coordinated omission)
+            due = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(max(0, due - time.perf_counter()))
+                response = await client.get('/list_docs')
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - due)
+                due = max(due + args.list_interval_ms / 1000, time.perf_counter() - 1)
+
+        latencies = []
+        tasks = [asyncio.create_task(uploader()) for _ in range(args.uploaders)]
+        tasks += [asyncio.create_task(searcher()) for _ in range(args.searchers)]
+        tasks += [asyncio.create_task(lister(latencies)) for _ in range(args.listers)]
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return latencies, counts
+
+def main():
+    parser = argparse.ArgumentParser(description="p50/p99 of /list_docs under concurrent uploads and LLM searches")
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--mode', choices=['executor', 'inline', 'both'], default='both')
+    parser.add_argument('--uploaders', type=int, default=4)
+    parser.add_argument('--searchers', type=int, default=4)
+    parser.add_argument('--listers', type=int, default=8)
+    parser.add_argument('--upload-ms', type=float, default=2000, help="blocking time per upload (S3 transfer)")
+    parser.add_argument('--upload-kb', type=int, default=1024)
+    parser.add_argument('--qwen-ms', type=float, default=3000, help="blocking time per qwen_search (LLM round trip)")
+    parser.add_argument('--list-ms', type=float, default=20, help="blocking time per list_docs (DynamoDB scan page)")
+    parser.add_argument('--list-interval-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    stand_ins(args)
+    executor_run_blocking = api.run_blocking
+    modes = ['executor', 'inline'] if args.mode == 'both' else [args.mode]
+    print(f"{args.uploaders} uploaders ({args.upload_ms:.0f} ms), {args.searchers} qwen searchers ({args.qwen_ms:.0f} ms), "
+          f"{args.listers} list pollers ({args.list_ms:.0f} ms); {api.API_WORKER_THREADS} worker threads")
+    for mode in modes:
+        api.run_blocking = executor_run_blocking if mode == 'executor' else run_inline
+        latencies, counts = asyncio.run(load(args))
+        if not latencies:
+            print(f"{mode:8s}: no /list_docs request completed")
+            continue
+        print(f"{mode:8s}: /list_docs n={len(latencies)} p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms "
+              f"(mean {statistics.mean(latencies) * 1000:.0f} ms); {counts['uploads']} uploads, {counts['qwen']} searches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import io
+import os
+import time
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# A page with less text than this that carries an image is treated as scanned and sent to OCR
+OCR_MIN_PAGE_CHARS = int(os.getenv("PDF_OCR_MIN_PAGE_CHARS", "20"))
+# Documents with at least this many pages are split across worker processes
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# The PDF libraries take ~150 ms to import, so they load on the first extraction rather than at start-up
+@functools.lru_cache(maxsize=None)
+def _fitz():
+    """The PyMuPDF module, or None if it isn't installed"""
+    try:
+        import pymupdf as fitz
+    except ImportError:
+        try:
+            import fitz  # PyMuPDF < 1.24
+        except ImportError:
+            return None
+    return fitz
+
+@functools.lru_cache(maxsize=None)
+def _pypdf():
+    try:
+        import pypdf
+    except ImportError:
+        return None
+    return pypdf
+
+class PyMuPDFEngine:
+    name = 'pymupdf'
+
+    def page_count(self, data: bytes) -> int:
+        fitz = _fitz()
+        with fitz.open(stream=data, filetype='pdf') as doc:
+            return doc.page_count
+
+    def extract_range(self, data: bytes, start: int, stop: int):
+        """[(text, has_images)] for pages start..stop-1"""
+        fitz = _fitz()
+        pages = []
+        with fitz.open(stream=data, filetype='pdf') as doc:
+            for i in range(start, stop):
+                try:
+                    page = doc[i]
+                    pages.append((page.get_text('text'), bool(page.get_images(full=False))))
+                except Exception:
+                    pages.append(('', False))
+        return pages
+
+    def subset(self, data: bytes, page_numbers) -> bytes:
+        """A new PDF containing only the given pages, in order"""
+        fitz = _fitz()
+        with fitz.open(stream=data, filetype='pdf') as doc, fitz.open() as out:
+            for i in page_numbers:
+                out.insert_pdf(doc, from_page=i, to_page=i)
+            return out.tobytes()
+
+class PypdfEngine:
+    name = 'pypdf'
+
+    def page_count(self, data: bytes) -> int:
+        return len(_pypdf().PdfReader(io.BytesIO(data)).pages)
+
+    def extract_range(self, data: bytes, start: int, stop: int):
+        reader = _pypdf().PdfReader(io.BytesIO(data))
+        pages = []
+        for i in range(start, stop):
+            try:
+                page = reader.pages[i]
+                resources = page.get('/Resources') or {}
+                xobjects = resources.get('/XObject') if hasattr(resources, 'get') else None
+                pages.append((page.extract_text() or '', bool(xobjects)))
+            except Exception:
+                pages.append(('', False))
+        return pages
+
+    def subset(self, data: bytes, page_numbers) -> bytes:
+        reader = _pypdf().PdfReader(io.BytesIO(data))
+        writer = _pypdf().PdfWriter()
+        for i in page_numbers:
+            writer.add_page(reader.pages[i])
+        out = io.BytesIO()
+        writer.write(out)
+        return out.getvalue()
+
+ENGINES = {
+    'pymupdf': PyMuPDFEngine,
+    'pypdf': PypdfEngine,
+}
+
+def available_engines():
+    return [name for name, available in (('pymupdf', _fitz() is not None), ('pypdf', _pypdf() is not None)) if available]
+
+def get_engine(name: str = 'auto'):
+    """PDF text engine by name; 'auto' prefers PyMuPDF (much faster) and falls back to pypdf"""
+    if name == 'auto':
+        engines = available_engines()
+        if not engines:
+            raise RuntimeError("No PDF engine installed (pip install pymupdf or pypdf)")
+        name = engines[0]
+    if name not in ENGINES:
+        raise ValueError(f"Unknown PDF engine: {name}")
+    return ENGINES[name]()
+
+def _extract_range(engine_name: str, data: bytes, start: int, stop: int):
+    # Runs in a worker process
+    return ENGINES[engine_name]().extract_range(data, start, stop)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    # Ingest workers extract concurrently; without the lock two first callers would each start a pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: callers run on threads and forking a threaded process can deadlock
+            _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+class PdfText:
+    """Per-page extraction result"""
+
+    def __init__(self, pages, engine: str):
+        self.pages = [text for text, _ in pages]
+        self.ocr_pages = [
+            i for i, (text, has_images) in enumerate(pages)
+            if has_images and len(text.strip()) < OCR_MIN_PAGE_CHARS
+        ]
+        self.engine = engine
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.pages)
+
+    def fill(self, ocr_text_by_page):
+        """Put OCR results in place of the scanned pages' (near-empty) text"""
+        for i, text in ocr_text_by_page.items():
+            self.pages[i] = text
+
+def extract_pdf(data: bytes, engine: str = 'auto', workers: int = None) -> PdfText:
+    """Extract text page by page. Large documents are split into page ranges across processes."""
+    engine = get_engine(engine)
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    n_pages = engine.page_count(data)
+    if workers <= 1 or n_pages < PDF_PARALLEL_MIN_PAGES:
+        return PdfText(engine.extract_range(data, 0, n_pages), engine.name)
+    step = -(-n_pages // workers)
+    futures = [
+        _get_pool().submit(_extract_range, engine.name, data, start, min(start + step, n_pages))
+        for start in range(0, n_pages, step)
+    ]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return PdfText(pages, engine.name)
+
+def subset_pdf(data: bytes, page_numbers, engine: str = 'auto') -> bytes:
+    return get_engine(engine).subset(data, page_numbers)
+
+def can_render() -> bool:
+    return _fitz() is not None
+
+def render_pages(data: bytes, page_numbers, dpi: int = 200, max_pixels: int = 9000, max_bytes: int = 10 * 1024 * 1024):
+    """Yield (page number, image bytes) for each page; the scale is capped so neither side exceeds max_pixels.
+    Pages are PNG unless that is over max_bytes (Textract's synchronous limit): then JPEG, downscaled until it fits."""
+    fitz = _fitz()
+    with fitz.open(stream=data, filetype='pdf') as doc:
+        for i in page_numbers:
+            page = doc[i]
+            zoom = dpi / 72
+            longest = max(page.rect.width, page.rect.height) * zoom
+            if longest > max_pixels:
+                zoom *= max_pixels / longest
+            yield i, _encode_page(fitz, page, zoom, max_bytes)
+
+def _encode_page(fitz, page, zoom: float, max_bytes: int) -> bytes:
+    while True:
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+        image = pixmap.tobytes('png')
+        if len(image) <= max_bytes:
+            return image
+        # Noisy scans compress badly as PNG; JPEG is usually several times smaller
+        image = pixmap.tobytes('jpeg', jpg_quality=85)
+        if len(image) <= max_bytes or min(pixmap.width, pixmap.height) <= 100:
+            return image
+        # Bytes scale with the area, so shrink each side by the square root of the overshoot (with some margin)
+        zoom *= max(0.5, 0.9 * (max_bytes / len(image)) ** 0.5)
+
+def _make_corpus(n_docs: int, n_pages: int):
+    """Generated text PDFs for benchmarking (needs PyMuPDF)"""
+    fitz = _fitz()
+    words = "tidal currents estuary salinity sediment transport wave energy shoreline erosion marsh".split()
+    docs = []
+    for d in range(n_docs):
+        with fitz.open() as doc:
+            for p in range(n_pages):
+                page = doc.new_page()
+                body = ' '.join(words[(d + p + i) % len(words)] for i in range(400))
+                page.insert_textbox(fitz.Rect(50, 50, 550, 800), body, fontsize=9)
+            docs.append(doc.tobytes())
+    return docs
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Pages/s for each installed PDF engine on a generated corpus")
+    parser.add_argument('--docs', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=PDF_EXTRACT_WORKERS)
+    args = parser.parse_args()
+
+    corpus = _make_corpus(args.docs, args.pages)
+    total_pages = args.docs * args.pages
+    for name in available_engines():
+        for workers in sorted({1, args.workers}):
+            extract_pdf(corpus[0], name, workers)  # warm-up: process pool start-up isn't per-document cost
+            started = time.time()
+            chars = sum(len(extract_pdf(data, name, workers).text) for data in corpus)
+            seconds = time.time() - started
+            print(f"{name:8s} workers={workers}: {total_pages / seconds:8.1f} pages/s ({chars} chars, {seconds:.2f}s)")
+    if _pool is not None:
+        _pool.shutdown()
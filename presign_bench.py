@@ -0,0 +1,65 @@
+"""List latency with and without the presigned-URL cache: python presign_bench.py [--items 10000] [--polls 5]
+
+Builds /list_docs entries for a synthetic catalog the way list_files does, so the time is the per-item
+work on the request thread (URL signing plus shaping) without the DynamoDB read. Signing is local HMAC
+work, so no AWS access is needed; dummy credentials are used if none are configured."""
+import os
+import time
+import argparse
+import statistics
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ.setdefault('S3_REGION', 'us-east-1')
+
+import DB_stuff
+from clients import aws_client
+
+def list_page(items):
+    return [DB_stuff._list_entry(item) for item in items]
+
+def timed_polls(items, polls: int):
+    times = []
+    for _ in range(polls):
+        started = time.perf_counter()
+        list_page(items)
+        times.append(time.perf_counter() - started)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description="Time building a catalog listing with cached vs. freshly signed URLs")
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--polls', type=int, default=5)
+    args = parser.parse_args()
+
+    # Signing only needs a client, not the rest of startup()
+    DB_stuff.s3_client = aws_client('s3', os.environ['S3_REGION'])
+    DB_stuff.AWS_BUCKET = os.getenv('BUCKET_NAME', 'presign-bench')
+    DB_stuff.PRESIGN_CACHE_SIZE = max(DB_stuff.PRESIGN_CACHE_SIZE, args.items)
+    items = [
+        {'filename': f"{1700000000 + i}_{i:032x}_lecture {i}.mp4", 'original_name': f"lecture {i}.mp4",
+         'tags': ['Tidal', 'Energy'], 'status': 'ready'}
+        for i in range(args.items)
+    ]
+
+    # No cache: every entry is re-signed, as before the cache
+    min_remaining = DB_stuff.PRESIGN_MIN_REMAINING_SECONDS
+    DB_stuff.PRESIGN_MIN_REMAINING_SECONDS = DB_stuff.PRESIGN_EXPIRES_SECONDS + 1
+    uncached = timed_polls(items, args.polls)
+    DB_stuff.PRESIGN_MIN_REMAINING_SECONDS = min_remaining
+
+    # Cached: the first poll fills the cache, later polls reuse the URLs
+    DB_stuff._presign_cache.clear()
+    started = time.perf_counter()
+    list_page(items)
+    cold = time.perf_counter() - started
+    cached = timed_polls(items, args.polls)
+
+    print(f"{args.items} items, {args.polls} polls each")
+    print(f"no cache   : median {statistics.median(uncached) * 1000:8.1f} ms per poll ({statistics.median(uncached) / args.items * 1e6:.1f} us per item)")
+    print(f"cache, cold: {cold * 1000:8.1f} ms (first poll signs every URL)")
+    print(f"cache, warm: median {statistics.median(cached) * 1000:8.1f} ms per poll ({statistics.median(cached) / args.items * 1e6:.1f} us per item)")
+    print(f"speed-up   : {statistics.median(uncached) / statistics.median(cached):.1f}x; cache stats {DB_stuff.presign_cache_stats()}")
+
+if __name__ == "__main__":
+    main()
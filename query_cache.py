@@ -0,0 +1,151 @@
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+try:
+    import redis
+except ImportError:
+    redis = None
+
+def normalize_query(query: str) -> str:
+    """Case-fold, collapse whitespace and drop surrounding punctuation so trivially different queries share an entry"""
+    query = re.sub(r'\s+', ' ', (query or '').casefold()).strip()
+    return query.strip(' .,;:!?"\'')
+
+class QueryCache:
+    """TTL + LRU result cache keyed on (catalog version, normalized query).
+    Every catalog write bumps the version, so entries from before the write are never served again.
+    With a Redis URL the entries and the version counter are shared by all API workers: each version's
+    entries live in one Redis hash (at most max_entries fields) that is deleted when the version moves on.
+    The cache is never allowed to fail a caller: if Redis is unreachable it falls back to the local cache."""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300, redis_url: str = None, prefix: str = 'qcache',
+                 redis_timeout: float = 0.5):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # cache key -> (value, expires_at)
+        self._version = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'redis_errors': 0}
+        self._redis = None
+        if redis_url:
+            if redis is None:
+                print("Query cache: redis package not installed, using local cache only")
+            else:
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=redis_timeout, socket_connect_timeout=redis_timeout)
+
+    @property
+    def shared(self) -> bool:
+        return self._redis is not None
+
+    def _redis_failed(self, operation: str, error):
+        with self._lock:
+            self._stats['redis_errors'] += 1
+        print(f"Query cache: Redis {operation} failed, using local cache: {error}")
+
+    def _entries_key(self, version: int) -> str:
+        return f"{self.prefix}:entries:{version}"
+
+    def version(self) -> int:
+        if self._redis is not None:
+            try:
+                return int(self._redis.get(f"{self.prefix}:version") or 0)
+            except redis.RedisError as e:
+                self._redis_failed('version read', e)
+        return self._version
+
+    def bump_version(self):
+        """Call after any catalog write. The local version always moves too, so local fallback
+        entries never outlive a write."""
+        self._bump_local()
+        if self._redis is not None:
+            try:
+                version = self._redis.incr(f"{self.prefix}:version")
+                # Entries of the previous version can never be read again; drop them now rather than at TTL
+                self._redis.delete(self._entries_key(version - 1))
+            except redis.RedisError as e:
+                self._redis_failed('version bump', e)
+
+    def _bump_local(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def note_remote_change(self):
+        """Another worker changed the catalog; a shared version was already bumped by that worker,
+        but local fallback entries must go either way"""
+        if self._redis is None:
+            self.bump_version()
+        else:
+            self._bump_local()
+
+    def lookup(self, query: str, scope: str = ''):
+        """Return (cache_key, value or None). Pass cache_key to store() so a result computed while the
+        catalog changed is filed under the old version and never served"""
+        field = f"{scope}:{normalize_query(query)}"
+        value = None
+        key = None
+        if self._redis is not None:
+            try:
+                version = int(self._redis.get(f"{self.prefix}:version") or 0)
+                key = ('redis', version, field)
+                raw = self._redis.hget(self._entries_key(version), field)
+                if raw is not None:
+                    entry = json.loads(raw)
+                    if entry['expires_at'] > time.time():
+                        value = entry['value']
+            except redis.RedisError as e:
+                self._redis_failed('lookup', e)
+                key = None
+        if key is None:
+            with self._lock:
+                key = ('local', self._version, field)
+                entry = self._entries.get(key)
+                if entry and entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    value = entry[0]
+                elif entry:
+                    del self._entries[key]
+        with self._lock:
+            self._stats['hits' if value is not None else 'misses'] += 1
+        return key, value
+
+    def store(self, key, value):
+        kind, version, field = key
+        if kind == 'redis':
+            entries_key = self._entries_key(version)
+            try:
+                if self._redis.hlen(entries_key) >= self.max_entries:
+                    with self._lock:
+                        self._stats['evictions'] += 1
+                    return
+                pipe = self._redis.pipeline()
+                pipe.hset(entries_key, field, json.dumps({'value': value, 'expires_at': time.time() + self.ttl_seconds}))
+                # The hash outlives its newest entry by at most the TTL, even if no later bump deletes it
+                pipe.expire(entries_key, int(self.ttl_seconds))
+                pipe.execute()
+            except redis.RedisError as e:
+                self._redis_failed('store', e)
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'size': len(self._entries),
+                'capacity': self.max_entries,
+                'shared': self.shared,
+                'version': self._version if self._redis is None else None,
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0
+            }
@@ -0,0 +1,82 @@
+"""qwen_search pass latency against a local mock of the chat-completions endpoint:
+python qwen_bench.py [--latency 2] [--jitter 0.5] [--queries 5]
+
+The mock answers like a model whose strict and lenient passes find nothing, so the topic pass (or the
+TOPIC tier) decides the result: the worst case for sequential mode. Each mode is timed against
+QWEN_SEARCH_DEADLINE_SECONDS (or --deadline)."""
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import DB_stuff
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    latency = 2.0
+    jitter = 0.5
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][0]['content']
+        time.sleep(max(0, random.gauss(self.latency, self.jitter)))
+        if 'Grade every file' in prompt:
+            reply = "STRICT:\nLENIENT:\nTOPIC: [1] [3]"
+        elif 'topic-matching' in prompt:
+            reply = "[1] [3]"
+        else:
+            reply = "NO_MATCHES"
+        data = json.dumps({
+            'choices': [{'message': {'role': 'assistant', 'content': reply}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(reply) // 4}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def run_mode(mode: str, context: str, deadline_seconds: float):
+    DB_stuff.QWEN_SEARCH_MODE = mode
+    started = time.time()
+    deadline = started + deadline_seconds
+    if mode == 'single':
+        indices = DB_stuff._run_qwen_single_pass(context, "tidal energy", "bench", deadline)
+    else:
+        indices = DB_stuff._run_qwen_passes(context, "tidal energy", "bench", deadline)
+    return time.time() - started, indices
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the sequential, concurrent and single-call qwen_search modes against a mock LLM")
+    parser.add_argument('--latency', type=float, default=2.0, help="mean injected latency per call (s)")
+    parser.add_argument('--jitter', type=float, default=0.5, help="standard deviation of the latency (s)")
+    parser.add_argument('--queries', type=int, default=5)
+    parser.add_argument('--deadline', type=float, default=DB_stuff.QWEN_SEARCH_DEADLINE_SECONDS)
+    args = parser.parse_args()
+
+    MockChatHandler.latency, MockChatHandler.jitter = args.latency, args.jitter
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    DB_stuff.QWEN_API_URL = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    context = "".join(f"[{i}] File: lecture {i}.mp3\n    Tags: Tides, Energy\n\n" for i in range(20))
+
+    print(f"Mock latency {args.latency}s +/- {args.jitter}s, deadline {args.deadline}s, {args.queries} queries per mode")
+    try:
+        for mode in ('sequential', 'concurrent', 'single'):
+            times = []
+            for _ in range(args.queries):
+                seconds, indices = run_mode(mode, context, args.deadline)
+                times.append(seconds)
+            print(f"{mode:10s}: median {statistics.median(times):5.2f}s, max {max(times):5.2f}s "
+                  f"({max(times) / args.latency:.1f} round trips), within deadline {sum(t <= args.deadline for t in times)}/{len(times)}, "
+                  f"result {indices}")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
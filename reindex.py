@@ -0,0 +1,197 @@
+"""Re-tag the existing catalog with the current tag rules: python reindex.py [--segments 8] [--checkpoint reindex.json]
+
+Streams MediaTags with parallel segmented scans, rebuilds each item's tags from its stored transcript and
+the enrichment cache (no AI calls unless --allow-api), and writes only changed items back, rate limited.
+Progress is checkpointed per segment so an interrupted run resumes where it stopped."""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Attr
+import DB_stuff
+from DB_stuff import startup, recompute_tags, now_ms, feed_shard, query_cache
+
+PROJECTION = '#fn, original_name, tags, transcript, transcript_key, visual_labels, content_hash, updated_at, #st'
+
+class RateLimiter:
+    """Token bucket shared by all segment threads"""
+
+    def __init__(self, per_second: float):
+        self.per_second = per_second
+        self._tokens = per_second
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.per_second, self._tokens + (now - self._last) * self.per_second)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.per_second
+            time.sleep(wait)
+
+class Checkpoint:
+    """Per-segment scan position and counters in a JSON file, rewritten atomically after every page"""
+
+    def __init__(self, path: str, total_segments: int):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {'total_segments': total_segments, 'segments': {}}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get('total_segments') != total_segments:
+                raise SystemExit(f"Checkpoint {path} was written with {state.get('total_segments')} segments; pass --segments {state.get('total_segments')}")
+            self.state = state
+
+    def segment(self, segment: int):
+        """A copy of one segment's state; change it through advance()"""
+        with self._lock:
+            state = self.state['segments'].setdefault(str(segment), {'last_key': None, 'done': False, 'scanned': 0, 'updated': 0, 'skipped': 0})
+            return dict(state)
+
+    def advance(self, segment: int, counts: dict, last_key):
+        """Record a finished page of a segment and save. State only changes under the lock, so a save
+        from another segment thread never serializes a dict while it is being mutated."""
+        with self._lock:
+            state = self.state['segments'][str(segment)]
+            for name, count in counts.items():
+                state[name] += count
+            state['last_key'] = last_key
+            state['done'] = last_key is None
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    def totals(self):
+        with self._lock:
+            segments = list(self.state['segments'].values())
+            return {name: sum(s[name] for s in segments) for name in ('scanned', 'updated', 'skipped')}
+
+def write_tags(item, tags, limiter: RateLimiter, dry_run: bool):
+    """Update one item's tags unless it changed (or was deleted) since it was scanned"""
+    if dry_run:
+        return True
+    limiter.acquire()
+    seen = item.get('updated_at')
+    condition = Attr('deleted').not_exists() & (Attr('updated_at').eq(seen) if seen is not None else Attr('updated_at').not_exists())
+    try:
+        DB_stuff.dynamodb.update_item(
+            Key={'filename': item['filename']},
+            UpdateExpression='SET tags = :tags, updated_at = :now, feed_shard = :shard',
+            ConditionExpression=condition,
+            ExpressionAttributeValues={':tags': tags, ':now': now_ms(), ':shard': feed_shard(item['filename'])}
+        )
+        return True
+    except DB_stuff.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+def run_segment(segment: int, args, checkpoint: Checkpoint, limiter: RateLimiter, writers: ThreadPoolExecutor):
+    state = checkpoint.segment(segment)
+    if state['done']:
+        return
+    scan_kwargs = {
+        'Segment': segment,
+        'TotalSegments': args.segments,
+        'ProjectionExpression': PROJECTION,
+        'ExpressionAttributeNames': {'#fn': 'filename', '#st': 'status'},
+        'FilterExpression': Attr('deleted').not_exists(),
+        'Limit': args.page_size
+    }
+    while True:
+        if state['last_key']:
+            scan_kwargs['ExclusiveStartKey'] = state['last_key']
+        response = DB_stuff.dynamodb.scan(**scan_kwargs)
+        page = {'scanned': 0, 'updated': 0, 'skipped': 0}
+        changes = []
+        for item in response.get('Items', []):
+            page['scanned'] += 1
+            if item.get('status', 'ready') != 'ready':
+                # Still being enriched; its tags will be computed with the current rules anyway
+                page['skipped'] += 1
+                continue
+            try:
+                tags = recompute_tags(item, allow_api=args.allow_api)
+            except Exception as e:
+                # A failed transcript read or Comprehend call skips the item; the next run retries it
+                print(f"Could not recompute tags for {item['filename']}: {e}")
+                tags = None
+            if tags is None:
+                page['skipped'] += 1
+            elif tags != list(item.get('tags', [])):
+                changes.append((item, tags))
+        # The page's writes finish before its position is checkpointed, so a resume never loses one
+        for written in writers.map(lambda change: write_tags(change[0], change[1], limiter, args.dry_run), changes):
+            page['updated' if written else 'skipped'] += 1
+        state['last_key'] = response.get('LastEvaluatedKey')
+        checkpoint.advance(segment, page, state['last_key'])
+        if state['last_key'] is None:
+            return
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute tags for the whole catalog with the current post-processing rules")
+    parser.add_argument('--segments', type=int, default=8, help="parallel scan segments")
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--max-writes-per-second', type=float, default=200)
+    parser.add_argument('--write-threads', type=int, default=16)
+    parser.add_argument('--checkpoint', default='reindex_checkpoint.json', help="resume file ('' to disable)")
+    parser.add_argument('--allow-api', action='store_true', help="call Comprehend for transcripts with no cached key phrases")
+    parser.add_argument('--dry-run', action='store_true', help="count changes without writing")
+    args = parser.parse_args()
+
+    startup()
+    checkpoint = Checkpoint(args.checkpoint, args.segments)
+    limiter = RateLimiter(args.max_writes_per_second)
+    started = time.time()
+    resumed = checkpoint.totals()
+    finished = threading.Event()
+
+    def report():
+        while not finished.wait(10):
+            totals = checkpoint.totals()
+            elapsed = time.time() - started
+            print(f"[REINDEX] scanned {totals['scanned']} ({(totals['scanned'] - resumed['scanned']) / elapsed:.0f} items/s), "
+                  f"updated {totals['updated']}, skipped {totals['skipped']}")
+    threading.Thread(target=report, daemon=True).start()
+
+    with ThreadPoolExecutor(max_workers=args.write_threads, thread_name_prefix="reindex-write") as writers:
+        with ThreadPoolExecutor(max_workers=args.segments, thread_name_prefix="reindex-scan") as scanners:
+            futures = [scanners.submit(run_segment, segment, args, checkpoint, limiter, writers) for segment in range(args.segments)]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+    finished.set()
+
+    totals = checkpoint.totals()
+    elapsed = time.time() - started
+    print(f"[REINDEX] Done in {elapsed:.1f}s: scanned {totals['scanned']}, updated {totals['updated']}, skipped {totals['skipped']} "
+          f"({(totals['scanned'] - resumed['scanned']) / elapsed:.0f} items/s)")
+    if totals['updated'] and not args.dry_run:
+        query_cache.bump_version()
+    if errors:
+        for e in errors:
+            print(f"[REINDEX] Segment failed (re-run to resume): {e}")
+        return 1
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
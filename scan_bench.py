@@ -0,0 +1,28 @@
+"""Time a full MediaTags scan at different segment counts: python scan_bench.py [--segments 1 2 4 8 16]
+
+Point it at DynamoDB Local (AWS_ENDPOINT_URL_DYNAMODB=http://localhost:8000) or a test table; it only reads."""
+import argparse
+import time
+
+import DB_stuff
+from DB_stuff import startup
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-table scan time versus parallel scan segment count")
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--projection', default='#fn, original_name, tags')
+    args = parser.parse_args()
+
+    startup()
+    for segments in args.segments:
+        started = time.time()
+        count = sum(1 for _ in DB_stuff._scan_items(
+            segments,
+            ProjectionExpression=args.projection,
+            ExpressionAttributeNames={'#fn': 'filename'}
+        ))
+        seconds = time.time() - started
+        print(f"segments={segments:3d}: {count} items in {seconds:.2f}s ({count / seconds:.0f} items/s)")
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,8 @@ document.addEventListener('DOMContentLoaded', () => {
   // Auto-run logic based on page
   if(document.getElementById('savedList')) {
     refreshSavedList();
-    // Auto-refresh saved list every 30 seconds to pick up new tags
-    setInterval(refreshSavedList, 30000);
+    // Every 30 seconds fetch only what changed (new tags, uploads, deletes)
+    setInterval(syncSavedList, 30000);
   }
   if(document.getElementById('uploadForm')) setupUpload();
   
@@ -54,10 +54,6 @@ function setupUpload() {
     for(const file of files) {
       const fd = new FormData();
       fd.append('file', file);
-      
-      // Auto-detect extension (pdf, mp3, etc)
-      const ext = file.name.split('.').pop().toLowerCase();
-      fd.append('type', ext);
 
       try {
         const resp = await fetch(API_BASE + '/add_doc', { method: 'POST', body: fd });
@@ -75,6 +71,10 @@ function setupUpload() {
 }
 
 // 3. Saved Files Logic (The Viewer)
+// Local copy of the catalog (key -> file) kept current by delta syncs
+let savedFiles = new Map();
+let savedSyncToken = null;
+
 async function refreshSavedList() {
   const ul = document.getElementById('savedList');
   if (!ul) return;
@@ -82,8 +82,54 @@ async function refreshSavedList() {
   ul.innerHTML = '<li style="color:white">Loading files...</li>';
 
   try {
-    const resp = await fetch(API_BASE + '/list_docs');
-    const files = await resp.json();
+    // Walk the paginated listing until the server stops returning a cursor
+    let files = [];
+    let cursor = null;
+    let syncToken = null;
+    do {
+      let url = API_BASE + '/list_docs?limit=200';
+      if (cursor) url += '&cursor=' + encodeURIComponent(cursor);
+      const resp = await fetch(url);
+      if (!resp.ok) throw new Error('list_docs failed: HTTP ' + resp.status);
+      const page = await resp.json();
+      files = files.concat(page.files || []);
+      if (syncToken === null) syncToken = page.sync_token;
+      cursor = page.next_cursor;
+    } while (cursor);
+
+    savedFiles = new Map(files.map(f => [f.key, f]));
+    savedSyncToken = syncToken;
+    renderSavedList();
+  } catch (err) {
+    console.error(err);
+    ul.innerHTML = `<li style="color:red">Error loading list. Is server running?</li>`;
+  }
+}
+
+// Apply only the adds/updates/deletes since the last sync
+async function syncSavedList() {
+  if (!savedSyncToken) return refreshSavedList();
+
+  try {
+    const resp = await fetch(API_BASE + '/list_changes?since=' + encodeURIComponent(savedSyncToken));
+    const delta = await resp.json();
+    if (delta.full_resync) return refreshSavedList();
+
+    delta.changed.forEach(f => savedFiles.set(f.key, f));
+    delta.deleted.forEach(key => savedFiles.delete(key));
+    savedSyncToken = delta.next_token;
+    if (delta.changed.length > 0 || delta.deleted.length > 0) renderSavedList();
+  } catch (err) {
+    console.error('Sync error', err);
+  }
+}
+
+function renderSavedList() {
+  const ul = document.getElementById('savedList');
+  if (!ul) return;
+
+  try {
+    const files = Array.from(savedFiles.values());
     ul.innerHTML = ''; 
 
     if (files.length === 0) {
@@ -109,6 +155,12 @@ async function refreshSavedList() {
       if (f.tags && f.tags.length > 0) {
           meta.style.color = '#4ea8ff'; // Blue
           meta.textContent = "Tags: " + f.tags.join(', ');
+      } else if (f.status === 'pending') {
+          meta.style.color = '#ffaa00'; // Orange for "processing"
+          meta.textContent = "⏳ Analyzing file...";
+      } else if (f.status === 'failed') {
+          meta.style.color = '#ff4444';
+          meta.textContent = "Tagging failed";
       } else {
           // Check if file is audio/video (likely being processed)
           const isAudioOrVideo = /\.(mp3|wav|mp4|mov|avi|mkv|aac)$/i.test(f.name);
@@ -170,6 +222,7 @@ async function refreshSavedList() {
           });
           const j = await resp.json();
           if(j && j.success || resp.ok){ // Handle flexible success response
+            savedFiles.delete(f.key);
             li.remove();
           } else {
             alert('Failed to remove file.');
@@ -188,9 +241,13 @@ async function refreshSavedList() {
       ul.appendChild(li);
     });
 
+    // Keep the quick-search filter applied across re-renders
+    const quickSearchInput = document.getElementById('quickSearchInput');
+    if (quickSearchInput && quickSearchInput.value) filterSavedList(quickSearchInput.value);
+
   } catch (err) {
     console.error(err);
-    ul.innerHTML = `<li style="color:red">Error loading list. Is server running?</li>`;
+    ul.innerHTML = `<li style="color:red">Error rendering list.</li>`;
   }
 }
 
@@ -337,19 +394,13 @@ async function refreshSearchResults(query) {
 // 5. Transcript Viewer Modal
 async function showTranscriptModal(key, fileName) {
   try {
-    // Fetch transcript from backend
-    const resp = await fetch(API_BASE + '/get_transcript', {
-      method: 'POST',
-      headers: {'Content-Type': 'application/json'},
-      body: JSON.stringify({ key: key })
-    });
-    
-    const data = await resp.json();
-    
-    if (!data.success) {
-      alert('Error loading transcript: ' + (data.error || 'Unknown error'));
+    // Stream the transcript as plain text (the browser inflates the stored gzip)
+    const resp = await fetch(API_BASE + '/transcript?key=' + encodeURIComponent(key));
+    if (!resp.ok) {
+      alert('Error loading transcript: ' + (resp.status === 404 ? 'File not found' : 'HTTP ' + resp.status));
       return;
     }
+    const transcript = await resp.text();
     
     // Create modal
     const modal = document.createElement('div');
@@ -384,26 +435,18 @@ async function showTranscriptModal(key, fileName) {
     
     // Transcript text
     const transcriptDiv = document.createElement('div');
-    if (data.transcript !== null && data.transcript !== undefined) {
-      // Transcript field exists (transcription completed)
-      if (data.transcript.length > 0) {
-        transcriptDiv.textContent = data.transcript;
-        transcriptDiv.style.lineHeight = '1.6';
-        transcriptDiv.style.whiteSpace = 'pre-wrap';
-        transcriptDiv.style.wordWrap = 'break-word';
-      } else {
-        // Transcription completed but result is empty
-        transcriptDiv.textContent = 'No transcript content available.';
-        transcriptDiv.style.color = '#aaa';
-        transcriptDiv.style.fontStyle = 'italic';
-      }
+    if (transcript.length > 0) {
+      transcriptDiv.textContent = transcript;
+      transcriptDiv.style.lineHeight = '1.6';
+      transcriptDiv.style.whiteSpace = 'pre-wrap';
+      transcriptDiv.style.wordWrap = 'break-word';
     } else {
-      // Transcription still in progress
-      const isVideo = /\.(mp4|mov|avi|mkv)$/i.test(fileName);
-      transcriptDiv.textContent = isVideo 
-        ? '⏳ Video audio is being transcribed. This typically takes 5-15 minutes. Please check back later.'
-        : '⏳ Audio is being transcribed. This typically takes 5-15 minutes. Please check back later.';
-      transcriptDiv.style.color = '#ffaa00';
+      // No transcript yet: still being transcribed, or nothing to transcribe
+      const isMedia = /\.(mp3|wav|m4a|flac|ogg|mp4|mov|avi|mkv)$/i.test(fileName);
+      transcriptDiv.textContent = isMedia
+        ? '⏳ No transcript yet. Audio and video typically take 5-15 minutes to transcribe. Please check back later.'
+        : 'No transcript content available.';
+      transcriptDiv.style.color = isMedia ? '#ffaa00' : '#aaa';
       transcriptDiv.style.fontStyle = 'italic';
     }
     modalContent.appendChild(transcriptDiv);
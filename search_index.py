@@ -0,0 +1,123 @@
+import re
+import math
+import bisect
+import threading
+from collections import Counter
+
+# Matches in the file name count more than tags, which count more than transcript words
+FIELD_WEIGHTS = {'name': 3.0, 'tags': 2.0, 'transcript': 1.0}
+MAX_PREFIX_EXPANSIONS = 64
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str):
+    """Case-folded alphanumeric tokens"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.casefold())
+
+class SearchIndex:
+    """In-memory inverted index over file names, tags and transcripts with BM25 ranking"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._docs = {}        # key -> {'name', 'tags', 'terms': Counter, 'length'}
+        self._postings = {}    # term -> {key: weighted term frequency}
+        self._vocab = []       # sorted terms, for prefix lookups
+        self._total_length = 0.0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    def add(self, key: str, name: str, tags, transcript: str = ''):
+        """Index (or re-index) one catalog item"""
+        terms = Counter()
+        for token in tokenize(name):
+            terms[token] += FIELD_WEIGHTS['name']
+        for token in tokenize(' '.join(tags or [])):
+            terms[token] += FIELD_WEIGHTS['tags']
+        for token in tokenize(transcript):
+            terms[token] += FIELD_WEIGHTS['transcript']
+
+        with self._lock:
+            self._remove(key)
+            length = sum(terms.values())
+            self._docs[key] = {'name': name, 'tags': list(tags or []), 'terms': terms, 'length': length}
+            self._total_length += length
+            for term, tf in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._vocab, term)
+                postings[key] = tf
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        self._total_length -= doc['length']
+        for term in doc['terms']:
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect.bisect_left(self._vocab, term)
+                if i < len(self._vocab) and self._vocab[i] == term:
+                    del self._vocab[i]
+
+    def _expand(self, token):
+        """Exact term plus vocabulary terms that start with it"""
+        i = bisect.bisect_left(self._vocab, token)
+        expanded = []
+        while i < len(self._vocab) and self._vocab[i].startswith(token) and len(expanded) < MAX_PREFIX_EXPANSIONS:
+            expanded.append(self._vocab[i])
+            i += 1
+        return expanded
+
+    def search(self, query: str, limit: int = 50):
+        """Return [(key, score, doc_info)] for items matching every query token (prefix-aware), best first"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs
+
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    # Completions of a partially typed word rank below exact hits
+                    if term != token:
+                        idf *= 0.5
+                    for key, tf in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._docs[key]['length'] / avg_length)
+                        score = idf * tf * (self.k1 + 1) / (tf + norm)
+                        if score > token_scores.get(key, 0.0):
+                            token_scores[key] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {key: scores[key] + s for key, s in token_scores.items() if key in scores}
+                if not scores:
+                    return []
+
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+            return [
+                (key, score, {'name': self._docs[key]['name'], 'tags': self._docs[key]['tags']})
+                for key, score in ranked
+            ]
@@ -0,0 +1,62 @@
+"""Cold-start time of the API process: python startup_bench.py [--runs 5] [--top 15]
+
+Each run is a fresh interpreter that imports api (as uvicorn would) and then builds the AWS clients
+the lifespan hook builds, so the numbers include everything before the first request is served.
+Client construction is local (no AWS calls) apart from the content index table check."""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import api
+imported = time.perf_counter()
+import DB_stuff
+DB_stuff.startup()
+ready = time.perf_counter()
+print(json.dumps({'import': imported - started, 'clients': ready - imported}))
+"""
+
+def run_once(env):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 2:
+            modules[name.strip()] = int(cumulative) / 1e6
+    return timings, modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and client-construction time for a fresh API process")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('S3_REGION', 'us-east-1')
+    env.setdefault('AWS_DEFAULT_REGION', env['S3_REGION'])
+    runs = [run_once(env) for _ in range(args.runs)]
+    for phase in ('import', 'clients'):
+        values = [timings[phase] for timings, _ in runs]
+        print(f"{phase:8s} median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s")
+    total = [timings['import'] + timings['clients'] for timings, _ in runs]
+    print(f"{'total':8s} median {statistics.median(total):.3f}s")
+
+    # Modules up to two levels below the probe (api, its imports and theirs); each is counted where first imported
+    _, modules = runs[-1]
+    print("\nSlowest imports (last run):")
+    for name, seconds in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import re
+import html
+import math
+import bisect
+import threading
+from array import array
+
+# ASCII alphanumeric runs, matched on the original text so token spans index straight into it
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+_PHRASE_RE = re.compile(r'"([^"]+)"|(\S+)')
+
+def _tokens(text: str):
+    return [match.group().lower() for match in _TOKEN_RE.finditer(text or '')]
+
+SNIPPET_BEFORE_CHARS = 60
+SNIPPET_AFTER_CHARS = 100
+MAX_SNIPPETS = 3
+
+def parse_query(query: str):
+    """Query -> list of phrases (token lists): quoted text is one phrase, every other word its own"""
+    phrases = []
+    for quoted, word in _PHRASE_RE.findall(query or ''):
+        tokens = _tokens(quoted or word)
+        if tokens:
+            phrases.append(tokens)
+    return phrases
+
+def align_word_times(text: str, timed_words):
+    """Per-token (start_ms, end_ms) lists for text's tokens, from [(word, start_seconds, end_seconds)] as
+    Transcribe reports them. Tokens that can't be matched to a timed word get -1; None if nothing is timed."""
+    timed = []
+    for word, start, end in timed_words:
+        for token in _tokens(word):
+            timed.append((token, int(start * 1000), int(end * 1000)))
+    if not timed:
+        return None
+    starts, ends = [], []
+    j = 0
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group().lower()
+        # Both sides come from the same words, so a short look-ahead absorbs the odd mismatch
+        for k in range(j, min(j + 5, len(timed))):
+            if timed[k][0] == token:
+                starts.append(timed[k][1])
+                ends.append(timed[k][2])
+                j = k + 1
+                break
+        else:
+            starts.append(-1)
+            ends.append(-1)
+    return {'start_ms': starts, 'end_ms': ends}
+
+class TranscriptIndex:
+    """Positional inverted index over transcripts for phrase search with snippets. Each document keeps its
+    text, the character span of every token and, for audio/video, each token's time offsets, so a match
+    turns into a highlighted snippet and a seek position without re-reading anything."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._docs = {}        # key -> {'name', 'text', 'spans': array (start, end) pairs, 'starts', 'ends', 'length'}
+        self._postings = {}    # term -> {key: array of token positions}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, key: str, name: str, text: str, word_times=None):
+        """Index (or re-index) one transcript; word_times is align_word_times() output or None"""
+        spans = array('I')
+        positions = {}
+        for position, match in enumerate(_TOKEN_RE.finditer(text or '')):
+            spans.append(match.start())
+            spans.append(match.end())
+            positions.setdefault(match.group().lower(), array('I')).append(position)
+        n_tokens = len(spans) // 2
+        starts = ends = None
+        if word_times and len(word_times.get('start_ms', [])) == n_tokens:
+            starts, ends = array('i', word_times['start_ms']), array('i', word_times['end_ms'])
+
+        with self._lock:
+            self._remove(key)
+            if not n_tokens:
+                return
+            self._docs[key] = {'name': name, 'text': text, 'spans': spans, 'starts': starts, 'ends': ends,
+                               'terms': list(positions), 'length': n_tokens}
+            self._total_length += n_tokens
+            for term, term_positions in positions.items():
+                self._postings.setdefault(term, {})[key] = term_positions
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        self._total_length -= doc['length']
+        for term in doc['terms']:
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+
+    def _phrase_positions(self, key, phrase):
+        """Start positions of phrase in one document. Walks the phrase word with the fewest occurrences
+        and binary-searches the others' (sorted) positions, so common words stay cheap."""
+        lists = [self._postings[term][key] for term in phrase]
+        if len(phrase) == 1:
+            return list(lists[0])
+        anchor = min(range(len(phrase)), key=lambda i: len(lists[i]))
+        starts = []
+        for p in lists[anchor]:
+            start = p - anchor
+            if start < 0:
+                continue
+            for i, positions in enumerate(lists):
+                if i == anchor:
+                    continue
+                j = bisect.bisect_left(positions, start + i)
+                if j == len(positions) or positions[j] != start + i:
+                    break
+            else:
+                starts.append(start)
+        return starts
+
+    def search(self, query: str, limit: int = 20):
+        """[{key, name, score, matches: [{snippet, char_start, char_end, start_ms, end_ms}]}], best first.
+        Every phrase must occur; snippets are HTML-escaped with matches wrapped in <mark>."""
+        phrases = parse_query(query)
+        if not phrases:
+            return []
+        with self._lock:
+            n_docs = len(self._docs)
+            if any(term not in self._postings for phrase in phrases for term in phrase):
+                return []
+            # Candidates hold every term; start from the rarest term's postings
+            terms = sorted({term for phrase in phrases for term in phrase}, key=lambda t: len(self._postings[t]))
+            candidates = set(self._postings[terms[0]])
+            for term in terms[1:]:
+                candidates &= self._postings[term].keys()
+                if not candidates:
+                    return []
+
+            avg_length = self._total_length / n_docs
+            scored = []
+            for key in candidates:
+                length = self._docs[key]['length']
+                score = 0.0
+                hits = []
+                for phrase in phrases:
+                    starts = self._phrase_positions(key, phrase)
+                    if not starts:
+                        break
+                    # BM25 with the phrase as the term: idf from its rarest word, tf = phrase occurrences
+                    df = min(len(self._postings[term]) for term in phrase)
+                    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * len(phrase)
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    score += idf * len(starts) * (self.k1 + 1) / (len(starts) + norm)
+                    hits.extend((start, start + len(phrase) - 1) for start in starts)
+                else:
+                    scored.append((score, key, sorted(hits)))
+
+            scored.sort(key=lambda entry: entry[0], reverse=True)
+            return [
+                {'key': key, 'name': self._docs[key]['name'], 'score': score, 'match_count': len(hits),
+                 'matches': self._snippets(self._docs[key], hits)}
+                for score, key, hits in scored[:limit]
+            ]
+
+    def _snippets(self, doc, hits):
+        text, spans, starts, ends = doc['text'], doc['spans'], doc['starts'], doc['ends']
+        matches = []
+        used_until = -1
+        for first, last in hits:
+            char_start, char_end = spans[2 * first], spans[2 * last + 1]
+            if char_start < used_until:
+                continue  # already shown in the previous snippet
+            window_start = max(0, char_start - SNIPPET_BEFORE_CHARS)
+            window_end = min(len(text), char_end + SNIPPET_AFTER_CHARS)
+            # Widen to word boundaries
+            while window_start > 0 and not text[window_start - 1].isspace():
+                window_start -= 1
+            while window_end < len(text) and not text[window_end].isspace():
+                window_end += 1
+            # Highlight every hit that falls inside the window
+            parts, cursor = [], window_start
+            for f, l in hits:
+                s, e = spans[2 * f], spans[2 * l + 1]
+                if s >= window_start and e <= window_end and s >= cursor:
+                    parts.append(html.escape(text[cursor:s]))
+                    parts.append(f"<mark>{html.escape(text[s:e])}</mark>")
+                    cursor = e
+            parts.append(html.escape(text[cursor:window_end]))
+            snippet = ('…' if window_start > 0 else '') + ''.join(parts).strip() + ('…' if window_end < len(text) else '')
+            match = {'snippet': snippet, 'char_start': char_start, 'char_end': char_end}
+            if starts is not None:
+                known = [starts[p] for p in range(first, last + 1) if starts[p] >= 0]
+                known_ends = [ends[p] for p in range(first, last + 1) if ends[p] >= 0]
+                match['start_ms'] = known[0] if known else None
+                match['end_ms'] = known_ends[-1] if known_ends else None
+            matches.append(match)
+            used_until = window_end
+            if len(matches) >= MAX_SNIPPETS:
+                break
+        return matches
+
+if __name__ == "__main__":
+    # Query latency over a synthetic corpus: python transcript_index.py [--hours 200]
+    import time
+    import random
+    import argparse
+    parser = argparse.ArgumentParser(description="Phrase query latency over generated transcripts")
+    parser.add_argument('--hours', type=int, default=200, help="hours of speech to index (~9000 words per hour)")
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vocab = [f"w{i}" for i in range(20000)] + "tidal currents estuary salinity sediment transport wave energy".split()
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]  # Zipf-like, as in real speech
+    index = TranscriptIndex()
+    started = time.time()
+    for hour in range(args.hours):
+        words = rng.choices(vocab, weights, k=9000)
+        seconds = [i * 0.4 for i in range(len(words))]
+        text = ' '.join(words)
+        index.add(f"doc{hour}", f"lecture {hour}.mp3", text, {'start_ms': [int(s * 1000) for s in seconds],
+                                                              'end_ms': [int(s * 1000) + 350 for s in seconds]})
+    print(f"Indexed {args.hours} hours in {time.time() - started:.1f}s")
+
+    queries = []
+    for _ in range(args.queries):
+        doc = index._docs[f"doc{rng.randrange(args.hours)}"]
+        start = rng.randrange(doc['length'] - 3)
+        queries.append('"' + doc['text'][doc['spans'][2 * start]:doc['spans'][2 * (start + 2) + 1]] + '"')
+    queries += ['tidal', 'sediment transport', '"wave energy"']
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(f"{len(queries)} queries: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
@@ -0,0 +1,115 @@
+"""Peak memory and wall time of one large upload: python upload_bench.py [--size-mb 512] [--moto]
+
+Compares the streaming path (DB_stuff.upload_fileobj: managed multipart transfer) with the old one
+(whole request body read into memory, written to temp/, read back and sent with a single put_object).
+Each measurement is a fresh interpreter, so peak RSS is per path. Point it at a local S3 stand-in
+(AWS_ENDPOINT_URL_S3=http://localhost:9000 for MinIO, plus AWS_ENDPOINT_URL_DYNAMODB for DynamoDB Local)
+with the bucket and MediaTags table created, or pass --moto to run against in-process moto mocks.
+With --moto the mock keeps stored objects in the benchmark process too, so compare the two paths
+rather than reading the absolute numbers."""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+MODES = ('buffered', 'streaming')
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+def _start_moto():
+    from moto import mock_aws
+    import boto3
+    mock_aws().start()
+    region = os.environ['S3_REGION']
+    boto3.client('s3', region_name=region).create_bucket(Bucket=os.environ['BUCKET_NAME'])
+    boto3.resource('dynamodb', region_name=region).create_table(
+        TableName='MediaTags',
+        KeySchema=[{'AttributeName': 'filename', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'filename', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+def run_child(mode: str, path: str, moto: bool):
+    if moto:
+        _start_moto()
+    import DB_stuff
+    DB_stuff.startup()
+    # Enrichment isn't part of the upload; keep the worker from reading the object back
+    DB_stuff.enrich_item = lambda payload: None
+    baseline = _peak_rss_mb()
+    started = time.time()
+    if mode == 'streaming':
+        with open(path, 'rb') as f:
+            DB_stuff.upload_fileobj(f, 'bench.bin')
+    else:
+        # What /add_doc and upload_file did before: await file.read(), save to temp/, read back, put_object
+        with open(path, 'rb') as f:
+            body = f.read()
+        save_path = os.path.join(tempfile.gettempdir(), 'upload_bench_copy.bin')
+        with open(save_path, 'wb') as f:
+            f.write(body)
+        with open(save_path, 'rb') as f:
+            contents = f.read()
+        DB_stuff.s3_client.put_object(Bucket=DB_stuff.AWS_BUCKET, Key=DB_stuff.make_key('bench.bin'),
+                                      Body=contents, ContentType='application/octet-stream')
+        os.remove(save_path)
+        del body, contents
+    seconds = time.time() - started
+    print(json.dumps({'seconds': seconds, 'baseline_rss_mb': baseline, 'peak_rss_mb': _peak_rss_mb()}))
+
+def run_once(mode: str, path: str, moto: bool, env):
+    args = [sys.executable, os.path.abspath(__file__), '--child', mode, path] + (['--moto'] if moto else [])
+    result = subprocess.run(args, capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise SystemExit(f"{mode} run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS and wall time: streaming multipart upload vs. whole-file put_object")
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--moto', action='store_true', help="use in-process moto mocks instead of an S3 endpoint")
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child[0], args.child[1], args.moto)
+
+    env = dict(os.environ)
+    env.setdefault('S3_REGION', 'us-east-1')
+    env.setdefault('AWS_DEFAULT_REGION', env['S3_REGION'])
+    scratch = tempfile.mkdtemp(prefix='upload_bench_')
+    # Queue and cache files of the child processes stay out of the working directory
+    env.update(INGEST_DB_PATH=os.path.join(scratch, 'ingest.db'), JOBS_DB_PATH=os.path.join(scratch, 'jobs.db'),
+               ENRICHMENT_CACHE_PATH='')
+    if args.moto:
+        env.setdefault('BUCKET_NAME', 'upload-bench')
+        env.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+        env.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+
+    path = os.path.join(scratch, 'bench.bin')
+    with open(path, 'wb') as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+    try:
+        print(f"{args.size_mb} MB file, part size {os.getenv('UPLOAD_PART_SIZE_MB', '8')} MB, "
+              f"concurrency {os.getenv('UPLOAD_MAX_CONCURRENCY', '4')}")
+        for mode in MODES:
+            for _ in range(args.runs):
+                r = run_once(mode, path, args.moto, env)
+                print(f"{mode:9s}: {r['seconds']:6.2f}s ({args.size_mb / r['seconds']:6.1f} MB/s), "
+                      f"peak RSS {r['peak_rss_mb']:7.1f} MB (+{r['peak_rss_mb'] - r['baseline_rss_mb']:.1f} MB over start-up)")
+    finally:
+        for name in os.listdir(scratch):
+            os.remove(os.path.join(scratch, name))
+        os.rmdir(scratch)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import os
+import json
+import math
+import zlib
+import threading
+from array import array
+import numpy as np
+
+from search_index import tokenize
+
+CHUNK_CHARS = 1000
+CHUNK_OVERLAP = 150
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP):
+    """Split text into overlapping (start, end) spans that end on whitespace where possible"""
+    spans = []
+    if not text or not text.strip():
+        return spans
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(start + size, n)
+        if end < n:
+            cut = text.rfind(' ', start + size // 2, end)
+            if cut > start:
+                end = cut
+        spans.append((start, end))
+        if end >= n:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+class HashingEmbedder:
+    """Deterministic local embedding: hashed unigrams + bigrams, L2-normalized. No network, for offline use/tests"""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [a + ' ' + b for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode('utf-8'))
+                out[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+            # Sublinear term frequency so long chunks aren't dominated by repeated words
+            out[row] = np.sign(out[row]) * np.log1p(np.abs(out[row]))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+class BedrockEmbedder:
+    """Amazon Titan text embeddings through Bedrock"""
+
+    def __init__(self, model_id: str = None, dim: int = 512):
+        from clients import aws_client
+        self.model_id = model_id or os.getenv("EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v2:0")
+        self.dim = dim
+        self._client = aws_client('bedrock-runtime')
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            response = self._client.invoke_model(
+                modelId=self.model_id,
+                body=json.dumps({'inputText': text[:8000], 'dimensions': self.dim, 'normalize': True})
+            )
+            out[row] = json.loads(response['body'].read())['embedding']
+        return out
+
+EMBEDDERS = {
+    'hashing': HashingEmbedder,
+    'bedrock': BedrockEmbedder,
+}
+
+def get_embedder(name: str):
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    return EMBEDDERS[name]()
+
+class VectorIndex:
+    """Exact (brute-force) cosine search over chunk vectors; each row belongs to a catalog key"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._n = 0
+        self._row_key = []
+        self._row_span = []
+        self._rows_by_key = {}
+        self._fingerprints = {}
+        self._dead = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._rows_by_key)
+
+    def fingerprint(self, key: str):
+        return self._fingerprints.get(key)
+
+    def keys(self):
+        with self._lock:
+            return list(self._rows_by_key)
+
+    def add(self, key: str, vectors, spans, fingerprint: str = None):
+        """Replace all chunk vectors for key"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._remove(key)
+            needed = self._n + len(vectors)
+            if needed > len(self._vectors):
+                capacity = max(needed, 2 * len(self._vectors))
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[:self._n] = self._vectors[:self._n]
+                alive = np.zeros(capacity, dtype=bool)
+                alive[:self._n] = self._alive[:self._n]
+                self._vectors, self._alive = grown, alive
+            rows = list(range(self._n, needed))
+            self._vectors[self._n:needed] = vectors
+            self._alive[self._n:needed] = True
+            self._row_key.extend([key] * len(rows))
+            self._row_span.extend(tuple(span) for span in spans)
+            self._n = needed
+            self._rows_by_key[key] = rows
+            self._fingerprints[key] = fingerprint
+            self._on_rows_added(rows)
+            self.dirty = True
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove(key)
+            # Reclaim space once most rows are tombstoned
+            if self._dead > 1024 and self._dead > self._n // 2:
+                self._compact()
+
+    def _remove(self, key):
+        rows = self._rows_by_key.pop(key, None)
+        self._fingerprints.pop(key, None)
+        if rows:
+            self._alive[rows] = False
+            self._dead += len(rows)
+            self.dirty = True
+
+    def _compact(self):
+        keep = np.nonzero(self._alive[:self._n])[0]
+        self._vectors[:len(keep)] = self._vectors[keep]
+        self._alive[:] = False
+        self._alive[:len(keep)] = True
+        self._row_key = [self._row_key[i] for i in keep]
+        self._row_span = [self._row_span[i] for i in keep]
+        self._n = len(keep)
+        self._dead = 0
+        self._rows_by_key = {}
+        for row, key in enumerate(self._row_key):
+            self._rows_by_key.setdefault(key, []).append(row)
+        self._on_compacted()
+
+    def _on_rows_added(self, rows):
+        pass
+
+    def _on_compacted(self):
+        pass
+
+    def _candidate_rows(self, query):
+        return np.nonzero(self._alive[:self._n])[0]
+
+    def search(self, query, k: int = 20):
+        """Return up to k (key, score, span) tuples, best-scoring chunk per key, highest first"""
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            rows = self._candidate_rows(query)
+            if len(rows) == 0:
+                return []
+            scores = self._vectors[rows] @ query
+            # Over-fetch rows since several chunks can belong to the same key
+            take = min(len(rows), k * 8)
+            top = np.argpartition(-scores, take - 1)[:take]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            seen = set()
+            for i in top:
+                row = rows[i]
+                key = self._row_key[row]
+                if key in seen:
+                    continue
+                seen.add(key)
+                results.append((key, float(scores[i]), self._row_span[row]))
+                if len(results) >= k:
+                    break
+            return results
+
+    def save(self, path: str):
+        """Write the index to exactly path (np.savez would append .npz to a bare name), atomically"""
+        with self._lock:
+            alive = np.nonzero(self._alive[:self._n])[0]
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.savez(
+                    f,
+                    vectors=self._vectors[alive],
+                    keys=np.array([self._row_key[i] for i in alive], dtype=str),
+                    spans=np.array([self._row_span[i] for i in alive], dtype=np.int64).reshape(-1, 2),
+                    fingerprints=np.array(json.dumps(self._fingerprints))
+                )
+            os.replace(tmp, path)
+            self.dirty = False
+
+    def load(self, path: str):
+        data = np.load(path, allow_pickle=False)
+        fingerprints = json.loads(str(data['fingerprints']))
+        grouped = {}
+        for row, key in enumerate(data['keys'].tolist()):
+            grouped.setdefault(key, []).append(row)
+        for key, rows in grouped.items():
+            self.add(key, data['vectors'][rows], [tuple(s) for s in data['spans'][rows].tolist()], fingerprints.get(key))
+        self.dirty = False
+
+class IVFIndex(VectorIndex):
+    """Approximate search: spherical k-means coarse quantizer, only the nprobe closest lists are scanned.
+    Each list keeps its own row numbers, so a query touches only the probed rows, not the whole index.
+    Falls back to brute force until there are enough vectors to train on."""
+
+    def __init__(self, dim: int, nprobe: int = 8, min_train: int = 2048):
+        super().__init__(dim)
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self._centroids = None
+        self._lists = []  # per centroid: array('q') of rows; removed rows stay until compaction
+        self._trained_on = 0
+
+    def _on_rows_added(self, rows):
+        live = self._n - self._dead
+        # Retrain when the collection has doubled since the last training
+        if live >= self.min_train and live >= 2 * self._trained_on:
+            self._train()
+        elif self._centroids is not None:
+            self._assign(np.asarray(rows, dtype=np.int64))
+
+    def _on_compacted(self):
+        if self._centroids is not None:
+            self._lists = [array('q') for _ in range(len(self._centroids))]
+            self._assign(np.arange(self._n, dtype=np.int64))
+
+    def _assign(self, rows):
+        nearest = np.argmax(self._vectors[rows] @ self._centroids.T, axis=1)
+        for row, c in zip(rows.tolist(), nearest.tolist()):
+            self._lists[c].append(row)
+
+    def _train(self, iterations: int = 10):
+        rows = np.nonzero(self._alive[:self._n])[0]
+        data = self._vectors[rows]
+        n_lists = max(1, int(math.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = data[assign == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    if norm > 0:
+                        centroids[c] = centroid / norm
+        self._centroids = centroids
+        self._lists = [array('q') for _ in range(n_lists)]
+        self._assign(rows.astype(np.int64))
+        self._trained_on = len(rows)
+
+    def _candidate_rows(self, query):
+        if self._centroids is None:
+            return super()._candidate_rows(query)
+        probe = np.argsort(-(self._centroids @ query))[:self.nprobe]
+        rows = np.concatenate([np.frombuffer(self._lists[c], dtype=np.int64) for c in probe])
+        return rows[self._alive[rows]]
+
+def make_vector_index(kind: str, dim: int):
+    if kind == 'brute':
+        return VectorIndex(dim)
+    if kind == 'ivf':
+        return IVFIndex(dim)
+    raise ValueError(f"Unknown vector index kind: {kind}")
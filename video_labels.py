@@ -0,0 +1,155 @@
+from array import array
+
+# Detections of the same label closer together than this are one continuous on-screen segment
+SEGMENT_GAP_MS = 2000
+# Time credited to an isolated detection (Rekognition samples frames roughly every half second)
+DETECTION_SPAN_MS = 500
+
+class LabelTimeline:
+    """Streaming per-label statistics over timestamp-ordered detections. Each label is an index into
+    parallel arrays (count, confidence sum, peak confidence) and its timeline is a flat array of merged
+    segment start/end pairs, so memory grows with distinct labels and segments, not with detections."""
+
+    def __init__(self, min_confidence: float = 0, gap_ms: int = SEGMENT_GAP_MS, span_ms: int = DETECTION_SPAN_MS):
+        self.min_confidence = min_confidence
+        self.gap_ms = gap_ms
+        self.span_ms = span_ms
+        self.names = []
+        self._ids = {}
+        self.count = array('I')
+        self.confidence_sum = array('d')
+        self.confidence_max = array('f')
+        self.segments = []              # per label: array('I') of start, end pairs (ms)
+        self.detections = 0
+        self.end_ms = 0
+
+    def _label_id(self, name: str) -> int:
+        label_id = self._ids.get(name)
+        if label_id is None:
+            label_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+            self.count.append(0)
+            self.confidence_sum.append(0.0)
+            self.confidence_max.append(0.0)
+            self.segments.append(array('I'))
+        return label_id
+
+    def add(self, detection):
+        """One get_label_detection entry: {'Timestamp': ms, 'Label': {'Name', 'Confidence'}}"""
+        label = detection.get('Label') or {}
+        name = label.get('Name')
+        confidence = label.get('Confidence', 0)
+        if not name or confidence < self.min_confidence:
+            return
+        timestamp = int(detection.get('Timestamp', 0))
+        label_id = self._label_id(name)
+        self.detections += 1
+        self.count[label_id] += 1
+        self.confidence_sum[label_id] += confidence
+        if confidence > self.confidence_max[label_id]:
+            self.confidence_max[label_id] = confidence
+        segments = self.segments[label_id]
+        end = timestamp + self.span_ms
+        if segments and timestamp <= segments[-1] + self.gap_ms:
+            # Continues the open segment (detections arrive in timestamp order)
+            if end > segments[-1]:
+                segments[-1] = end
+        else:
+            segments.append(timestamp)
+            segments.append(end)
+        if end > self.end_ms:
+            self.end_ms = end
+
+    def extend(self, detections):
+        for detection in detections:
+            self.add(detection)
+        return self
+
+    def coverage_ms(self, label_id: int) -> int:
+        segments = self.segments[label_id]
+        return sum(segments[i + 1] - segments[i] for i in range(0, len(segments), 2))
+
+    def ranked(self):
+        """Label ids by screen time, then peak confidence"""
+        coverage = [self.coverage_ms(i) for i in range(len(self.names))]
+        return sorted(range(len(self.names)), key=lambda i: (coverage[i], self.confidence_max[i]), reverse=True)
+
+    def top_labels(self, n: int):
+        return [self.names[i] for i in self.ranked()[:n]]
+
+    def to_dict(self, duration_ms: int = None):
+        """Timeline document (labels ranked by coverage), suitable for JSON storage and later search"""
+        duration_ms = duration_ms or self.end_ms
+        labels = []
+        for i in self.ranked():
+            coverage = self.coverage_ms(i)
+            labels.append({
+                'name': self.names[i],
+                'count': self.count[i],
+                'coverage_ms': coverage,
+                'coverage_ratio': round(coverage / duration_ms, 4) if duration_ms else 0.0,
+                'max_confidence': round(float(self.confidence_max[i]), 2),
+                'mean_confidence': round(self.confidence_sum[i] / self.count[i], 2),
+                'segments': [[self.segments[i][j], self.segments[i][j + 1]] for j in range(0, len(self.segments[i]), 2)]
+            })
+        return {'duration_ms': duration_ms, 'detections': self.detections, 'labels': labels}
+
+def collect_label_timeline(rekognition, job_id: str, min_confidence: float = 0, page_size: int = 1000):
+    """Stream every result page of a finished label detection job (following NextToken) into a
+    LabelTimeline; only one page is held at a time. Returns (timeline, video duration in ms or None)."""
+    timeline = LabelTimeline(min_confidence)
+    kwargs = {'JobId': job_id, 'MaxResults': page_size, 'SortBy': 'TIMESTAMP'}
+    duration_ms = None
+    pages = 0
+    while True:
+        response = rekognition.get_label_detection(**kwargs)
+        duration_ms = (response.get('VideoMetadata') or {}).get('DurationMillis', duration_ms)
+        timeline.extend(response.get('Labels', []))
+        pages += 1
+        token = response.get('NextToken')
+        if not token:
+            break
+        kwargs['NextToken'] = token
+    print(f"[BACKGROUND] Read {timeline.detections} label detections from {pages} pages")
+    return timeline, duration_ms
+
+def labels_at(timeline: dict, name: str):
+    """[(start_ms, end_ms)] segments where a label (case-insensitive) is on screen in a stored timeline"""
+    wanted = name.casefold()
+    for label in timeline.get('labels', []):
+        if label['name'].casefold() == wanted:
+            return [tuple(segment) for segment in label['segments']]
+    return []
+
+if __name__ == "__main__":
+    # Memory and speed on a synthetic multi-hour video: python video_labels.py [--hours 3]
+    import time
+    import random
+    import argparse
+    import tracemalloc
+    parser = argparse.ArgumentParser(description="Aggregate generated label detections")
+    parser.add_argument('--hours', type=float, default=3)
+    parser.add_argument('--labels', type=int, default=400, help="distinct labels in the video")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    names = [f"Label{i}" for i in range(args.labels)]
+    weights = [1 / (r + 1) for r in range(len(names))]
+    # Every 500 ms, a handful of labels drawn with a skew towards a few dominant ones
+    pages = []
+    for timestamp in range(0, int(args.hours * 3600 * 1000), 500):
+        for name in set(rng.choices(names, weights, k=8)):
+            pages.append({'Timestamp': timestamp, 'Label': {'Name': name, 'Confidence': rng.uniform(70, 100)}})
+
+    tracemalloc.start()
+    started = time.time()
+    timeline = LabelTimeline(min_confidence=70)
+    timeline.extend(pages)
+    seconds = time.time() - started
+    # Memory held by the aggregate itself (the input list above stands in for streamed result pages)
+    _, peak = tracemalloc.get_traced_memory()
+    doc = timeline.to_dict()
+    segments = sum(len(s) // 2 for s in timeline.segments)
+    print(f"{timeline.detections} detections, {len(timeline.names)} labels, {segments} segments in {seconds:.1f}s; "
+          f"peak memory {peak / 1024 / 1024:.1f} MB")
+    print("Top labels:", [(label['name'], label['coverage_ratio']) for label in doc['labels'][:6]])